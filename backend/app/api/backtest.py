@@ -1,47 +1,79 @@
 # 回測 API
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
 from pydantic import BaseModel
-import pandas as pd
-import os
+from functools import partial
+from typing import Dict, Optional
 
-from app.core.backtest_engine import BacktestEngine, BacktestParams, BacktestResult
+from app.core.backtest_engine import BacktestEngine, BacktestParams, BacktestRun
+from app.core.downsample import downsample_indices
+from app.core.encoding import JSON_MEDIA_TYPE, encoded_response, negotiate
+from app.core.indicator_cache import indicator_cache, series_version
+from app.core.instrumentation import profiled, stage
+from app.core.monte_carlo import MonteCarloParams, run_monte_carlo
+from app.core.price_repository import price_repository
+from app.core.result_cache import cache_key, result_cache
 
 router = APIRouter()
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
 
 class BacktestRequest(BaseModel):
     file_id: str
     params: BacktestParams
+    # 權益曲線降採樣（lttb / minmax / none）；未指定點數時輸出全部，不影響快取的回測結果
+    max_points: Optional[int] = None
+    downsample: str = "lttb"
+
+class MonteCarloRequest(BacktestRequest):
+    monte_carlo: MonteCarloParams = MonteCarloParams()
+
+def get_backtest_run(request: BacktestRequest) -> BacktestRun:
+    """相同資料內容與參數直接使用快取的欄位式結果"""
+    with stage("load"):
+        series = price_repository.get(request.file_id)
+    key = cache_key("backtest", series_version(series), request.params.model_dump())
+    run = result_cache.get(key)
+    if run is None:
+        engine = BacktestEngine.from_series(series, ma_source=partial(indicator_cache.rolling_mean, series))
+        run = engine.run(request.params)
+        result_cache.put(key, run)
+    return run
 
 @router.post("/run")
-async def run_backtest(request: BacktestRequest) -> BacktestResult:
-    """執行回測"""
-    file_path = os.path.join(DATA_DIR, request.file_id)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="資料檔案不存在")
-    
+async def run_backtest(request: BacktestRequest, http_request: Request) -> Response:
+    """執行回測；Accept 為欄位式 JSON 或 MessagePack 時，列表欄位改為平行陣列。
+    結果直接編碼為回應，不經 response_model 的驗證與序列化"""
     try:
-        df = pd.read_excel(file_path)
-        lower_cols = [c.lower() for c in df.columns]
-        date_candidates = ["date", "日期", "data", "time"]
-        close_candidates = ["close", "收盤價", "price", "價格"]
-        
-        date_col = next((df.columns[lower_cols.index(c)] for c in date_candidates if c in lower_cols), None)
-        close_col = next((df.columns[lower_cols.index(c)] for c in close_candidates if c in lower_cols), None)
-        
-        if not date_col or not close_col:
-            raise HTTPException(status_code=400, detail="找不到日期或價格欄位")
-        
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        df = df.dropna(subset=[date_col, close_col]).sort_values(date_col).reset_index(drop=True)
-        
-        engine = BacktestEngine(df, date_col, close_col)
-        return engine.run(request.params)
+        media_type = negotiate(http_request.headers.get("accept"))
+        # 引擎回傳欄位式結果，在此才轉為 dict 列表
+        run = await run_in_threadpool(profiled(get_backtest_run), request)
+        with stage("serialize"):
+            picks = downsample_indices(run.days, run.equity, request.max_points, request.downsample)
+            content = run.to_columns(picks) if media_type != JSON_MEDIA_TYPE else run.to_dict(picks)
+        return encoded_response(content, media_type)
     
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="資料檔案不存在")
     except HTTPException:
         raise
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"回測執行失敗: {str(e)}")
+
+@router.post("/monte-carlo")
+async def run_monte_carlo_analysis(request: MonteCarloRequest) -> Dict:
+    """對回測結果做蒙地卡羅分析（區塊重抽樣或交易順序洗牌），回傳指標分布與權益分位帶"""
+    def work() -> Dict:
+        run = get_backtest_run(request)
+        return run_monte_carlo(run, request.monte_carlo, request.params.initial_cash)
+    
+    try:
+        return await run_in_threadpool(profiled(work))
+    
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="資料檔案不存在")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"蒙地卡羅分析失敗: {str(e)}")
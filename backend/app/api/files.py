@@ -1,83 +1,71 @@
 # 檔案管理 API
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from typing import List, Dict
+from fastapi import APIRouter, UploadFile, File, HTTPException, Request
+from fastapi.responses import Response
+from typing import List, Dict, Optional
+from urllib.parse import quote
+import numpy as np
 import pandas as pd
+import io
 import os
 from datetime import datetime
-import time
 
-router = APIRouter()
-
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
+from app.core.backtest_engine import date_strings
+from app.core.downsample import DEFAULT_MAX_POINTS, chart_indices
+from app.core.encoding import JSON_MEDIA_TYPE, encoded_response, negotiate, rows_of
+from app.core.file_catalog import file_catalog
+from app.core.indicator_cache import indicator_cache
+from app.core.result_cache import result_cache, sweep_cache
+from app.core.price_repository import price_repository
+from app.core.price_store import (
+    DATA_DIR, PriceChanges, PriceColumnError, drop_price_series,
+    export_price_frame, to_epoch_day, update_price_series,
+)
 
-# 快取機制
-_file_cache: Dict = {}
-_cache_timestamp: float = 0
-CACHE_TTL_SECONDS = 300  # 快取 5 分鐘
+router = APIRouter()
 
 def get_data_dir():
     if not os.path.exists(DATA_DIR):
         os.makedirs(DATA_DIR)
     return DATA_DIR
 
-def invalidate_cache():
-    """清除快取"""
-    global _file_cache, _cache_timestamp
-    _file_cache = {}
-    _cache_timestamp = 0
-
 @router.get("")
 async def list_files() -> List[Dict]:
-    """取得所有資料檔案列表（含快取）"""
-    global _file_cache, _cache_timestamp
-    
-    # 檢查快取是否有效
-    if _file_cache and (time.time() - _cache_timestamp) < CACHE_TTL_SECONDS:
-        return _file_cache.get("files", [])
-    
+    """取得所有資料檔案列表（由檔案目錄提供，未變動的檔案只需 stat）"""
     data_dir = get_data_dir()
+    file_ids = [f for f in os.listdir(data_dir) if f.endswith('.xlsx') or f.endswith('.xls')]
+    today = datetime.now().date()
     files = []
-    date_candidates = ["date", "日期", "data", "time"]
-    
-    for filename in os.listdir(data_dir):
-        if filename.endswith('.xlsx') or filename.endswith('.xls'):
-            file_path = os.path.join(data_dir, filename)
-            try:
-                # 優化：只讀取前100列和後100列來判斷日期範圍
-                df = pd.read_excel(file_path)
-                lower_cols = [c.lower() for c in df.columns]
-                date_col = next((df.columns[lower_cols.index(c)] for c in date_candidates if c in lower_cols), None)
-                
-                if date_col:
-                    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-                    latest_date = df[date_col].max()
-                    min_date = df[date_col].min()
-                    
-                    if pd.notna(latest_date):
-                        days_ago = (datetime.now().date() - latest_date.date()).days
-                        files.append({
-                            "id": filename,
-                            "name": filename.replace('.xlsx', '').replace('.xls', ''),
-                            "latest_date": latest_date.strftime("%Y-%m-%d"),
-                            "start_date": min_date.strftime("%Y-%m-%d") if pd.notna(min_date) else None,
-                            "row_count": len(df),
-                            "days_ago": days_ago,
-                            "status": "fresh" if days_ago == 0 else "recent" if days_ago <= 7 else "old"
-                        })
-            except Exception as e:
-                files.append({
-                    "id": filename, "name": filename.replace('.xlsx', '').replace('.xls', ''),
-                    "latest_date": None, "start_date": None, "row_count": 0,
-                    "days_ago": None, "status": "error", "error": str(e)
-                })
-    
-    result = sorted(files, key=lambda x: x['name'])
     
-    # 儲存快取
-    _file_cache = {"files": result}
-    _cache_timestamp = time.time()
+    for entry in file_catalog.list(file_ids):
+        filename = entry["id"]
+        name = filename.replace('.xlsx', '').replace('.xls', '')
+        # 無法辨識欄位、讀取失敗或沒有任何日期的檔案列為錯誤，附上原因
+        if entry["status"] != "ok" or entry["end_date"] is None:
+            files.append({
+                "id": filename, "name": name,
+                "latest_date": None, "start_date": None, "row_count": 0,
+                "days_ago": None, "status": "error", "error": entry.get("error") or "沒有有效的日期資料"
+            })
+            continue
+        
+        days_ago = (today - datetime.strptime(entry["end_date"], "%Y-%m-%d").date()).days
+        files.append({
+            "id": filename,
+            "name": name,
+            "latest_date": entry["end_date"],
+            "start_date": entry["start_date"],
+            "row_count": entry["rows"],
+            "days_ago": days_ago,
+            "status": "fresh" if days_ago == 0 else "recent" if days_ago <= 7 else "old"
+        })
     
-    return result
+    return sorted(files, key=lambda x: x['name'])
+
+@router.get("/cache/stats")
+async def get_cache_stats() -> Dict:
+    """取得價格序列、均線、回測結果與網格點快取的命中/未命中/淘汰統計"""
+    return {**price_repository.stats(), "indicators": indicator_cache.stats(), "results": result_cache.stats(),
+            "sweep": sweep_cache.stats()}
 
 @router.post("/upload")
 async def upload_file(file: UploadFile = File(...)) -> Dict:
@@ -93,7 +81,9 @@ async def upload_file(file: UploadFile = File(...)) -> Dict:
         with open(file_path, 'wb') as f:
             f.write(contents)
         df = pd.read_excel(file_path)
-        invalidate_cache()  # 清除快取
+        price_repository.invalidate(file.filename)
+        indicator_cache.invalidate(file.filename)
+        file_catalog.refresh(file.filename)
         return {"success": True, "filename": file.filename, "row_count": len(df), "columns": list(df.columns)}
     except Exception as e:
         if os.path.exists(file_path):
@@ -101,42 +91,39 @@ async def upload_file(file: UploadFile = File(...)) -> Dict:
         raise HTTPException(status_code=400, detail=f"檔案處理失敗: {str(e)}")
 
 @router.get("/{file_id}/preview")
-async def get_file_preview(file_id: str, limit: int = 500) -> Dict:
-    """取得檔案預覽資料"""
-    data_dir = get_data_dir()
-    file_path = os.path.join(data_dir, file_id)
-    
-    if not os.path.exists(file_path):
+async def get_file_preview(request: Request, file_id: str, max_points: int = DEFAULT_MAX_POINTS, method: str = "lttb",
+                           start_date: Optional[str] = None, end_date: Optional[str] = None,
+                           limit: Optional[int] = None) -> Dict:
+    """取得檔案預覽資料：[start_date, end_date]（limit 為只取最後 N 筆；皆未指定時為最後 500 筆，0 為不限制）
+    的價格降採樣至 max_points 點；
+    Accept 為欄位式 JSON 或 MessagePack 時 chart_data 為平行陣列"""
+    try:
+        series = price_repository.get(file_id)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="檔案不存在")
+    except PriceColumnError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
-        df = pd.read_excel(file_path)
-        lower_cols = [c.lower() for c in df.columns]
-        date_candidates = ["date", "日期", "data", "time"]
-        close_candidates = ["close", "收盤價", "price", "價格"]
-        
-        date_col = next((df.columns[lower_cols.index(c)] for c in date_candidates if c in lower_cols), None)
-        close_col = next((df.columns[lower_cols.index(c)] for c in close_candidates if c in lower_cols), None)
+        picks = chart_indices(series.days, series.closes, max_points, method, start_date, end_date, last=limit)
+        chart_data = {"date": date_strings(series.days[picks]), "price": np.asarray(series.closes)[picks]}
+        first_last = date_strings(series.days[[0, -1]]) if len(series) else [None, None]
+        media_type = negotiate(request.headers.get("accept"))
         
-        if not date_col or not close_col:
-            raise HTTPException(status_code=400, detail="找不到日期或價格欄位")
-        
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        df = df.dropna(subset=[date_col, close_col]).sort_values(date_col)
-        
-        chart_data = [{"date": row[date_col].strftime("%Y-%m-%d"), "price": float(row[close_col])} for _, row in df.iterrows()]
-        
-        return {
+        content = {
             "file_id": file_id,
             "name": file_id.replace('.xlsx', '').replace('.xls', ''),
-            "date_column": date_col, "price_column": close_col,
-            "total_rows": len(df),
-            "start_date": df[date_col].min().strftime("%Y-%m-%d"),
-            "end_date": df[date_col].max().strftime("%Y-%m-%d"),
-            "chart_data": chart_data[-limit:] if len(chart_data) > limit else chart_data
+            "date_column": series.date_col, "price_column": series.close_col,
+            "total_rows": len(series),
+            "start_date": first_last[0],
+            "end_date": first_last[-1],
+            "chart_data": chart_data if media_type != JSON_MEDIA_TYPE else rows_of(chart_data)
         }
+        return encoded_response(content, media_type)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"讀取失敗: {str(e)}")
 
@@ -147,39 +134,27 @@ async def delete_file(file_id: str) -> Dict:
     if not os.path.exists(file_path):
         raise HTTPException(status_code=404, detail="檔案不存在")
     os.remove(file_path)
-    invalidate_cache()  # 清除快取
+    price_repository.invalidate(file_id)
+    indicator_cache.invalidate(file_id)
+    drop_price_series(file_id)
+    file_catalog.remove(file_id)
     return {"success": True, "message": f"已刪除 {file_id}"}
 
 # ==================== 資料編輯 API ====================
 
-def get_date_and_close_columns(df):
-    """取得日期和價格欄位名稱"""
-    lower_cols = [c.lower() for c in df.columns]
-    date_candidates = ["date", "日期", "data", "time"]
-    close_candidates = ["close", "收盤價", "price", "價格"]
-    
-    date_col = next((df.columns[lower_cols.index(c)] for c in date_candidates if c in lower_cols), None)
-    close_col = next((df.columns[lower_cols.index(c)] for c in close_candidates if c in lower_cols), None)
-    
-    return date_col, close_col
-
 @router.get("/{file_id}/data")
 async def get_file_data(file_id: str, limit: int = 100) -> Dict:
     """取得檔案完整資料用於編輯"""
-    file_path = os.path.join(get_data_dir(), file_id)
-    
-    if not os.path.exists(file_path):
+    try:
+        series = price_repository.get(file_id)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="檔案不存在")
+    except PriceColumnError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
     try:
-        df = pd.read_excel(file_path)
-        date_col, close_col = get_date_and_close_columns(df)
-        
-        if not date_col or not close_col:
-            raise HTTPException(status_code=400, detail="找不到日期或價格欄位")
-        
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        df = df.dropna(subset=[date_col, close_col]).sort_values(date_col)
+        date_col, close_col = series.date_col, series.close_col
+        df = series.to_frame()
         
         # 回傳最後 N 筆資料
         recent_df = df.tail(limit)
@@ -210,40 +185,36 @@ class DataRow(BaseModel):
 class AppendDataRequest(BaseModel):
     rows: List[DataRow]
 
+def get_series_or_404(file_id: str):
+    """取得價格序列，找不到檔案或欄位時轉為 HTTP 錯誤"""
+    try:
+        return price_repository.get(file_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="檔案不存在")
+    except PriceColumnError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @router.post("/{file_id}/append")
 async def append_data(file_id: str, request: AppendDataRequest) -> Dict:
-    """追加新資料到 Excel 檔案"""
-    file_path = os.path.join(get_data_dir(), file_id)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="檔案不存在")
+    """追加新資料（寫入 WAL，只寫入新增的列）"""
+    get_series_or_404(file_id)
     
-    try:
-        df = pd.read_excel(file_path)
-        date_col, close_col = get_date_and_close_columns(df)
-        
-        if not date_col or not close_col:
-            raise HTTPException(status_code=400, detail="找不到日期或價格欄位")
-        
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        
-        # 建立新資料 DataFrame
-        new_rows = []
+    def build(series, changes: PriceChanges):
         for row in request.rows:
-            new_date = pd.to_datetime(row.date)
+            day = to_epoch_day(row.date)
             # 檢查日期是否已存在
-            if new_date in df[date_col].values:
+            pos = int(np.searchsorted(series.days, day))
+            if pos < len(series) and series.days[pos] == day:
                 raise HTTPException(status_code=400, detail=f"日期 {row.date} 已存在")
-            new_rows.append({date_col: new_date, close_col: row.close})
-        
-        new_df = pd.DataFrame(new_rows)
-        df = pd.concat([df, new_df], ignore_index=True)
-        df = df.sort_values(date_col).reset_index(drop=True)
-        
-        # 儲存檔案
-        df.to_excel(file_path, index=False)
+            changes.append(day, row.close)
+    
+    try:
+        series = update_price_series(file_id, build)
+        price_repository.invalidate(file_id)
+        # 均線快取不清除：新版本只延伸計算新增的部分
+        file_catalog.refresh(file_id)
         
-        return {"success": True, "message": f"已新增 {len(request.rows)} 筆資料", "total_rows": len(df)}
+        return {"success": True, "message": f"已新增 {len(request.rows)} 筆資料", "total_rows": series.meta["total_rows"]}
     except HTTPException:
         raise
     except Exception as e:
@@ -254,27 +225,21 @@ class UpdateDataRequest(BaseModel):
 
 @router.put("/{file_id}/update")
 async def update_data(file_id: str, request: UpdateDataRequest) -> Dict:
-    """更新現有資料"""
-    file_path = os.path.join(get_data_dir(), file_id)
+    """更新現有資料（以列 index 覆寫，寫入 WAL）"""
+    get_series_or_404(file_id)
     
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="檔案不存在")
+    def build(series, changes: PriceChanges):
+        indices = [row.get("index") for row in request.rows]
+        exists = np.isin([-1 if i is None else int(i) for i in indices], series.rows)
+        for row, idx, ok in zip(request.rows, indices, exists):
+            if idx is not None and ok:
+                changes.upsert(idx, to_epoch_day(row["date"]), float(row["close"]))
     
     try:
-        df = pd.read_excel(file_path)
-        date_col, close_col = get_date_and_close_columns(df)
-        
-        if not date_col or not close_col:
-            raise HTTPException(status_code=400, detail="找不到日期或價格欄位")
-        
-        for row in request.rows:
-            idx = row.get("index")
-            if idx is not None and idx in df.index:
-                df.at[idx, date_col] = pd.to_datetime(row["date"])
-                df.at[idx, close_col] = float(row["close"])
-        
-        df = df.sort_values(date_col).reset_index(drop=True)
-        df.to_excel(file_path, index=False)
+        update_price_series(file_id, build)
+        price_repository.invalidate(file_id)
+        indicator_cache.invalidate(file_id)
+        file_catalog.refresh(file_id)
         
         return {"success": True, "message": f"已更新 {len(request.rows)} 筆資料"}
     except HTTPException:
@@ -287,20 +252,36 @@ class DeleteRowsRequest(BaseModel):
 
 @router.delete("/{file_id}/rows")
 async def delete_rows(file_id: str, request: DeleteRowsRequest) -> Dict:
-    """刪除指定資料列"""
-    file_path = os.path.join(get_data_dir(), file_id)
+    """刪除指定資料列（寫入 WAL）"""
+    get_series_or_404(file_id)
     
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="檔案不存在")
+    def build(series, changes: PriceChanges):
+        indices = np.asarray(request.indices, dtype=np.int64)
+        for idx in indices[np.isin(indices, series.rows)].tolist():
+            changes.delete(idx)
     
     try:
-        df = pd.read_excel(file_path)
-        
-        # 刪除指定的列
-        df = df.drop(index=[i for i in request.indices if i in df.index])
-        df = df.reset_index(drop=True)
-        df.to_excel(file_path, index=False)
+        series = update_price_series(file_id, build)
+        price_repository.invalidate(file_id)
+        indicator_cache.invalidate(file_id)
+        file_catalog.refresh(file_id)
         
-        return {"success": True, "message": f"已刪除 {len(request.indices)} 筆資料", "total_rows": len(df)}
+        return {"success": True, "message": f"已刪除 {len(request.indices)} 筆資料", "total_rows": series.meta["total_rows"]}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"刪除失敗: {str(e)}")
+
+@router.get("/{file_id}/export")
+async def export_file(file_id: str) -> Response:
+    """匯出目前內容（含所有編輯）為 Excel 檔案，只在需要時產生"""
+    get_series_or_404(file_id)
+    try:
+        buffer = io.BytesIO()
+        export_price_frame(file_id).to_excel(buffer, index=False)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"匯出失敗: {str(e)}")
+    filename = file_id.replace('.xlsx', '').replace('.xls', '') + '.xlsx'
+    return Response(
+        content=buffer.getvalue(),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename*=UTF-8''{quote(filename)}"}
+    )
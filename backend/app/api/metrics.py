@@ -0,0 +1,21 @@
+# 監控 API - Prometheus 格式的階段耗時與快取命中率
+from fastapi import APIRouter
+from fastapi.responses import Response
+
+from app.core.indicator_cache import indicator_cache
+from app.core.instrumentation import METRICS_MEDIA_TYPE, render_metrics
+from app.core.price_repository import price_repository
+from app.core.result_cache import result_cache, sweep_cache
+
+router = APIRouter()
+
+@router.get("/metrics")
+async def get_metrics():
+    """供 Prometheus 抓取：各階段與請求耗時直方圖、價格 / 指標 / 結果 / 網格點快取的命中統計"""
+    text = render_metrics({
+        "price": price_repository.stats(),
+        "indicator": indicator_cache.stats(),
+        "result": result_cache.stats(),
+        "sweep": sweep_cache.stats(),
+    })
+    return Response(text, media_type=METRICS_MEDIA_TYPE)
@@ -1,18 +1,28 @@
 # 參數優化 API
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional
-import pandas as pd
-import os
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
 
-from app.core.backtest_engine import BacktestEngine, BacktestParams
+from app.core.backtest_engine import BacktestParams, date_range, date_strings
+from app.core.downsample import DEFAULT_MAX_POINTS, chart_indices, downsample_indices
+from app.core.encoding import JSON_MEDIA_TYPE, encoded_response, negotiate, rows_of
+from app.core.halving import rung_schedule, sample_points, successive_halving
+from app.core.indicator_cache import indicator_cache, series_version
+from app.core.instrumentation import profiled, stage
+from app.core.jobs import Job, JobStoreFull, job_manager, stream_job_events
+from app.core.price_repository import price_repository
+from app.core.price_store import PriceColumnError, PriceSeries
+from app.core.ranking import PARETO, Leaderboard
+from app.core.parallel import run_sweep
+from app.core.result_cache import cache_key, result_cache, sweep_cache
+from app.core.strategy_registry import WINDOW_FIELDS, get_strategy
+from app.core.sweep import SweepPoint
+from app.core.walk_forward import SORT_FIELDS, run_walk_forward
 
 router = APIRouter()
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
-
-# 平行處理的最大線程數
-MAX_WORKERS = 4
 
 class OptimizeRequest(BaseModel):
     file_id: str
@@ -27,7 +37,17 @@ class OptimizeRequest(BaseModel):
     start_date: Optional[str] = None
     end_date: Optional[str] = None
     top_n: int = 10
+    # 排序指標；pareto 時回傳總報酬與 MDD 的非支配集合（依總報酬由高到低，不受 top_n 限制）
     sort_by: str = "sharpe_ratio"
+    # ma_fast / ma_slow 以外的策略參數掃描範圍，未指定時使用策略宣告的預設值
+    param_ranges: Dict[str, List[float]] = {}
+    # grid：完整網格；halving：在 ma_fast_bounds / ma_slow_bounds 內隨機取樣並逐次減半，
+    # 成本約為 budget 次完整區間回測（未指定範圍時取 ma_fast_range / ma_slow_range 的最小與最大值）
+    search: str = "grid"
+    budget: int = 100
+    ma_fast_bounds: Optional[List[int]] = None
+    ma_slow_bounds: Optional[List[int]] = None
+    seed: Optional[int] = None
 
 class OptimizeResult(BaseModel):
     strategy_type: str
@@ -35,6 +55,7 @@ class OptimizeResult(BaseModel):
     ma_fast: int
     ma_slow: Optional[int]
     leverage: float
+    strategy_params: Dict[str, float] = {}
     total_return: float
     cagr: float
     mdd: float
@@ -44,176 +65,370 @@ class OptimizeResult(BaseModel):
     win_rate: float
 
 
-def run_single_backtest(engine: BacktestEngine, params: BacktestParams, strategy_type: str, 
-                        direction: str, ma_fast: int, ma_slow: Optional[int], leverage: float):
-    """執行單次回測並返回結果"""
+def build_grid(request: OptimizeRequest) -> List[SweepPoint]:
+    """依請求與策略註冊表宣告的參數空間展開所有網格點"""
+    ranges = {"ma_fast": request.ma_fast_range, "ma_slow": request.ma_slow_range, **request.param_ranges}
+    points = []
+    for strategy_mode in request.strategy_modes:
+        strategy = get_strategy(strategy_mode)
+        combos = strategy.grid(ranges)
+        for direction in request.directions:
+            # 永遠做多不區分方向
+            direction = "long_only" if strategy.hold_from_start else direction
+            for leverage in request.leverage_range:
+                for values in combos:
+                    extra = tuple(sorted((k, v) for k, v in values.items() if k not in WINDOW_FIELDS))
+                    points.append(SweepPoint(strategy_mode, direction, values.get("ma_fast", 0),
+                                             values.get("ma_slow"), leverage, extra))
+    return points
+
+
+def load_series(file_id: str) -> PriceSeries:
+    """取得價格序列，找不到檔案或欄位時轉為 HTTP 錯誤"""
     try:
-        result = engine.run(params)
-        return OptimizeResult(
-            strategy_type=strategy_type,
-            direction=direction,
-            ma_fast=ma_fast,
-            ma_slow=ma_slow,
-            leverage=leverage,
-            total_return=result.total_return,
-            cagr=result.cagr,
-            mdd=result.mdd,
-            sharpe_ratio=result.sharpe_ratio,
-            calmar_ratio=result.calmar_ratio,
-            total_trades=result.total_trades,
-            win_rate=result.win_rate
-        )
-    except Exception:
-        return None
+        with stage("load"):
+            return price_repository.get(file_id)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="資料檔案不存在")
+    except PriceColumnError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
-@router.post("/run")
-async def run_optimization(request: OptimizeRequest) -> List[OptimizeResult]:
-    """執行參數優化 - 使用平行處理加速"""
-    file_path = os.path.join(DATA_DIR, request.file_id)
+def make_leaderboard(request: OptimizeRequest, metrics: Optional[List[str]] = None,
+                     pareto: bool = False) -> Leaderboard:
+    """未指定 metrics 時依 request.sort_by 排名；sort_by 為 pareto 時改為維護報酬 / MDD 前緣"""
+    if metrics is None:
+        pareto = pareto or request.sort_by == PARETO
+        metrics = [] if request.sort_by == PARETO else [request.sort_by]
+    return Leaderboard(metrics, request.top_n, pareto, fields=SORT_FIELDS)
+
+
+def ranked_results(board: Leaderboard, sort_by: str) -> List[OptimizeResult]:
+    """取出指定指標的前 N 名（pareto 為前緣），只有入選的網格點才建立 OptimizeResult"""
+    entries = board.pareto() if sort_by == PARETO else board.ranking(sort_by)
+    return [to_optimize_result(point, m) for point, m in entries]
+
+
+def to_optimize_result(point: SweepPoint, m: Dict) -> OptimizeResult:
+    return OptimizeResult(
+        strategy_type=point.strategy_mode,
+        direction=point.direction,
+        ma_fast=point.ma_fast,
+        ma_slow=point.ma_slow,
+        leverage=point.leverage,
+        strategy_params=dict(point.extra),
+        **m
+    )
+
+
+def make_base_params(request: OptimizeRequest) -> BacktestParams:
+    """各網格點共用的回測參數"""
+    return BacktestParams(
+        initial_cash=request.initial_cash,
+        fee_rate=request.fee_rate, slippage=request.slippage,
+        start_date=request.start_date, end_date=request.end_date
+    )
+
+
+def sweep_table_key(request: OptimizeRequest, series: PriceSeries) -> str:
+    """網格點快取的分區：同一份資料與共用參數下，以 SweepPoint 為鍵逐點保存績效"""
+    return cache_key("sweep", series_version(series), make_base_params(request).model_dump())
+
+
+def execute_optimization(request: OptimizeRequest, series: PriceSeries,
+                         on_progress: Callable[[int, int, Leaderboard], None] = None) -> List[OptimizeResult]:
+    """執行掃描並依 sort_by 排名；on_progress(已完成, 總數, 目前排名) 於每個區塊完成時呼叫"""
+    board = execute_sweep(request, series, make_leaderboard(request), on_progress)
+    return ranked_results(board, request.sort_by)
+
+
+def execute_sweep(request: OptimizeRequest, series: PriceSeries, board: Leaderboard,
+                  on_progress: Callable[[int, int, Leaderboard], None] = None) -> Leaderboard:
+    """依 request.search 執行網格掃描或逐次減半，結果逐筆加入 board（到達時即過濾爆倉並更新排名）"""
+    if request.search == "halving":
+        return execute_halving(request, series, board, on_progress)
+    if request.search != "grid":
+        raise ValueError(f"不支援的搜尋方式: {request.search}")
     
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="資料檔案不存在")
+    base_params = make_base_params(request)
+    points = build_grid(request)
+    
+    table = sweep_table_key(request, series)
+    cached = sweep_cache.get_many(table, points)
+    pending = [i for i in range(len(points)) if i not in cached]
+    
+    # 已快取的點先加入，其餘隨區塊完成加入並寫入快取；同分時以網格順序決定先後，與到達順序無關
+    with stage("rank"):
+        for i, m in cached.items():
+            board.add(i, m, (points[i], m))
+    done = len(cached)
+    if on_progress:
+        on_progress(done, len(points), board)
+    
+    def on_chunk(indices: List[int], chunk_metrics: List[Optional[Dict]]):
+        nonlocal done
+        done += len(indices)
+        evaluated = [(points[pending[i]], m) for i, m in zip(indices, chunk_metrics)]
+        sweep_cache.put_many(table, evaluated)
+        with stage("rank"):
+            for i, item in zip(indices, evaluated):
+                board.add(pending[i], item[1], item)
+        if on_progress:
+            on_progress(done, len(points), board)
+    
+    if pending:
+        with stage("sweep"):
+            run_sweep(series.days, series.closes, [points[i] for i in pending], base_params, on_chunk=on_chunk)
+    return board
+
+
+def search_bounds(request: OptimizeRequest) -> Dict[str, tuple]:
+    bounds = {}
+    for name, explicit, values in (("ma_fast", request.ma_fast_bounds, request.ma_fast_range),
+                                   ("ma_slow", request.ma_slow_bounds, request.ma_slow_range)):
+        if explicit is not None:
+            if len(explicit) != 2 or explicit[0] > explicit[1]:
+                raise ValueError(f"{name}_bounds 需為 [最小值, 最大值]")
+            bounds[name] = (explicit[0], explicit[1])
+        elif values:
+            bounds[name] = (min(values), max(values))
+    return bounds
+
+
+def halving_plan(request: OptimizeRequest, series: PriceSeries) -> Tuple[List[Tuple[int, int]], List[float]]:
+    """逐次減半的各輪 (候選數, bar 數) 與各輪成本（以完整區間的回測次數計）；
+    提交工作時的總數與執行中的進度都由此計算，分母不會在執行中改變"""
+    if request.budget < 1:
+        raise ValueError("budget 至少為 1")
+    lo, hi = date_range(series.days, request.start_date, request.end_date)
+    schedule = rung_schedule(hi - lo, request.budget, request.top_n)
+    n_bars = max(hi - lo, 1)
+    return schedule, [count * bars / n_bars for count, bars in schedule]
+
+
+def progress_total(costs: List[float]) -> int:
+    return max(1, round(sum(costs)))
+
+
+def execute_halving(request: OptimizeRequest, series: PriceSeries, board: Leaderboard,
+                    on_progress: Callable[[int, int, Leaderboard], None] = None) -> Leaderboard:
+    """逐次減半搜尋：成本以完整區間的回測次數計，約為 request.budget；最後一輪的結果與網格掃描相同並寫入網格快取。
+    各輪以 sort_by 淘汰，board 只接收最後一輪的結果"""
+    if request.sort_by not in SORT_FIELDS:
+        raise ValueError(f"逐次減半需要單一排序欄位: {request.sort_by}")
+    base_params = make_base_params(request)
+    schedule, costs = halving_plan(request, series)
+    total = progress_total(costs)
+    
+    rng = np.random.default_rng(request.seed)
+    points = sample_points(schedule[0][0], request.strategy_modes, request.directions, request.leverage_range,
+                           search_bounds(request), request.param_ranges, rng)
+    
+    on_chunk = None
+    if on_progress:
+        # 每個區塊開始前回報（該輪已評估的比例），背景工作因此能在輪內取消
+        def on_chunk(rung: int, evaluated: int, count: int):
+            on_progress(round(sum(costs[:rung]) + costs[rung] * evaluated / max(count, 1)), total, board)
+    
+    with stage("sweep"):
+        evaluated = successive_halving(series.days, series.closes, points, base_params, request.sort_by,
+                                       schedule, on_chunk)
+    
+    sweep_cache.put_many(sweep_table_key(request, series), evaluated)
+    
+    with stage("rank"):
+        for i, (point, m) in enumerate(evaluated):
+            board.add(i, m, (point, m))
+    if on_progress:
+        on_progress(total, total, board)
+    return board
+
+
+@router.post("/run")
+async def run_optimization(request: OptimizeRequest) -> Response:
+    """執行參數優化 - 在執行緒池中計算，不阻塞事件迴圈；結果直接編碼，不經 response_model 的驗證與序列化"""
+    series = await run_in_threadpool(load_series, request.file_id)
     
     try:
-        df = pd.read_excel(file_path)
-        lower_cols = [c.lower() for c in df.columns]
-        date_candidates = ["date", "日期", "data", "time"]
-        close_candidates = ["close", "收盤價", "price", "價格"]
-        
-        date_col = next((df.columns[lower_cols.index(c)] for c in date_candidates if c in lower_cols), None)
-        close_col = next((df.columns[lower_cols.index(c)] for c in close_candidates if c in lower_cols), None)
-        
-        if not date_col or not close_col:
-            raise HTTPException(status_code=400, detail="找不到日期或價格欄位")
-        
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        df = df.dropna(subset=[date_col, close_col]).sort_values(date_col).reset_index(drop=True)
-        
-        engine = BacktestEngine(df, date_col, close_col)
-        
-        # 建立所有待執行的任務
-        tasks = []
-        
-        for strategy_mode in request.strategy_modes:
-            for direction in request.directions:
-                for leverage in request.leverage_range:
-                    if strategy_mode == "buy_and_hold":
-                        params = BacktestParams(
-                            initial_cash=request.initial_cash, leverage=leverage,
-                            fee_rate=request.fee_rate, slippage=request.slippage,
-                            strategy_mode=strategy_mode, ma_fast=20, ma_slow=60,
-                            trade_direction="long_only",
-                            start_date=request.start_date, end_date=request.end_date
-                        )
-                        tasks.append((params, strategy_mode, "long_only", 0, None, leverage))
-                        
-                    elif strategy_mode == "single_ma":
-                        for ma_fast in request.ma_fast_range:
-                            params = BacktestParams(
-                                initial_cash=request.initial_cash, leverage=leverage,
-                                fee_rate=request.fee_rate, slippage=request.slippage,
-                                strategy_mode=strategy_mode, ma_fast=ma_fast, ma_slow=ma_fast,
-                                trade_direction=direction,
-                                start_date=request.start_date, end_date=request.end_date
-                            )
-                            tasks.append((params, strategy_mode, direction, ma_fast, None, leverage))
-                            
-                    else:  # dual_ma
-                        for ma_fast in request.ma_fast_range:
-                            for ma_slow in request.ma_slow_range:
-                                if ma_slow <= ma_fast:
-                                    continue
-                                params = BacktestParams(
-                                    initial_cash=request.initial_cash, leverage=leverage,
-                                    fee_rate=request.fee_rate, slippage=request.slippage,
-                                    strategy_mode=strategy_mode, ma_fast=ma_fast, ma_slow=ma_slow,
-                                    trade_direction=direction,
-                                    start_date=request.start_date, end_date=request.end_date
-                                )
-                                tasks.append((params, strategy_mode, direction, ma_fast, ma_slow, leverage))
-        
-        # 使用平行處理執行所有回測
-        results = []
-        with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-            futures = {
-                executor.submit(run_single_backtest, engine, *task): task 
-                for task in tasks
-            }
-            
-            for future in as_completed(futures):
-                result = future.result()
-                if result is not None:
-                    results.append(result)
-        
-        # 過濾掉爆倉的策略（MDD >= 99% 表示幾乎全部虧損）
-        results = [r for r in results if r.mdd < 99 and r.total_return > -99]
-        
-        results.sort(key=lambda x: getattr(x, request.sort_by), reverse=True)
-        return results[:request.top_n]
+        results = await run_in_threadpool(profiled(execute_optimization), request, series)
+        return encoded_response([r.model_dump() for r in results], JSON_MEDIA_TYPE)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"優化失敗: {str(e)}")
+
+class RankingsRequest(OptimizeRequest):
+    # 同一次掃描輸出多個指標的前 N 名，pareto 時另外輸出總報酬與 MDD 的非支配集合
+    metrics: List[str] = ["sharpe_ratio", "calmar_ratio", "cagr"]
+    pareto: bool = False
+
+def execute_rankings(request: RankingsRequest, series: PriceSeries) -> Dict:
+    """一次掃描，結果到達時同時更新各指標的前 N 名與 Pareto 前緣"""
+    board = execute_sweep(request, series, make_leaderboard(request, request.metrics, request.pareto))
+    result = {
+        "evaluated": board.evaluated,
+        "viable": board.viable,
+        "rankings": {metric: [r.model_dump() for r in ranked_results(board, metric)] for metric in board.rankings},
+    }
+    if request.pareto:
+        result["pareto"] = [r.model_dump() for r in ranked_results(board, PARETO)]
+    return result
+
+@router.post("/rankings")
+async def run_rankings(request: RankingsRequest) -> Dict:
+    """多指標排名：一次掃描同時取得 sharpe / calmar / cagr 等指標的前 N 名與（選用的）Pareto 前緣"""
+    series = await run_in_threadpool(load_series, request.file_id)
     
-    except HTTPException:
-        raise
+    try:
+        return await run_in_threadpool(profiled(execute_rankings), request, series)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"優化失敗: {str(e)}")
 
+# ==================== 前進優化 API ====================
+
+class WalkForwardRequest(OptimizeRequest):
+    train_bars: int = 756
+    test_bars: int = 252
+    anchored: bool = False
+    # 樣本外權益曲線降採樣（lttb / minmax / none）；未指定點數時輸出全部
+    max_points: Optional[int] = None
+    downsample: str = "lttb"
+
+def execute_walk_forward(request: WalkForwardRequest, series: PriceSeries, columnar: bool = False) -> Dict:
+    """執行前進優化；同一份資料與參數的結果直接取自快取"""
+    params = make_base_params(request)
+    key = cache_key("walk_forward", series_version(series),
+                    request.model_dump(exclude={"file_id", "top_n", "max_points", "downsample"}))
+    run = result_cache.get(key)
+    if run is None:
+        with stage("sweep"):
+            run = run_walk_forward(series.days, series.closes, build_grid(request), params,
+                                   request.train_bars, request.test_bars, request.anchored, request.sort_by)
+        result_cache.put(key, run)
+    with stage("serialize"):
+        return run.to_dict(downsample_indices(run.days, run.equity, request.max_points, request.downsample),
+                           columnar)
+
+@router.post("/walk-forward")
+async def run_walk_forward_optimization(request: WalkForwardRequest, http_request: Request) -> Dict:
+    """前進優化：在每個訓練區間優化網格、以樣本外測試區間驗證，並串接測試期權益；支援欄位式回應"""
+    media_type = negotiate(http_request.headers.get("accept"))
+    series = await run_in_threadpool(load_series, request.file_id)
+    
+    try:
+        result = await run_in_threadpool(profiled(execute_walk_forward), request, series, media_type != JSON_MEDIA_TYPE)
+        return encoded_response(result, media_type)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"前進優化失敗: {str(e)}")
+
+# ==================== 背景優化工作 API ====================
+
+@router.post("/jobs")
+async def submit_optimization_job(request: OptimizeRequest) -> Dict:
+    """建立背景優化工作，立即回傳 job_id"""
+    series = await run_in_threadpool(load_series, request.file_id)
+    try:
+        make_leaderboard(request)
+        if request.search == "halving":
+            total = progress_total(halving_plan(request, series)[1])
+        else:
+            total = len(build_grid(request))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    def work(job: Job) -> List[Dict]:
+        def on_progress(done: int, total: int, board: Leaderboard):
+            best = ranked_results(board, request.sort_by)
+            job.update(done=done, total=total, best=[r.model_dump() for r in best])
+        
+        results = execute_optimization(request, series, on_progress)
+        return [r.model_dump() for r in results]
+    
+    try:
+        job = job_manager.submit("optimize", work, total=total)
+    except JobStoreFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "total": job.total}
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在或已過期")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_optimization_job(job_id: str) -> Dict:
+    """查詢工作進度（完成後含結果）"""
+    return get_job_or_404(job_id).snapshot()
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_optimization_job(job_id: str):
+    """以 Server-Sent Events 串流工作進度，直到工作結束"""
+    job = get_job_or_404(job_id)
+    return StreamingResponse(stream_job_events(job), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.delete("/jobs/{job_id}")
+async def cancel_optimization_job(job_id: str) -> Dict:
+    """取消工作"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在或已過期")
+    return {"success": True, "job_id": job_id, "status": job.status}
+
 # ==================== 圖表資料 API ====================
 
 class ChartRequest(BaseModel):
     file_id: str
     ma_fast: int = 20
     ma_slow: Optional[int] = None
-    limit: int = 500
+    # 取 [start_date, end_date]（limit 為只取最後 N 筆；皆未指定時為最後 500 筆，0 為不限制）後，
+    # 以價格的形狀降採樣至 max_points 點，均線取相同日期
+    max_points: Optional[int] = DEFAULT_MAX_POINTS
+    method: str = "lttb"
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    limit: Optional[int] = None
+
+def _nullable(values: np.ndarray) -> List[Optional[float]]:
+    """NaN 轉為 None（均線暖機期）"""
+    return [None if v != v else v for v in values.tolist()]
+
+def build_chart_data(request: ChartRequest, series: PriceSeries, columnar: bool = False) -> Dict:
+    """降採樣價格並取相同位置的均線（阻塞，需在執行緒中呼叫）"""
+    picks = chart_indices(series.days, series.closes, request.max_points, request.method,
+                          request.start_date, request.end_date, last=request.limit)
+    # 均線取自均線快取（完整歷史計算，只取降採樣後的位置；暖機期的 NaN 輸出為 null）
+    data = {
+        "date": date_strings(series.days[picks]),
+        "price": np.asarray(series.closes)[picks],
+        "ma_fast": _nullable(indicator_cache.rolling_mean(series, request.ma_fast)[picks]),
+    }
+    if request.ma_slow:
+        data["ma_slow"] = _nullable(indicator_cache.rolling_mean(series, request.ma_slow)[picks])
+    return {
+        "file_id": request.file_id,
+        "ma_fast": request.ma_fast,
+        "ma_slow": request.ma_slow,
+        "data": data if columnar else rows_of(data)
+    }
 
 @router.post("/chart")
-async def get_chart_data(request: ChartRequest):
-    """取得價格和均線資料用於圖表顯示"""
-    file_path = os.path.join(DATA_DIR, request.file_id)
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail="資料檔案不存在")
+async def get_chart_data(request: ChartRequest, http_request: Request):
+    """取得價格和均線資料用於圖表顯示；Accept 為欄位式 JSON 或 MessagePack 時 data 為平行陣列"""
+    media_type = negotiate(http_request.headers.get("accept"))
+    series = await run_in_threadpool(load_series, request.file_id)
     
     try:
-        df = pd.read_excel(file_path)
-        lower_cols = [c.lower() for c in df.columns]
-        date_candidates = ["date", "日期", "data", "time"]
-        close_candidates = ["close", "收盤價", "price", "價格"]
-        
-        date_col = next((df.columns[lower_cols.index(c)] for c in date_candidates if c in lower_cols), None)
-        close_col = next((df.columns[lower_cols.index(c)] for c in close_candidates if c in lower_cols), None)
-        
-        if not date_col or not close_col:
-            raise HTTPException(status_code=400, detail="找不到日期或價格欄位")
-        
-        df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-        df = df.dropna(subset=[date_col, close_col]).sort_values(date_col).reset_index(drop=True)
-        
-        # 計算均線
-        df['ma_fast'] = df[close_col].rolling(window=request.ma_fast).mean()
-        if request.ma_slow:
-            df['ma_slow'] = df[close_col].rolling(window=request.ma_slow).mean()
-        
-        # 取最後 N 筆資料
-        df = df.tail(request.limit)
-        
-        chart_data = []
-        for _, row in df.iterrows():
-            item = {
-                "date": row[date_col].strftime("%Y-%m-%d"),
-                "price": float(row[close_col]),
-                "ma_fast": float(row['ma_fast']) if pd.notna(row['ma_fast']) else None,
-            }
-            if request.ma_slow:
-                item["ma_slow"] = float(row['ma_slow']) if pd.notna(row['ma_slow']) else None
-            chart_data.append(item)
-        
-        return {
-            "file_id": request.file_id,
-            "ma_fast": request.ma_fast,
-            "ma_slow": request.ma_slow,
-            "data": chart_data
-        }
+        content = await run_in_threadpool(build_chart_data, request, series, media_type != JSON_MEDIA_TYPE)
+        return encoded_response(content, media_type)
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"取得圖表資料失敗: {str(e)}")
@@ -0,0 +1,44 @@
+# 多資產組合回測 API
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from typing import Union
+
+from app.core.downsample import downsample_indices
+from app.core.encoding import JSON_MEDIA_TYPE, encoded_response, negotiate
+from app.core.indicator_cache import indicator_cache
+from app.core.portfolio import PortfolioEngine, PortfolioParams, PortfolioResult
+from app.core.price_repository import price_repository
+from app.core.price_store import PriceColumnError
+
+router = APIRouter()
+
+
+def execute_portfolio(params: PortfolioParams, media_type: str = JSON_MEDIA_TYPE) -> Union[PortfolioResult, Response]:
+    series_list = []
+    for asset in params.assets:
+        try:
+            series_list.append(price_repository.get(asset.file_id))
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail=f"資料檔案不存在: {asset.file_id}")
+        except PriceColumnError as e:
+            raise HTTPException(status_code=400, detail=f"{asset.file_id}: {str(e)}")
+    
+    engine = PortfolioEngine(series_list, ma_source=indicator_cache.rolling_mean)
+    run = engine.run(params)
+    picks = downsample_indices(run.days, run.equity, params.max_points, params.downsample)
+    if media_type != JSON_MEDIA_TYPE:
+        return encoded_response(run.to_columns(picks), media_type)
+    return run.to_result(picks)
+
+
+@router.post("/run")
+async def run_portfolio(params: PortfolioParams, request: Request) -> PortfolioResult:
+    """執行多資產組合回測（各資產日期取聯集，休市日沿用前一筆收盤價）；支援欄位式回應"""
+    try:
+        return await run_in_threadpool(execute_portfolio, params, negotiate(request.headers.get("accept")))
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"組合回測失敗: {str(e)}")
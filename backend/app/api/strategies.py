@@ -6,6 +6,8 @@ from datetime import datetime, timezone, timedelta
 import json
 import os
 
+from app.core.strategy_registry import list_strategies as list_strategy_types
+
 # 嘗試載入 Firebase
 try:
     from app.core.firebase_config import init_firebase, get_firebase_ref
@@ -84,6 +86,11 @@ async def list_strategies() -> List[Dict]:
         result.append(value)
     return sorted(result, key=lambda x: x.get('total_return', 0), reverse=True)
 
+@router.get("/types")
+async def get_strategy_types() -> List[Dict]:
+    """已註冊的策略類型與參數定義"""
+    return list_strategy_types()
+
 @router.post("")
 async def save_strategy(strategy: Strategy) -> Dict:
     strategies = load_strategies()
@@ -1,14 +1,25 @@
 # Yahoo Finance API
 from fastapi import APIRouter, HTTPException
-from typing import Optional
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pydantic import BaseModel
+from typing import Dict, List, Optional
 from datetime import datetime, timedelta
-import pandas as pd
-import yfinance as yf
+import numpy as np
 import os
 
+from app.core.file_catalog import file_catalog
+from app.core.indicator_cache import indicator_cache
+from app.core.jobs import Job, JobStoreFull, job_manager, stream_job_events
+from app.core.price_provider import PriceProvider, fetch_history, price_provider
+from app.core.price_repository import price_repository
+from app.core.price_store import DATA_DIR, PriceChanges, PriceColumnError, update_price_series
+
 router = APIRouter()
 
-DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data")
+# 批次更新時同時下載的檔案數
+REFRESH_CONCURRENCY = 4
 
 # 支援的幣種對應表
 SYMBOL_MAPPING = {
@@ -38,134 +49,202 @@ async def get_supported_symbols():
     }
 
 
-@router.post("/update/{file_id:path}")
-async def update_file_from_yahoo(file_id: str):
-    """從 Yahoo Finance 更新指定檔案的資料"""
+class UnsupportedSymbolError(ValueError):
+    """檔案沒有對應的 Yahoo symbol"""
+
+
+def refresh_file(file_id: str, provider: PriceProvider = None) -> Dict:
+    """下載最後日期之後的資料並寫入 WAL（阻塞，需在執行緒中呼叫）。
+    找不到檔案拋出 FileNotFoundError，不支援的檔案拋出 UnsupportedSymbolError"""
+    provider = provider or price_provider
     # 移除可能存在的副檔名
     clean_file_id = file_id.replace(".xlsx", "").replace(".xls", "")
-    file_path = os.path.join(DATA_DIR, f"{clean_file_id}.xlsx")
-    
-    if not os.path.exists(file_path):
-        raise HTTPException(status_code=404, detail=f"找不到檔案: {clean_file_id}")
+    store_id = f"{clean_file_id}.xlsx"
+    if not os.path.exists(os.path.join(DATA_DIR, store_id)):
+        raise FileNotFoundError(f"找不到檔案: {clean_file_id}")
     
     # 取得對應的 Yahoo symbol
     symbol = get_yahoo_symbol(clean_file_id)
     if not symbol:
-        raise HTTPException(
-            status_code=400, 
-            detail=f"不支援此檔案的自動更新: {file_id}。支援的檔案: {list(SYMBOL_MAPPING.keys())}"
+        raise UnsupportedSymbolError(
+            f"不支援此檔案的自動更新: {file_id}。支援的檔案: {list(SYMBOL_MAPPING.keys())}"
         )
     
-    try:
-        # 讀取現有資料
-        df_existing = pd.read_excel(file_path)
-        
-        # 找出日期欄位
-        date_col = None
-        for col in df_existing.columns:
-            if 'date' in col.lower() or '日期' in col:
-                date_col = col
-                break
-        
-        if date_col is None:
-            date_col = df_existing.columns[0]
-        
-        # 找出收盤價欄位
-        close_col = None
-        for col in df_existing.columns:
-            if 'close' in col.lower() or '收盤' in col or '價格' in col:
-                close_col = col
-                break
-        
-        if close_col is None:
-            close_col = df_existing.columns[1] if len(df_existing.columns) > 1 else None
-        
-        # 取得最後一筆資料的日期
-        df_existing[date_col] = pd.to_datetime(df_existing[date_col])
-        last_date = df_existing[date_col].max()
-        
-        # 從最後一天開始下載（包含重疊一天以確保資料完整）
-        start_date = last_date - timedelta(days=1)
-        end_date = datetime.now() + timedelta(days=1)
-        
-        # 下載新資料
-        ticker = yf.Ticker(symbol)
-        df_new = ticker.history(start=start_date, end=end_date)
-        
-        if df_new.empty:
-            return {
-                "status": "no_update",
-                "message": "沒有新資料可更新",
-                "file_id": file_id,
-                "symbol": symbol,
-                "last_date": last_date.strftime("%Y-%m-%d")
-            }
-        
-        # 整理新資料格式
-        df_new = df_new.reset_index()
-        df_new = df_new[['Date', 'Close']].copy()
-        df_new.columns = [date_col, close_col]
-        df_new[date_col] = pd.to_datetime(df_new[date_col]).dt.tz_localize(None)
-        
-        # 合併資料（移除重複日期）
-        df_combined = pd.concat([df_existing, df_new], ignore_index=True)
-        df_combined = df_combined.drop_duplicates(subset=[date_col], keep='last')
-        df_combined = df_combined.sort_values(date_col).reset_index(drop=True)
-        
-        # 儲存更新後的檔案
-        df_combined.to_excel(file_path, index=False)
-        
-        new_last_date = df_combined[date_col].max()
-        rows_added = len(df_combined) - len(df_existing)
-        
+    series = price_repository.get(store_id)
+    
+    # 取得最後一筆資料的日期
+    if not len(series):
+        raise ValueError("檔案沒有有效資料")
+    last_date = series.dates[-1].astype("datetime64[ms]").astype(datetime)
+    
+    # 從最後一天開始下載（包含重疊一天以確保資料完整）
+    start_date = last_date - timedelta(days=1)
+    end_date = datetime.now() + timedelta(days=1)
+    df_new = fetch_history(provider, symbol, start_date, end_date)
+    
+    if df_new.empty:
         return {
-            "status": "success",
-            "message": f"成功更新資料",
+            "status": "no_update",
+            "message": "沒有新資料可更新",
             "file_id": file_id,
             "symbol": symbol,
-            "previous_last_date": last_date.strftime("%Y-%m-%d"),
-            "new_last_date": new_last_date.strftime("%Y-%m-%d"),
-            "rows_added": rows_added,
-            "total_rows": len(df_combined)
+            "last_date": last_date.strftime("%Y-%m-%d")
         }
-        
+    
+    new_days = df_new["date"].to_numpy().astype("datetime64[D]").astype(np.int64)
+    new_closes = df_new["close"].to_numpy(dtype=np.float64)
+    
+    # 重複日期以新資料覆寫，其餘為新增；只把變更寫入 WAL
+    rows_added = 0
+    
+    def build(current, changes: PriceChanges):
+        nonlocal rows_added
+        latest: Dict[int, float] = dict(zip(new_days.tolist(), new_closes.tolist()))
+        for day, close in latest.items():
+            pos = int(np.searchsorted(current.days, day))
+            if pos < len(current) and current.days[pos] == day:
+                if current.closes[pos] != close:
+                    changes.upsert(int(current.rows[pos]), day, close)
+            else:
+                changes.append(day, close)
+                rows_added += 1
+    
+    updated = update_price_series(store_id, build)
+    price_repository.invalidate(store_id)  # 均線快取只延伸新增或覆寫的最後幾筆
+    file_catalog.refresh(store_id)
+    
+    return {
+        "status": "success",
+        "message": f"成功更新資料",
+        "file_id": file_id,
+        "symbol": symbol,
+        "previous_last_date": last_date.strftime("%Y-%m-%d"),
+        "new_last_date": str(updated.dates[-1]),
+        "rows_added": rows_added,
+        "total_rows": updated.meta["total_rows"]
+    }
+
+
+@router.post("/update/{file_id:path}")
+async def update_file_from_yahoo(file_id: str):
+    """從 Yahoo Finance 更新指定檔案的資料（下載在執行緒池中進行，不阻塞事件迴圈）"""
+    try:
+        return await run_in_threadpool(refresh_file, file_id)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except (UnsupportedSymbolError, PriceColumnError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"更新失敗: {str(e)}")
 
 
+# ==================== 批次更新工作 API ====================
+
+class RefreshRequest(BaseModel):
+    file_ids: Optional[List[str]] = None  # 未指定時更新 SYMBOL_MAPPING 中所有存在的檔案
+
+
+def refreshable_files() -> List[str]:
+    """資料目錄中有對應 symbol 的檔案"""
+    return sorted(f for f in os.listdir(DATA_DIR)
+                  if f.endswith(".xlsx") and get_yahoo_symbol(f) is not None)
+
+
+def refresh_files(file_ids: List[str], job: Job, provider: PriceProvider = None,
+                  concurrency: int = REFRESH_CONCURRENCY) -> List[Dict]:
+    """以有限的並行數更新多個檔案，每完成一個檔案就回報結果"""
+    results: List[Dict] = []
+    
+    def run(file_id: str) -> Dict:
+        job.check_cancelled()
+        try:
+            return refresh_file(file_id, provider)
+        except Exception as e:
+            return {"status": "error", "file_id": file_id, "symbol": get_yahoo_symbol(file_id), "message": str(e)}
+    
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="yahoo") as executor:
+        futures = [executor.submit(run, file_id) for file_id in file_ids]
+        try:
+            for future in as_completed(futures):
+                results.append(future.result())
+                job.update(done=len(results), results=list(results))
+        finally:
+            for future in futures:
+                future.cancel()
+    return results
+
+
+@router.post("/jobs")
+async def submit_refresh_job(request: RefreshRequest = None) -> Dict:
+    """建立批次更新工作，立即回傳 job_id；逐檔結果可由 stream 取得"""
+    file_ids = (request.file_ids if request and request.file_ids else None) or refreshable_files()
+    try:
+        job = job_manager.submit("yahoo_refresh", lambda job: refresh_files(file_ids, job), total=len(file_ids))
+    except JobStoreFull as e:
+        raise HTTPException(status_code=429, detail=str(e))
+    return {"job_id": job.id, "status": job.status, "total": job.total, "file_ids": file_ids}
+
+def get_job_or_404(job_id: str) -> Job:
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在或已過期")
+    return job
+
+@router.get("/jobs/{job_id}")
+async def get_refresh_job(job_id: str) -> Dict:
+    """查詢工作進度與已完成的逐檔結果"""
+    return get_job_or_404(job_id).snapshot()
+
+@router.get("/jobs/{job_id}/stream")
+async def stream_refresh_job(job_id: str):
+    """以 Server-Sent Events 串流逐檔結果，直到工作結束"""
+    job = get_job_or_404(job_id)
+    return StreamingResponse(stream_job_events(job), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.delete("/jobs/{job_id}")
+async def cancel_refresh_job(job_id: str) -> Dict:
+    """取消工作（已開始下載的檔案會完成）"""
+    job = job_manager.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="工作不存在或已過期")
+    return {"success": True, "job_id": job_id, "status": job.status}
+
+
+def download_symbol(symbol: str, name: Optional[str] = None, provider: PriceProvider = None) -> Dict:
+    """下載完整歷史並建立新檔案（阻塞）"""
+    provider = provider or price_provider
+    # 使用預設名稱或自訂名稱
+    file_name = name or symbol.replace("-", "_").replace("^", "")
+    file_path = os.path.join(DATA_DIR, f"{file_name}.xlsx")
+    
+    # 下載完整歷史資料
+    df = fetch_history(provider, symbol)
+    
+    if df.empty:
+        raise HTTPException(status_code=404, detail=f"找不到 symbol: {symbol}")
+    
+    # 儲存檔案
+    df.to_excel(file_path, index=False)
+    price_repository.invalidate(f"{file_name}.xlsx")
+    indicator_cache.invalidate(f"{file_name}.xlsx")
+    file_catalog.refresh(f"{file_name}.xlsx")
+    
+    return {
+        "status": "success",
+        "message": f"成功下載 {symbol} 資料",
+        "file_name": file_name,
+        "symbol": symbol,
+        "total_rows": len(df),
+        "start_date": df['date'].min().strftime("%Y-%m-%d"),
+        "end_date": df['date'].max().strftime("%Y-%m-%d")
+    }
+
+
 @router.post("/download")
 async def download_new_symbol(symbol: str, name: Optional[str] = None):
     """下載新的幣種資料"""
     try:
-        # 使用預設名稱或自訂名稱
-        file_name = name or symbol.replace("-", "_").replace("^", "")
-        file_path = os.path.join(DATA_DIR, f"{file_name}.xlsx")
-        
-        # 下載完整歷史資料
-        ticker = yf.Ticker(symbol)
-        df = ticker.history(period="max")
-        
-        if df.empty:
-            raise HTTPException(status_code=404, detail=f"找不到 symbol: {symbol}")
-        
-        # 整理資料格式
-        df = df.reset_index()
-        df = df[['Date', 'Close']].copy()
-        df.columns = ['date', 'close']
-        df['date'] = pd.to_datetime(df['date']).dt.tz_localize(None)
-        
-        # 儲存檔案
-        df.to_excel(file_path, index=False)
-        
-        return {
-            "status": "success",
-            "message": f"成功下載 {symbol} 資料",
-            "file_name": file_name,
-            "symbol": symbol,
-            "total_rows": len(df),
-            "start_date": df['date'].min().strftime("%Y-%m-%d"),
-            "end_date": df['date'].max().strftime("%Y-%m-%d")
-        }
-        
+        return await run_in_threadpool(download_symbol, symbol, name)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"下載失敗: {str(e)}")
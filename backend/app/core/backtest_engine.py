@@ -1,10 +1,46 @@
 # 回測引擎核心邏輯
 import pandas as pd
 import numpy as np
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Callable, Dict, List, Optional, Tuple, Union
 from pydantic import BaseModel
 
+from app.core import metrics as metrics_lib
+from app.core.calendar_index import CalendarIndex, Frequency
+from app.core.encoding import columns_of
+from app.core.instrumentation import stage
+from app.core.strategy_registry import Indicators, get_strategy
+from app.core.simulation import KIND_LONG, KIND_REBALANCE, simulate
+
+
+def _naive_timestamp(value: str) -> pd.Timestamp:
+    ts = pd.Timestamp(value)
+    return ts.tz_convert(None) if ts.tzinfo is not None else ts
+
+
+def _epoch_days(ts: pd.Timestamp) -> int:
+    return int(np.datetime64(ts.date(), "D").astype(np.int64))
+
+
+def date_range(days: np.ndarray, start_date: Optional[str], end_date: Optional[str]) -> Tuple[int, int]:
+    """已排序的 int64 日數中 [start_date, end_date] 的位置範圍（start 含時間時不含當天）"""
+    lo, hi = 0, len(days)
+    if start_date:
+        ts = _naive_timestamp(start_date)
+        day = ts.normalize()
+        first_day = _epoch_days(day) + (1 if ts > day else 0)
+        lo = int(np.searchsorted(days, first_day, side="left"))
+    if end_date:
+        last_day = _epoch_days(_naive_timestamp(end_date).normalize())
+        hi = int(np.searchsorted(days, last_day, side="right"))
+    return lo, max(lo, hi)
+
+
+def _round(value: float, ndigits: int) -> float:
+    """與 np.float64 的 round() 相同（先乘再 rint），確保與舊版結果一致"""
+    return float(np.round(value, ndigits))
+
 class BacktestParams(BaseModel):
     """回測參數"""
     initial_cash: float = 100000
@@ -14,15 +50,19 @@ class BacktestParams(BaseModel):
     strategy_mode: str = "buy_and_hold"
     ma_fast: int = 20
     ma_slow: int = 60
+    # ma_fast / ma_slow 以外的策略參數（例如布林通道的 num_std），未指定時使用策略預設值
+    strategy_params: Dict[str, float] = {}
     trade_direction: str = "long_only"
     enable_rebalance: bool = True
+    # 再平衡頻率：weekly / monthly / quarterly / yearly
+    rebalance_frequency: Frequency = "monthly"
     enable_yield: bool = False
     annual_yield: float = 0.04
     start_date: Optional[str] = None
     end_date: Optional[str] = None
 
-class BacktestResult(BaseModel):
-    """回測結果"""
+class BacktestMetrics(BaseModel):
+    """績效指標（不含權益曲線與交易明細）"""
     total_return: float
     cagr: float
     mdd: float
@@ -34,304 +74,229 @@ class BacktestResult(BaseModel):
     total_trades: int
     win_rate: float
     profit_factor: float
+
+class BacktestResult(BacktestMetrics):
+    """回測結果"""
     equity_curve: List[Dict]
     trades: List[Dict]
     yearly_returns: List[Dict]
     yearly_mdd: List[Dict]
 
+
+def date_strings(days: np.ndarray) -> List[str]:
+    """int64 日數轉為 YYYY-MM-DD 字串"""
+    return np.datetime_as_string(np.asarray(days).astype("datetime64[D]"), unit="D").tolist()
+
+
+def materialize_trades(records: np.ndarray, date_strs: List[str]) -> List[Dict]:
+    """將交易紀錄陣列轉為 API 使用的 dict 列表"""
+    trades = []
+    for rec in records.tolist():
+        kind, entry_idx, exit_idx, entry_price, exit_price, units, pnl, base, cash_after, prev_units = rec
+        entry_idx, exit_idx = int(entry_idx), int(exit_idx)
+        if kind == KIND_REBALANCE:
+            trades.append({
+                "direction": "再平衡",
+                "entry_date": date_strs[exit_idx],
+                "exit_date": date_strs[exit_idx],
+                "entry_price": _round(entry_price, 2),
+                "exit_price": _round(exit_price, 2),
+                "units": _round(units, 4),
+                "pnl": _round(pnl, 2),
+                "pnl_pct": _round(pnl / base * 100, 2) if base > 0 else 0,
+                "note": f"槓桿校正: {prev_units:.2f} -> {units:.2f}"
+            })
+        else:
+            trades.append({
+                "direction": "做多" if kind == KIND_LONG else "做空",
+                "entry_date": date_strs[entry_idx] if entry_idx >= 0 else "",
+                "exit_date": date_strs[exit_idx],
+                "entry_price": _round(entry_price, 2),
+                "exit_price": _round(exit_price, 2),
+                "units": _round(units, 4),
+                "pnl": _round(pnl, 2),  # 實際總損益
+                "pnl_pct": _round(pnl / base * 100, 2) if base > 0 else 0,
+                "cash_before": _round(base, 2),
+                "cash_after": _round(cash_after, 2),
+                "note": ""
+            })
+    return trades
+
+
+@dataclass
+class BacktestRun:
+    """欄位式回測結果；dict 列表只在 API 邊界由 to_result() 產生"""
+    days: np.ndarray            # int64 日數（自 1970-01-01）
+    equity: np.ndarray          # 權益（已四捨五入至 2 位）
+    trades: np.ndarray          # TRADE_DTYPE，索引對應 days
+    metrics: BacktestMetrics
+    yearly_returns: List[Dict]
+    yearly_mdd: List[Dict]
+
+    def equity_curve(self, date_strs: List[str] = None, picks: Optional[np.ndarray] = None) -> List[Dict]:
+        """picks 為要輸出的位置（例如降採樣結果），未指定時輸出全部"""
+        date_strs = date_strs if date_strs is not None else date_strings(self.days)
+        if picks is None:
+            return [{"date": d, "value": v} for d, v in zip(date_strs, self.equity.tolist())]
+        return [{"date": date_strs[i], "value": v} for i, v in zip(picks.tolist(), self.equity[picks].tolist())]
+
+    def trade_list(self, date_strs: List[str] = None) -> List[Dict]:
+        date_strs = date_strs if date_strs is not None else date_strings(self.days)
+        return materialize_trades(self.trades, date_strs)
+
+    def to_columns(self, picks: Optional[np.ndarray] = None) -> Dict:
+        """欄位式輸出（與 to_result 欄位相同，列表欄位改為 {欄位: 陣列}），權益曲線直接取自陣列"""
+        picks = np.arange(len(self.days)) if picks is None else picks
+        return {
+            **self.metrics.model_dump(),
+            "equity_curve": {"date": date_strings(self.days[picks]), "value": self.equity[picks]},
+            "trades": columns_of(self.trade_list()),
+            "yearly_returns": columns_of(self.yearly_returns),
+            "yearly_mdd": columns_of(self.yearly_mdd),
+        }
+
+    def to_dict(self, picks: Optional[np.ndarray] = None) -> Dict:
+        """與 to_result 欄位相同的 dict，API 直接編碼輸出，不經 Pydantic 驗證與序列化"""
+        date_strs = date_strings(self.days)
+        return {
+            **self.metrics.model_dump(),
+            "equity_curve": self.equity_curve(date_strs, picks),
+            "trades": self.trade_list(date_strs),
+            "yearly_returns": self.yearly_returns,
+            "yearly_mdd": self.yearly_mdd,
+        }
+
+    def to_result(self, picks: Optional[np.ndarray] = None) -> BacktestResult:
+        """picks 只影響權益曲線輸出的點，交易明細與指標不變"""
+        return BacktestResult(**self.to_dict(picks))
+
 class BacktestEngine:
     """回測引擎"""
     
-    def __init__(self, df: pd.DataFrame, date_col: str, close_col: str):
-        self.df = df.copy()
-        self.date_col = date_col
-        self.close_col = close_col
-        
-    def run(self, params: BacktestParams) -> BacktestResult:
-        """執行回測"""
-        df = self.df.copy()
-        
-        if params.start_date:
-            df = df[df[self.date_col] >= pd.to_datetime(params.start_date)]
-        if params.end_date:
-            df = df[df[self.date_col] <= pd.to_datetime(params.end_date)]
+    def __init__(self, days: np.ndarray, closes: np.ndarray,
+                 ma_source: Optional[Callable[[int, int], np.ndarray]] = None,
+                 calendar: Optional[CalendarIndex] = None):
+        """days 為已排序的 int64 日數（自 1970-01-01），closes 為對應收盤價；兩者皆不複製"""
+        self.days = np.asarray(days, dtype=np.int64)
+        self.closes = np.asarray(closes, dtype=np.float64)
+        if len(self.days) != len(self.closes):
+            raise ValueError("日期與價格長度不一致")
+        # 可選：ma_source(window, start) 回傳 closes[start:] 移動平均的函式（例如 indicator_cache）
+        self.ma_source = ma_source
+        # 月 / 年等區段邊界；價格序列已帶有時直接共用
+        self.calendar = calendar if calendar is not None else CalendarIndex(self.days)
+    
+    @classmethod
+    def from_series(cls, series, ma_source: Optional[Callable[[int, int], np.ndarray]] = None) -> "BacktestEngine":
+        """直接使用價格儲存層的陣列（memory-mapped，不複製）與日曆索引"""
+        return cls(series.days, series.closes, ma_source=ma_source, calendar=series.calendar)
+    
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, date_col: str, close_col: str) -> "BacktestEngine":
+        """由 DataFrame 建立（會排序並轉為陣列，只在建立時做一次）"""
+        days = df[date_col].to_numpy().astype("datetime64[D]").astype(np.int64)
+        closes = df[close_col].to_numpy(dtype=np.float64)
+        order = np.argsort(days, kind="stable")
+        return cls(days[order], closes[order])
+    
+    def date_range(self, start_date: Optional[str], end_date: Optional[str]) -> Tuple[int, int]:
+        """以 searchsorted 取得 [start_date, end_date] 的位置範圍"""
+        return date_range(self.days, start_date, end_date)
         
-        df = df.reset_index(drop=True)
+    def run(self, params: BacktestParams, metrics_only: bool = False) -> Union[BacktestRun, BacktestMetrics]:
+        """執行回測，回傳欄位式結果；metrics_only 時只計算績效指標"""
+        lo, hi = self.date_range(params.start_date, params.end_date)
         
-        if len(df) < 30:
+        if hi - lo < 30:
             raise ValueError("資料不足，至少需要 30 筆")
         
-        df['MA_Fast'] = df[self.close_col].rolling(window=params.ma_fast).mean()
-        if params.strategy_mode == "dual_ma":
-            df['MA_Slow'] = df[self.close_col].rolling(window=params.ma_slow).mean()
-        
-        df = self._generate_signals(df, params)
-        equity_curve, trades = self._simulate_trades(df, params)
-        result = self._calculate_metrics(equity_curve, trades, params.initial_cash)
-        
-        return result
+        days = self.days[lo:hi]
+        closes = self.closes[lo:hi]
+        with stage("signals"):
+            sig_buy, sig_sell, start_idx = self._generate_signals(closes, lo, hi, params)
+        first = lo + start_idx
+        with stage("simulate"):
+            rebalance_flags = self.calendar.flags(params.rebalance_frequency, first, hi)
+            equity, records = self._simulate_trades(
+                closes[start_idx:], rebalance_flags, sig_buy[start_idx:], sig_sell[start_idx:], params
+            )
+        days = days[start_idx:start_idx + len(equity)]
+        values = np.round(equity, 2)
+        with stage("metrics"):
+            year_bounds = None if metrics_only else self.calendar.segments("yearly", first, first + len(values))
+            metrics, yearly_returns, yearly_mdd = self._calculate_metrics(
+                days, values, records, params.initial_cash, include_yearly=not metrics_only, year_bounds=year_bounds
+            )
+        if metrics_only:
+            return metrics
+        return BacktestRun(days, values, records, metrics, yearly_returns, yearly_mdd)
     
-    def _generate_signals(self, df: pd.DataFrame, params: BacktestParams) -> pd.DataFrame:
-        """產生交易信號"""
-        if params.strategy_mode == "buy_and_hold":
-            df['Signal_Buy'] = False
-            df.loc[df.index[0], 'Signal_Buy'] = True
-            df['Signal_Sell'] = False
-            df['start_idx'] = 0
-        elif params.strategy_mode == "dual_ma":
-            df['Signal_Buy'] = (df['MA_Fast'] > df['MA_Slow']) & (df['MA_Fast'].shift(1) <= df['MA_Slow'].shift(1))
-            df['Signal_Sell'] = (df['MA_Fast'] < df['MA_Slow']) & (df['MA_Fast'].shift(1) >= df['MA_Slow'].shift(1))
-            df['start_idx'] = params.ma_slow
-        else:
-            df['Signal_Buy'] = (df[self.close_col] > df['MA_Fast']) & (df[self.close_col].shift(1) <= df['MA_Fast'].shift(1))
-            df['Signal_Sell'] = (df[self.close_col] < df['MA_Fast']) & (df[self.close_col].shift(1) >= df['MA_Fast'].shift(1))
-            df['start_idx'] = params.ma_fast
-        return df
+    def _rolling_mean(self, closes: np.ndarray, lo: int, hi: int, window: int) -> np.ndarray:
+        """區間內的移動平均；區間前 window-1 筆為 NaN。
+        未指定 ma_source 時只對區間做 rolling；使用快取時數值取自完整歷史，僅可能差在最後幾位"""
+        if self.ma_source is None:
+            return pd.Series(closes).rolling(window=window).mean().to_numpy()
+        return np.array(self.ma_source(window, lo)[:hi - lo], dtype=np.float64)
     
-    def _simulate_trades(self, df: pd.DataFrame, params: BacktestParams) -> Tuple[List[Dict], List[Dict]]:
-        """模擬交易"""
-        start_idx = int(df['start_idx'].iloc[0]) if 'start_idx' in df.columns else 0
-        df = df.iloc[start_idx:].reset_index(drop=True)
-        
-        cash = float(params.initial_cash)
-        pos = 0
-        entry_price = 0.0
-        entry_date = None
-        entry_cash = 0.0  # 新增：記錄進場時的資產
-        units = 0.0
-        equity_curve = []
-        trades = []
-        
-        for i in range(len(df)):
-            price = df[self.close_col].iloc[i]
-            current_date = df[self.date_col].iloc[i]
-            prev_date = df[self.date_col].iloc[i-1] if i > 0 else current_date
-            
-            current_equity = cash
-            if pos != 0:
-                unrealized_pnl = (price - entry_price) * units * pos
-                
-                if params.enable_yield and pos == 1 and i > 0:
-                    prev_price = df[self.close_col].iloc[i-1]
-                    daily_yield_rate = params.annual_yield / 252
-                    yield_pnl = prev_price * daily_yield_rate * units
-                    cash += yield_pnl
-                
-                current_equity = cash + unrealized_pnl
-                
-                if current_equity < (params.initial_cash * 0.15):
-                    equity_curve.append({"date": current_date.strftime("%Y-%m-%d"), "value": 0})
-                    break
-            
-            equity_curve.append({"date": current_date.strftime("%Y-%m-%d"), "value": round(current_equity, 2)})
-            
-            # 每月再平衡
-            if params.enable_rebalance and i > 0 and current_date.month != prev_date.month and pos != 0 and cash > 0:
-                realized_pnl = (price - entry_price) * units * pos
-                cash = cash + realized_pnl
-                target_units = (cash * params.leverage) / price
-                diff_units = abs(target_units - units)
-                rebalance_fee = diff_units * price * params.fee_rate
-                cash = cash - rebalance_fee
-                trades.append({
-                    "direction": "再平衡",
-                    "entry_date": current_date.strftime("%Y-%m-%d"),
-                    "exit_date": current_date.strftime("%Y-%m-%d"),
-                    "entry_price": round(price, 2),
-                    "exit_price": round(price, 2),
-                    "units": round(target_units, 4),
-                    "pnl": round(-rebalance_fee, 2),
-                    "pnl_pct": round(-rebalance_fee / current_equity * 100, 2) if current_equity > 0 else 0,
-                    "note": f"槓桿校正: {units:.2f} -> {target_units:.2f}"
-                })
-                units = target_units
-                entry_price = price
-            
-            sig_buy = df['Signal_Buy'].iloc[i]
-            sig_sell = df['Signal_Sell'].iloc[i]
-            
-            if pos == 1 and sig_sell:
-                exit_p = price * (1 - params.slippage)
-                pnl = (exit_p - entry_price) * units
-                fee = exit_p * units * params.fee_rate
-                net_pnl = pnl - fee
-                cash_after = cash + net_pnl
-                total_trade_pnl = cash_after - entry_cash  # 實際總損益
-                trades.append({
-                    "direction": "做多",
-                    "entry_date": entry_date.strftime("%Y-%m-%d") if entry_date else "",
-                    "exit_date": current_date.strftime("%Y-%m-%d"),
-                    "entry_price": round(entry_price, 2),
-                    "exit_price": round(exit_p, 2),
-                    "units": round(units, 4),
-                    "pnl": round(total_trade_pnl, 2),  # 改為實際總損益
-                    "pnl_pct": round(total_trade_pnl / entry_cash * 100, 2) if entry_cash > 0 else 0,
-                    "cash_before": round(entry_cash, 2),
-                    "cash_after": round(cash_after, 2),
-                    "note": ""
-                })
-                cash += net_pnl
-                pos, units = 0, 0
-                
-                if params.trade_direction == "long_short" and cash > 0:
-                    pos = -1
-                    entry_price = price * (1 - params.slippage)
-                    entry_cash = cash  # 記錄進場時的資產
-                    position_value = cash * params.leverage
-                    units = position_value / entry_price / (1 + params.fee_rate)
-                    entry_date = current_date
-            
-            elif pos == -1 and sig_buy:
-                exit_p = price * (1 + params.slippage)
-                pnl = (entry_price - exit_p) * units
-                fee = exit_p * units * params.fee_rate
-                net_pnl = pnl - fee
-                cash_after = cash + net_pnl
-                total_trade_pnl = cash_after - entry_cash  # 實際總損益
-                trades.append({
-                    "direction": "做空",
-                    "entry_date": entry_date.strftime("%Y-%m-%d") if entry_date else "",
-                    "exit_date": current_date.strftime("%Y-%m-%d"),
-                    "entry_price": round(entry_price, 2),
-                    "exit_price": round(exit_p, 2),
-                    "units": round(units, 4),
-                    "pnl": round(total_trade_pnl, 2),  # 改為實際總損益
-                    "pnl_pct": round(total_trade_pnl / entry_cash * 100, 2) if entry_cash > 0 else 0,
-                    "cash_before": round(entry_cash, 2),
-                    "cash_after": round(cash_after, 2),
-                    "note": ""
-                })
-                cash += net_pnl
-                pos, units = 0, 0
-                
-                if cash > 0:
-                    pos = 1
-                    entry_price = price * (1 + params.slippage)
-                    entry_cash = cash  # 記錄進場時的資產
-                    position_value = cash * params.leverage
-                    units = position_value / entry_price / (1 + params.fee_rate)
-                    entry_date = current_date
-            
-            elif pos == 0 and cash > 0:
-                if sig_buy:
-                    pos = 1
-                    entry_price = price * (1 + params.slippage)
-                    entry_cash = cash  # 記錄進場時的資產
-                    position_value = cash * params.leverage
-                    units = position_value / entry_price / (1 + params.fee_rate)
-                    entry_date = current_date
-                elif sig_sell and params.trade_direction == "long_short":
-                    pos = -1
-                    entry_price = price * (1 - params.slippage)
-                    entry_cash = cash  # 記錄進場時的資產
-                    position_value = cash * params.leverage
-                    units = position_value / entry_price / (1 + params.fee_rate)
-                    entry_date = current_date
-        
-        return equity_curve, trades
+    def _generate_signals(self, closes: np.ndarray, lo: int, hi: int,
+                          params: BacktestParams) -> Tuple[np.ndarray, np.ndarray, int]:
+        """由策略註冊表產生交易信號，回傳 (買進, 賣出, 起始位置)"""
+        strategy = get_strategy(params.strategy_mode)
+        values = strategy.resolve(params.ma_fast, params.ma_slow, params.strategy_params)
+        indicators = Indicators(closes, sma_source=lambda window: self._rolling_mean(closes, lo, hi, window))
+        sig_buy, sig_sell = strategy.signals(closes, [values], indicators)
+        return sig_buy[0], sig_sell[0], strategy.warmup(values)
     
-    def _calculate_metrics(self, equity_curve: List[Dict], trades: List[Dict], initial_cash: float) -> BacktestResult:
-        """計算績效指標"""
-        if not equity_curve:
-            return BacktestResult(
+    def _simulate_trades(self, closes: np.ndarray, rebalance_flags: np.ndarray, sig_buy: np.ndarray,
+                         sig_sell: np.ndarray, params: BacktestParams) -> Tuple[np.ndarray, np.ndarray]:
+        """模擬交易（核心迴圈見 app.core.simulation），回傳 (權益陣列, 交易紀錄陣列)"""
+        return simulate(
+            closes,
+            rebalance_flags,
+            sig_buy,
+            sig_sell,
+            initial_cash=params.initial_cash,
+            leverage=params.leverage,
+            fee_rate=params.fee_rate,
+            slippage=params.slippage,
+            long_short=params.trade_direction == "long_short",
+            enable_rebalance=params.enable_rebalance,
+            enable_yield=params.enable_yield,
+            annual_yield=params.annual_yield,
+        )
+    
+    def _calculate_metrics(self, days: np.ndarray, values: np.ndarray, records: np.ndarray, initial_cash: float,
+                           include_yearly: bool = True,
+                           year_bounds: Optional[Tuple] = None) -> Tuple[BacktestMetrics, List[Dict], List[Dict]]:
+        """計算績效指標，回傳 (指標, 年度報酬, 年度 MDD)；year_bounds 為日曆索引的年度區段"""
+        if len(values) == 0:
+            return BacktestMetrics(
                 total_return=0, cagr=0, mdd=0, mdd_start=None, mdd_end=None,
                 sharpe_ratio=0, sortino_ratio=0, calmar_ratio=0,
-                total_trades=0, win_rate=0, profit_factor=0,
-                equity_curve=[], trades=[], yearly_returns=[], yearly_mdd=[]
-            )
+                total_trades=0, win_rate=0, profit_factor=0
+            ), [], []
         
-        eq_df = pd.DataFrame(equity_curve)
-        eq_df['date'] = pd.to_datetime(eq_df['date'])
+        batch = metrics_lib.batch_metrics(days, values, initial_cash, include_sortino=True)
+        mdd = batch["mdd"][0]
+        mdd_start, mdd_end = date_strings(days[[batch["mdd_peak_idx"][0], batch["mdd_trough_idx"][0]]])
         
-        final_value = eq_df['value'].iloc[-1]
-        total_return = (final_value / initial_cash - 1) * 100
+        # 與明細相同取到小數 2 位後判斷輸贏
+        pnl = np.round(records["pnl"][records["kind"] != KIND_REBALANCE], 2)
+        total_trades, win_rate, profit_factor = metrics_lib.trade_stats(pnl)
         
-        days = (eq_df['date'].iloc[-1] - eq_df['date'].iloc[0]).days
-        cagr = ((1 + total_return / 100) ** (365 / days) - 1) * 100 if days > 0 else 0
+        yearly_returns, yearly_mdd = metrics_lib.yearly_stats(days, values, year_bounds) if include_yearly else ([], [])
         
-        mdd, mdd_start, mdd_end = self._calc_max_drawdown(eq_df)
-        
-        returns = eq_df['value'].pct_change().dropna()
-        sharpe = self._calc_sharpe(returns)
-        sortino = self._calc_sortino(returns)
-        calmar = cagr / (mdd * 100) if mdd > 0 else 0
-        
-        pure_trades = [t for t in trades if t['direction'] != '再平衡']
-        wins = [t for t in pure_trades if t['pnl'] > 0]
-        losses = [t for t in pure_trades if t['pnl'] <= 0]
-        
-        total_trades = len(pure_trades)
-        win_rate = (len(wins) / total_trades * 100) if total_trades > 0 else 0
-        
-        total_profit = sum(t['pnl'] for t in wins)
-        total_loss = abs(sum(t['pnl'] for t in losses))
-        profit_factor = total_profit / total_loss if total_loss > 0 else 0
-        
-        eq_df['year'] = eq_df['date'].dt.year
-        yearly_returns = []
-        for year, group in eq_df.groupby('year'):
-            start_val = group['value'].iloc[0]
-            end_val = group['value'].iloc[-1]
-            ret = (end_val / start_val - 1) * 100
-            yearly_returns.append({"year": int(year), "return": round(ret, 2)})
-        
-        yearly_mdd = []
-        for year, group in eq_df.groupby('year'):
-            mdd_y, _, _ = self._calc_max_drawdown(group)
-            yearly_mdd.append({"year": int(year), "mdd": round(mdd_y * 100, 2)})
-        
-        return BacktestResult(
-            total_return=round(total_return, 2),
-            cagr=round(cagr, 2),
-            mdd=round(mdd * 100, 2),
+        metrics = BacktestMetrics(
+            total_return=_round(batch["total_return"][0], 2),
+            cagr=_round(batch["cagr"][0], 2),
+            mdd=_round(mdd * 100, 2),
             mdd_start=mdd_start,
             mdd_end=mdd_end,
-            sharpe_ratio=round(sharpe, 2),
-            sortino_ratio=round(sortino, 2),
-            calmar_ratio=round(calmar, 2),
+            sharpe_ratio=_round(batch["sharpe_ratio"][0], 2),
+            sortino_ratio=_round(batch["sortino_ratio"][0], 2),
+            calmar_ratio=_round(batch["calmar_ratio"][0], 2),
             total_trades=total_trades,
             win_rate=round(win_rate, 2),
-            profit_factor=round(profit_factor, 2),
-            equity_curve=equity_curve,
-            trades=trades,
-            yearly_returns=yearly_returns,
-            yearly_mdd=yearly_mdd
+            profit_factor=round(profit_factor, 2)
         )
-    
-    def _calc_max_drawdown(self, df: pd.DataFrame) -> Tuple[float, Optional[str], Optional[str]]:
-        values = df['value'].values
-        dates = df['date'].values
-        
-        peak = values[0]
-        peak_date = dates[0]
-        max_dd = 0
-        dd_start, dd_end = dates[0], dates[0]
-        
-        for i, val in enumerate(values):
-            if val > peak:
-                peak = val
-                peak_date = dates[i]
-            
-            dd = (val - peak) / peak if peak > 0 else 0
-            if dd < max_dd:
-                max_dd = dd
-                dd_start = peak_date
-                dd_end = dates[i]
-        
-        return abs(max_dd), pd.Timestamp(dd_start).strftime("%Y-%m-%d"), pd.Timestamp(dd_end).strftime("%Y-%m-%d")
-    
-    def _calc_sharpe(self, returns: pd.Series, risk_free: float = 0.02) -> float:
-        if returns.std() == 0:
-            return 0
-        avg_return = returns.mean() * 252
-        std_dev = returns.std() * np.sqrt(252)
-        return (avg_return - risk_free) / std_dev
-    
-    def _calc_sortino(self, returns: pd.Series, risk_free: float = 0.02) -> float:
-        excess = returns - (risk_free / 252)
-        downside = excess[excess < 0]
-        if downside.empty or downside.std() == 0:
-            return 0
-        avg_excess = excess.mean() * 252
-        downside_std = downside.std() * np.sqrt(252)
-        return avg_excess / downside_std
+        return metrics, yearly_returns, yearly_mdd
@@ -0,0 +1,73 @@
+# 日曆索引 - 每個價格序列預先算好週 / 月 / 季 / 年的區段編號與邊界位置，模擬與年度指標只需整數索引
+from dataclasses import dataclass, field
+from typing import Dict, Literal, Tuple, get_args
+
+import numpy as np
+
+# 支援的再平衡 / 分段頻率
+Frequency = Literal["weekly", "monthly", "quarterly", "yearly"]
+FREQUENCIES = get_args(Frequency)
+
+
+def period_ids(days: np.ndarray, freq: str) -> np.ndarray:
+    """每個 bar 所屬區段的編號（週以星期一為起點；1970-01-01 為星期四）"""
+    days = np.asarray(days, dtype=np.int64)
+    if freq == "weekly":
+        return (days + 3) // 7
+    months = days.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    if freq == "monthly":
+        return months
+    if freq == "quarterly":
+        return months // 3
+    if freq == "yearly":
+        return months // 12
+    raise ValueError(f"不支援的頻率: {freq}")
+
+
+@dataclass
+class CalendarIndex:
+    """依 int64 日數建立；各頻率的區段起點位置在第一次使用時計算並保留"""
+    days: np.ndarray
+    _starts: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+    _ids: Dict[str, np.ndarray] = field(default_factory=dict, repr=False)
+
+    def ids(self, freq: str) -> np.ndarray:
+        if freq not in self._ids:
+            self._ids[freq] = period_ids(self.days, freq)
+        return self._ids[freq]
+
+    def starts(self, freq: str) -> np.ndarray:
+        """各區段第一個 bar 的位置（含位置 0）"""
+        if freq not in self._starts:
+            ids = self.ids(freq)
+            self._starts[freq] = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]]) if len(ids) else np.zeros(0, np.int64)
+        return self._starts[freq]
+
+    def flags(self, freq: str, lo: int = 0, hi: int = None) -> np.ndarray:
+        """[lo, hi) 內區段與前一 bar 不同的位置；區間第一筆固定為 False"""
+        hi = len(self.days) if hi is None else hi
+        flags = np.zeros(max(hi - lo, 0), dtype=np.bool_)
+        starts = self.starts(freq)
+        inside = starts[np.searchsorted(starts, lo + 1):np.searchsorted(starts, hi)]
+        flags[inside - lo] = True
+        return flags
+
+    def segments(self, freq: str, lo: int = 0, hi: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """[lo, hi) 內的區段，回傳 (區段標籤, 起點, 終點)，位置相對於 lo；年度標籤為西元年"""
+        hi = len(self.days) if hi is None else hi
+        if hi <= lo:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty, empty
+        starts = self.starts(freq)
+        inner = starts[np.searchsorted(starts, lo + 1):np.searchsorted(starts, hi)]
+        seg_starts = np.r_[lo, inner].astype(np.int64)
+        seg_ends = np.r_[inner, hi].astype(np.int64)
+        labels = self.ids(freq)[seg_starts]
+        if freq == "yearly":
+            labels = labels + 1970
+        return labels, seg_starts - lo, seg_ends - lo
+
+    def trading_days(self, freq: str = "yearly", lo: int = 0, hi: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """各區段的 bar 數，回傳 (區段標籤, 筆數)"""
+        labels, starts, ends = self.segments(freq, lo, hi)
+        return labels, ends - starts
@@ -0,0 +1,96 @@
+# 圖表降採樣 - 以 LTTB 或每區塊最小 / 最大值挑出代表點，保留走勢形狀並縮小回應大小
+from typing import Optional
+
+import numpy as np
+
+from app.core.backtest_engine import date_range
+
+# lttb：三角形面積最大的點（視覺上最接近原曲線）；minmax：每區塊的最低與最高點（保留極值）；none：不降採樣
+DOWNSAMPLE_METHODS = ("lttb", "minmax", "none")
+# 圖表預設最多輸出的點數
+DEFAULT_MAX_POINTS = 500
+# 未指定日期區間與筆數時，預覽與圖表只取最後 N 筆
+DEFAULT_LAST_ROWS = 500
+MIN_POINTS = 3
+# min-max 至少要有一個區塊的最低、最高點加上首尾兩點
+MINMAX_MIN_POINTS = 4
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets：首尾必選，中間每個區塊選出與前一選點、下一區塊平均點面積最大的點"""
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    n_buckets = n_out - 2
+    edges = (np.arange(n_buckets + 1) * ((n - 2) / n_buckets)).astype(np.int64) + 1
+    edges[-1] = n - 1
+    # 各區塊平均點與選點無關，先以累加和一次算好（只平均 y 不是 NaN 的點）；最後一個區塊的「下一區塊」為最後一點
+    finite = np.isfinite(y)
+    cx = np.r_[0.0, np.cumsum(np.where(finite, x, 0.0))]
+    cy = np.r_[0.0, np.cumsum(np.where(finite, y, 0.0))]
+    counts = np.diff(np.r_[0, np.cumsum(finite)][edges])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        avg_x = np.r_[(cx[edges[1:]] - cx[edges[:-1]]) / counts, x[-1]]
+        avg_y = np.r_[(cy[edges[1:]] - cy[edges[:-1]]) / counts, y[-1]]
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0], out[-1] = 0, n - 1
+    a = 0
+    for b in range(n_buckets):
+        lo, hi = edges[b], edges[b + 1]
+        bx, by = x[lo:hi], y[lo:hi]
+        area = np.abs((x[a] - avg_x[b + 1]) * (by - y[a]) - (x[a] - bx) * (avg_y[b + 1] - y[a]))
+        a = lo + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        out[b + 1] = a
+    return out
+
+
+def minmax_indices(y: np.ndarray, n_out: int) -> np.ndarray:
+    """每個區塊保留最低與最高點（共約 n_out 點，NaN 不視為極值），另加首尾兩點"""
+    y = np.asarray(y, dtype=np.float64)
+    n = len(y)
+    if n <= n_out:
+        return np.arange(n)
+    n_buckets = max(1, (n_out - 2) // 2)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+    # 區塊內依值排序後，區塊第一個位置為最小值、最後一個位置為最大值（NaN 排到不會被選到的一端）
+    nan = np.isnan(y)
+    lowest = np.lexsort((np.where(nan, np.inf, y), bucket))
+    highest = np.lexsort((np.where(nan, -np.inf, y), bucket))
+    picks = np.r_[0, lowest[edges[:-1]], highest[edges[1:] - 1], n - 1]
+    return np.unique(picks)
+
+
+def downsample_indices(x: np.ndarray, y: np.ndarray, max_points: Optional[int],
+                       method: str = "lttb") -> np.ndarray:
+    """回傳保留的位置（遞增）；max_points 為 None、method 為 none 或資料點數不超過上限時保留全部"""
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"不支援的降採樣方式: {method}")
+    n = len(y)
+    if max_points is None or method == "none" or n <= max_points:
+        return np.arange(n)
+    if max_points < MIN_POINTS:
+        raise ValueError(f"降採樣點數至少為 {MIN_POINTS}")
+    if method == "minmax":
+        if max_points < MINMAX_MIN_POINTS:
+            raise ValueError(f"min-max 降採樣點數至少為 {MINMAX_MIN_POINTS}")
+        return minmax_indices(y, max_points)
+    return lttb_indices(x, y, max_points)
+
+
+def chart_indices(days: np.ndarray, values: np.ndarray, max_points: Optional[int], method: str = "lttb",
+                  start_date: Optional[str] = None, end_date: Optional[str] = None,
+                  last: Optional[int] = None) -> np.ndarray:
+    """先取 [start_date, end_date]（last 再限制為最後 N 筆）的日期區間，再以 values 的形狀降採樣；
+    三者皆未指定時只取最後 DEFAULT_LAST_ROWS 筆，last 為 0 時不限制筆數。
+    回傳原陣列中的位置，同一圖表的其他序列（均線等）以相同位置取值即可對齊"""
+    if last is None and start_date is None and end_date is None:
+        last = DEFAULT_LAST_ROWS
+    lo, hi = date_range(days, start_date, end_date)
+    if last:
+        lo = max(lo, hi - max(last, 0))
+    picks = downsample_indices(np.asarray(days[lo:hi]), np.asarray(values[lo:hi]), max_points, method)
+    return picks + lo
@@ -0,0 +1,101 @@
+# 回應編碼 - 預設以 orjson 輸出 JSON；依 Accept 標頭可改為欄位式（平行陣列）JSON 或 MessagePack
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from fastapi import HTTPException
+from starlette.responses import JSONResponse, Response
+
+from app.core.instrumentation import stage
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+JSON_MEDIA_TYPE = "application/json"
+# 欄位式 JSON：每個列表欄位改為 {欄位名: 陣列}，例如 equity_curve = {"date": [...], "value": [...]}
+COLUMNAR_MEDIA_TYPE = "application/vnd.backtest.columnar+json"
+# 欄位式內容以 MessagePack 編碼（選用，需另外安裝 msgpack；未安裝時只指定此格式的請求回傳 406）
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _to_builtin(obj: Any) -> Any:
+    """numpy 陣列與純量轉為 Python 型別（json / msgpack 的 default）"""
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f"無法編碼的型別: {type(obj).__name__}")
+
+
+def dumps_json(content: Any) -> bytes:
+    """JSON 編碼；numpy 陣列直接輸出，NaN 與無限大輸出為 null"""
+    if ORJSON_AVAILABLE:
+        return orjson.dumps(content, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS,
+                            default=_to_builtin)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":"), default=_to_builtin).encode("utf-8")
+
+
+class FastJSONResponse(JSONResponse):
+    """以 dumps_json 編碼的 JSONResponse，作為沒有回傳型別的路由的預設回應類別"""
+
+    def render(self, content: Any) -> bytes:
+        with stage("encode"):
+            return dumps_json(content)
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """依 Accept 標頭的順序選出第一個支援的格式，沒有指定時為 JSON；
+    列出的格式都不支援（例如未安裝 msgpack 時只接受 MessagePack）時回傳 406，不改送其他格式"""
+    if not accept or not accept.strip():
+        return JSON_MEDIA_TYPE
+    for part in accept.split(","):
+        media_type, _, params = part.partition(";")
+        media_type = media_type.strip().lower()
+        q = next((p.split("=", 1)[1] for p in params.split(";") if p.strip().startswith("q=")), "1")
+        try:
+            if float(q) <= 0:
+                continue
+        except ValueError:
+            pass
+        if media_type == COLUMNAR_MEDIA_TYPE:
+            return media_type
+        if media_type in MSGPACK_MEDIA_TYPES and MSGPACK_AVAILABLE:
+            return media_type
+        if media_type in (JSON_MEDIA_TYPE, "application/*", "*/*"):
+            return JSON_MEDIA_TYPE
+    supported = [JSON_MEDIA_TYPE, COLUMNAR_MEDIA_TYPE] + (list(MSGPACK_MEDIA_TYPES) if MSGPACK_AVAILABLE else [])
+    raise HTTPException(status_code=406, detail=f"不支援的回應格式: {accept}；可用格式: {', '.join(supported)}")
+
+
+def columns_of(rows: List[Dict]) -> Dict[str, List]:
+    """dict 列表轉為欄位式；各列欄位不一致時以 None 補齊"""
+    keys: Dict[str, None] = {}
+    for row in rows:
+        keys.update(dict.fromkeys(row))
+    return {k: [row.get(k) for row in rows] for k in keys}
+
+
+def rows_of(columns: Dict[str, Sequence]) -> List[Dict]:
+    """欄位式轉回 dict 列表（一般 JSON 格式）"""
+    keys = list(columns)
+    values = [c.tolist() if isinstance(c, np.ndarray) else c for c in columns.values()]
+    return [dict(zip(keys, row)) for row in zip(*values)]
+
+
+def encoded_response(content: Dict, media_type: str) -> Response:
+    """以協商出的格式編碼欄位式內容"""
+    with stage("encode"):
+        if media_type in MSGPACK_MEDIA_TYPES:
+            body = msgpack.packb(content, default=_to_builtin, use_bin_type=True)
+        else:
+            body = dumps_json(content)
+    return Response(body, media_type=media_type)
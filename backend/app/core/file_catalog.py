@@ -0,0 +1,137 @@
+# 檔案目錄 - 以 JSON sidecar 保存每個檔案的筆數、起訖日期、欄位與雜湊，列表時只需 stat
+import os
+import json
+import uuid
+import threading
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.core.price_repository import price_repository
+from app.core.price_store import DATA_DIR, STORE_DIR, PriceColumnError, store_stamp
+
+CATALOG_PATH = os.path.join(STORE_DIR, "catalog.json")
+
+# 目錄格式版本，欄位變更時遞增即可重建
+CATALOG_VERSION = 1
+
+
+def _date_str(day) -> str:
+    return str(np.datetime64(int(day), "D"))
+
+
+class FileCatalog:
+    """每個檔案一筆 metadata，以 store_stamp（來源、快照、WAL 的 mtime/大小）驗證是否過期"""
+
+    def __init__(self, path: str = CATALOG_PATH):
+        self.path = path
+        self._entries: Optional[Dict[str, Dict]] = None
+        self._lock = threading.Lock()
+
+    def list(self, file_ids: List[str]) -> List[Dict]:
+        """回傳指定檔案的 metadata；過期或缺少的項目在鎖外重新讀取，其餘只需 stat"""
+        entries: Dict[str, Dict] = {}
+        stale = []
+        changed = False
+        with self._lock:
+            self._load()
+            for file_id in file_ids:
+                try:
+                    stamp = list(store_stamp(file_id))
+                except FileNotFoundError:
+                    changed |= self._entries.pop(file_id, None) is not None
+                    continue
+                entry = self._entries.get(file_id)
+                if entry is None or entry.get("stamp") != stamp:
+                    stale.append(file_id)
+                else:
+                    entries[file_id] = entry
+            if changed and not stale:
+                self._save()
+
+        if stale:
+            # 冷目錄的 Excel 轉檔可能很久，不佔住鎖；各檔的寫入由 price_store 的檔案鎖互斥
+            built = {file_id: self._build(file_id) for file_id in stale}
+            with self._lock:
+                for file_id, entry in built.items():
+                    if entry.get("cacheable", True):
+                        self._entries[file_id] = entry
+                self._save()
+            entries.update(built)
+        return [entries[file_id] for file_id in file_ids if file_id in entries]
+
+    def refresh(self, file_id: str) -> Optional[Dict]:
+        """寫入路徑完成後更新單一檔案的 metadata"""
+        entry = self._build(file_id) if os.path.isfile(os.path.join(DATA_DIR, file_id)) else None
+        with self._lock:
+            self._load()
+            if entry is not None and entry.get("cacheable", True):
+                self._entries[file_id] = entry
+            else:
+                self._entries.pop(file_id, None)
+            self._save()
+        return entry
+
+    def remove(self, file_id: str) -> None:
+        with self._lock:
+            self._load()
+            if self._entries.pop(file_id, None) is not None:
+                self._save()
+
+    def _build(self, file_id: str) -> Dict:
+        before = store_stamp(file_id)
+        entry = {"id": file_id}
+        try:
+            series = price_repository.get(file_id)
+        except PriceColumnError as e:
+            # 無法辨識欄位的檔案列為錯誤，並記錄下來避免每次重新解析
+            entry.update(self._stamp(before, store_stamp(file_id)), status="invalid", error=str(e))
+            return entry
+        except Exception as e:
+            # 其他錯誤（例如檔案損壞）不寫入目錄，下次列表重試
+            entry.update(self._stamp(before, before), status="error", error=str(e), cacheable=False)
+            return entry
+
+        meta = series.meta
+        entry.update(self._stamp(before, store_stamp(file_id)))
+        entry.update({
+            "status": "ok",
+            "rows": meta.get("total_rows", len(series)),
+            "start_date": _date_str(series.days[0]) if len(series) else None,
+            "end_date": _date_str(series.days[-1]) if len(series) else None,
+            "columns": meta.get("columns", []),
+            "date_col": series.date_col,
+            "close_col": series.close_col,
+            "hash": meta.get("content_sha1"),
+        })
+        return entry
+
+    @staticmethod
+    def _stamp(before: tuple, after: tuple) -> Dict:
+        """戳記取在讀取之後（首次轉檔才會建立 meta.json）；
+        來源或 WAL 在讀取期間變動時改記讀取前的戳記，下次列表會重建"""
+        moved = before[:2] != after[:2] or before[4:] != after[4:]
+        stamp = list(before if moved else after)
+        return {"stamp": stamp, "mtime_ns": stamp[0]}
+
+    def _load(self) -> None:
+        if self._entries is not None:
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._entries = data.get("files", {}) if data.get("version") == CATALOG_VERSION else {}
+        except (OSError, ValueError):
+            self._entries = {}
+
+    def _save(self) -> None:
+        """以暫存檔 + 原子替換寫入"""
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": CATALOG_VERSION, "files": self._entries}, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+# 全域共用實例
+file_catalog = FileCatalog()
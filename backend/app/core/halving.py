@@ -0,0 +1,114 @@
+# 逐次減半搜尋 - 在連續 / 整數參數範圍隨機取樣，先以較短的近期資料淘汰，只讓少數候選跑完整區間
+import math
+from dataclasses import replace
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.backtest_engine import BacktestParams, date_range
+from app.core.ranking import is_viable
+from app.core.strategy_registry import WINDOW_FIELDS, get_strategy
+from app.core.sweep import SweepEngine, SweepPoint
+
+# 每一輪保留 1 / HALVING_ETA 的候選，資料長度放大 HALVING_ETA 倍
+HALVING_ETA = 3
+# 最短一輪使用的 bar 數
+HALVING_MIN_BARS = 250
+# 最多輪數（含完整區間的最後一輪）
+HALVING_MAX_RUNGS = 4
+# 取樣時每個候選最多嘗試次數（參數空間小於取樣數時提早停止）
+SAMPLE_ATTEMPTS = 20
+# 每輪分塊評估的候選數，區塊之間回報進度（背景工作在此檢查取消）
+RUNG_CHUNK_SIZE = 128
+
+
+def _log_uniform_int(rng: np.random.Generator, lo: int, hi: int) -> int:
+    """整數週期以對數均勻取樣，短週期與長週期被抽到的機會相近"""
+    lo, hi = max(1, int(lo)), max(1, int(hi))
+    if lo >= hi:
+        return lo
+    return int(min(hi, max(lo, round(math.exp(rng.uniform(math.log(lo), math.log(hi + 1)))))))
+
+
+def sample_points(n: int, strategy_modes: Sequence[str], directions: Sequence[str], leverages: Sequence[float],
+                  bounds: Dict[str, Tuple[int, int]], choices: Dict[str, Sequence[float]],
+                  rng: np.random.Generator) -> List[SweepPoint]:
+    """隨機取樣最多 n 個不重複的網格點：週期參數在 bounds 範圍內取整數，其他參數從 choices 或策略預設值挑選"""
+    strategies = [get_strategy(mode) for mode in strategy_modes]
+    points: Dict[SweepPoint, None] = {}
+    for _ in range(n * SAMPLE_ATTEMPTS):
+        if len(points) >= n:
+            break
+        strategy = strategies[rng.integers(len(strategies))]
+        chosen = {}
+        for spec in strategy.params:
+            if spec.name in WINDOW_FIELDS:
+                lo, hi = bounds.get(spec.name, (spec.default, spec.default))
+                chosen[spec.name] = _log_uniform_int(rng, lo, hi)
+            else:
+                options = choices.get(spec.name) or spec.grid or (spec.default,)
+                chosen[spec.name] = options[rng.integers(len(options))]
+        values = strategy.resolve(chosen.get("ma_fast"), chosen.get("ma_slow"), chosen)
+        if not strategy.is_valid(values) or not strategy.accepts(values):
+            continue
+        direction = "long_only" if strategy.hold_from_start else directions[rng.integers(len(directions))]
+        leverage = leverages[rng.integers(len(leverages))]
+        extra = tuple(sorted((k, v) for k, v in values.items() if k not in WINDOW_FIELDS))
+        points.setdefault(SweepPoint(strategy.name, direction, values.get("ma_fast", 0),
+                                     values.get("ma_slow"), leverage, extra))
+    return list(points)
+
+
+def rung_schedule(n_bars: int, budget: int, keep: int) -> List[Tuple[int, int]]:
+    """回傳每一輪的 (候選數, bar 數)；總成本（以完整區間的回測次數計）約等於 budget"""
+    rungs = 1
+    while rungs < HALVING_MAX_RUNGS and n_bars / HALVING_ETA ** rungs >= HALVING_MIN_BARS:
+        rungs += 1
+    # 第 r 輪的成本為 n0 / eta^r × 1 / eta^(rungs-1-r)，每輪相同
+    n0 = max(keep, int(budget * HALVING_ETA ** (rungs - 1) / rungs))
+    schedule = []
+    for r in range(rungs):
+        count = max(keep, int(math.ceil(n0 / HALVING_ETA ** r)))
+        bars = n_bars if r == rungs - 1 else max(HALVING_MIN_BARS, n_bars // HALVING_ETA ** (rungs - 1 - r))
+        schedule.append((count, bars))
+    return schedule
+
+
+def _score(metrics: Optional[Dict], sort_by: str) -> float:
+    """爆倉或無法執行的候選排在最後（與最終排名的過濾條件相同）"""
+    if not is_viable(metrics):
+        return -math.inf
+    return float(metrics[sort_by])
+
+
+def successive_halving(days: np.ndarray, closes: np.ndarray, points: List[SweepPoint], params: BacktestParams,
+                       sort_by: str, schedule: List[Tuple[int, int]],
+                       on_chunk: Callable[[int, int, int], None] = None) -> List[Tuple[SweepPoint, Optional[Dict]]]:
+    """依 schedule 逐輪評估：每輪以 [start_date, end_date] 最近的 bars 根資料評估，保留下一輪所需的前幾名。
+    信號在整個選取區間上只產生一次，較短的輪次只切片模擬；最後一輪即完整區間，績效與網格掃描相同。
+    每輪以 RUNG_CHUNK_SIZE 個候選分塊，on_chunk(輪次, 該輪已評估數, 該輪候選數) 於每塊開始前呼叫，
+    拋出例外即中止。回傳最後一輪的 (網格點, 績效)"""
+    engine = SweepEngine(days, closes)
+    lo, hi = date_range(engine.days, params.start_date, params.end_date)
+    if hi - lo < 30:
+        return [(p, None) for p in points]
+    engine = SweepEngine(engine.days[lo:hi], engine.closes[lo:hi])
+    n = len(engine.days)
+    signals = engine.signals(engine.closes, points)
+    candidates = [p for p, ok in zip(points, signals.valid) if ok]
+
+    results: List[Optional[Dict]] = []
+    for rung, (_, bars) in enumerate(schedule):
+        if rung > 0:
+            keep = schedule[rung][0]
+            order = sorted(range(len(candidates)), key=lambda i: _score(results[i], sort_by), reverse=True)
+            candidates = [candidates[i] for i in sorted(order[:keep])]
+        offset = max(0, n - bars)
+        results = []
+        for start in range(0, max(len(candidates), 1), RUNG_CHUNK_SIZE):
+            if on_chunk:
+                on_chunk(rung, start, len(candidates))
+            chunk = candidates[start:start + RUNG_CHUNK_SIZE]
+            results += engine.evaluate(engine.closes[offset:], engine.days[offset:], chunk,
+                                       replace(signals, valid=[True] * len(chunk)), params, offset=offset)[0]
+    return list(zip(candidates, results))
@@ -0,0 +1,253 @@
+# 均線快取 - 依 (檔案, 視窗) 保存完整歷史的移動平均並以內容版本驗證；追加資料時以相同的補償累加和只延伸新增的部分
+import math
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.price_store import PriceSeries
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# 快取上限 64 MB
+INDICATOR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+# 除了尾端狀態外，另保存倒數第幾根 bar 之前的狀態：最後幾筆被覆寫（例如更新當日收盤價）時從這裡重播
+EXTEND_CHECKPOINT_BARS = 64
+# 滾動狀態欄位：累加和、加入 / 移除的補償值、筆數、負值筆數、連續相同值筆數、前一個值
+STATE_FIELDS = 7
+
+
+@dataclass
+class _Entry:
+    version: str
+    days: np.ndarray
+    closes: np.ndarray
+    ma: np.ndarray
+    # 處理完最後一根 bar 的滾動狀態，以及處理完 checkpoint 之前的狀態
+    state: np.ndarray
+    checkpoint: int
+    checkpoint_state: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.ma.nbytes)
+
+
+def series_version(series: PriceSeries) -> str:
+    """價格序列的內容版本（來源檔案雜湊串接 WAL 紀錄）"""
+    return series.meta.get("content_sha1") or series.meta.get("source_sha1") or series.meta.get("token") or ""
+
+
+def rolling_mean(closes: np.ndarray, window: int) -> np.ndarray:
+    """與 pandas rolling(window).mean() 相同的完整計算"""
+    return pd.Series(closes).rolling(window=window).mean().to_numpy()
+
+
+def _rolling_mean_loop(values, window, begin, end, state, out):
+    """pandas 固定視窗 rolling mean 的逐筆演算法（Kahan 補償的加入 / 移除、全為同值或同號時的修正），
+    從 state 接續計算 out[begin:end] 並更新 state；與 pandas 逐位元相同"""
+    sum_x = state[0]
+    comp_add = state[1]
+    comp_remove = state[2]
+    nobs = state[3]
+    neg_ct = state[4]
+    same = state[5]
+    prev = state[6]
+    for i in range(begin, end):
+        s = i - window + 1
+        if s < 0:
+            s = 0
+        if i == 0 or s >= i:
+            # 視窗與前一個不重疊時重新累加
+            prev = values[s]
+            same = 0.0
+            sum_x = 0.0
+            comp_add = 0.0
+            comp_remove = 0.0
+            nobs = 0.0
+            neg_ct = 0.0
+            first = s
+        else:
+            first = i
+            if i - window >= 0:
+                val = values[i - window]
+                if val == val:
+                    nobs -= 1
+                    y = -val - comp_remove
+                    t = sum_x + y
+                    comp_remove = t - sum_x - y
+                    sum_x = t
+                    if math.copysign(1.0, val) < 0:
+                        neg_ct -= 1
+        for j in range(first, i + 1):
+            val = values[j]
+            if val == val:
+                nobs += 1
+                y = val - comp_add
+                t = sum_x + y
+                comp_add = t - sum_x - y
+                sum_x = t
+                if math.copysign(1.0, val) < 0:
+                    neg_ct += 1
+                if val == prev:
+                    same += 1
+                else:
+                    same = 1.0
+                prev = val
+        if nobs >= window and nobs > 0:
+            result = sum_x / nobs
+            if same >= nobs:
+                result = prev
+            elif neg_ct == 0 and result < 0:
+                result = 0.0
+            elif neg_ct == nobs and result > 0:
+                result = 0.0
+            out[i] = result
+        else:
+            out[i] = np.nan
+    state[0] = sum_x
+    state[1] = comp_add
+    state[2] = comp_remove
+    state[3] = nobs
+    state[4] = neg_ct
+    state[5] = same
+    state[6] = prev
+
+
+if NUMBA_AVAILABLE:
+    _rolling_mean_jit = njit(cache=True, error_model="numpy")(_rolling_mean_loop)
+
+
+def _run(closes: np.ndarray, window: int, begin: int, end: int, state: np.ndarray, out: np.ndarray) -> None:
+    if NUMBA_AVAILABLE:
+        _rolling_mean_jit(closes, window, begin, end, state, out)
+    else:
+        _rolling_mean_loop(closes, window, begin, end, state, out)
+
+
+def compute_rolling_mean(closes: np.ndarray, window: int, ma: Optional[np.ndarray] = None,
+                         state: Optional[np.ndarray] = None,
+                         start: int = 0) -> Tuple[np.ndarray, np.ndarray, int, np.ndarray]:
+    """計算完整歷史的移動平均；指定 ma 與 state（處理完 start 之前的狀態）時保留 ma[:start]，只計算其後的 bar。
+    回傳 (均線, 尾端狀態, checkpoint, checkpoint 之前的狀態)"""
+    closes = np.ascontiguousarray(closes, dtype=np.float64)
+    n = len(closes)
+    out = np.empty(n, dtype=np.float64)
+    if ma is None:
+        start, state = 0, np.zeros(STATE_FIELDS)
+    else:
+        out[:start] = ma[:start]
+        state = state.copy()
+    checkpoint = max(start, n - EXTEND_CHECKPOINT_BARS)
+    _run(closes, window, start, checkpoint, state, out)
+    checkpoint_state = state.copy()
+    _run(closes, window, checkpoint, n, state, out)
+    return out, state, checkpoint, checkpoint_state
+
+
+class IndicatorCache:
+    """均線快取；同一檔案的新版本只在尾端變動時（追加資料、覆寫最後幾筆），從保存的滾動狀態延伸計算，
+    結果與 pandas 重新計算完整歷史逐位元相同"""
+
+    def __init__(self, max_bytes: int = INDICATOR_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, int], _Entry]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.extensions = 0
+        self.evictions = 0
+
+    def rolling_mean(self, series: PriceSeries, window: int, start: int = 0) -> np.ndarray:
+        """取得移動平均（唯讀陣列）：start 為 0 時為完整歷史，否則為 closes[start:] 上的均線且前 window-1 筆為 NaN。
+        start > 0 時數值取自完整歷史（pandas 的累加和自序列起點累積），與只對區間做 rolling 可能差在最後幾位"""
+        ma = self._full(series, int(window))
+        if start <= 0:
+            return ma
+        ma = ma[start:].copy()
+        ma[:window - 1] = np.nan
+        ma.setflags(write=False)
+        return ma
+
+    def _full(self, series: PriceSeries, window: int) -> np.ndarray:
+        key = (series.file_id, window)
+        version = series_version(series)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.ma
+
+        days, closes = np.asarray(series.days), np.asarray(series.closes, dtype=np.float64)
+        resumed = self._resume_point(entry, days, closes) if entry is not None else None
+        if resumed is not None:
+            start, state = resumed
+            ma, state, checkpoint, checkpoint_state = compute_rolling_mean(closes, window, entry.ma, state, start)
+        else:
+            ma, state, checkpoint, checkpoint_state = compute_rolling_mean(closes, window)
+        ma.setflags(write=False)
+
+        with self._lock:
+            if resumed is not None:
+                self.extensions += 1
+            else:
+                self.misses += 1
+            self._remove(key)
+            new_entry = _Entry(version, days, closes, ma, state, checkpoint, checkpoint_state)
+            if new_entry.nbytes <= self.max_bytes:
+                self._entries[key] = new_entry
+                self._bytes += new_entry.nbytes
+                while self._bytes > self.max_bytes:
+                    self._remove(next(iter(self._entries)))
+                    self.evictions += 1
+        return ma
+
+    @staticmethod
+    def _resume_point(entry: _Entry, days: np.ndarray, closes: np.ndarray) -> Optional[Tuple[int, np.ndarray]]:
+        """新版本與快取版本的第一個差異點在尾端狀態或 checkpoint 之後時，回傳 (接續位置, 該位置之前的狀態)"""
+        old_n = len(entry.closes)
+        if len(closes) < old_n:
+            return None
+        changed = np.flatnonzero((entry.days != days[:old_n]) | (entry.closes != closes[:old_n]))
+        first = int(changed[0]) if changed.size else old_n
+        if first == old_n:
+            return old_n, entry.state
+        if first >= entry.checkpoint:
+            return entry.checkpoint, entry.checkpoint_state
+        return None
+
+    def invalidate(self, file_id: str) -> None:
+        """清除檔案所有視窗的快取（改寫歷史資料時呼叫；追加資料不需清除）"""
+        with self._lock:
+            for key in [k for k in self._entries if k[0] == file_id]:
+                self._remove(key)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "extensions": self.extensions,
+                "evictions": self.evictions,
+            }
+
+    def _remove(self, key) -> None:
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry.nbytes
+
+
+# 全域共用實例
+indicator_cache = IndicatorCache()
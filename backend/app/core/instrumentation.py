@@ -0,0 +1,262 @@
+# 效能量測 - 各階段計時（每個請求彙總成 Server-Timing，並累計為 Prometheus 直方圖）與請求層級的 cProfile
+import bisect
+import cProfile
+import io
+import json
+import os
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+# 直方圖的上界（秒）
+STAGE_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# ?profile=1 預設停用（會回傳程式內部資訊且拖慢請求），設定 ENABLE_PROFILING=1 才啟用
+PROFILING_ENABLED = os.environ.get("ENABLE_PROFILING", "0") == "1"
+# profile 摘要輸出的函式數
+PROFILE_TOP_N = 30
+# Prometheus 文字格式的 Content-Type
+METRICS_MEDIA_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 目前請求的各階段累計秒數（run_in_threadpool 會複製 context，執行緒中的階段也記在同一個 dict）
+_request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+# 目前請求的 profile 收集器
+_request_profile: ContextVar[Optional["ProfileCollector"]] = ContextVar("request_profile", default=None)
+
+
+class Histogram:
+    """以標籤區分的累積直方圖（Prometheus 格式：各上界的累計筆數、總和、筆數）"""
+
+    def __init__(self, buckets: Tuple[float, ...] = STAGE_BUCKETS):
+        self.buckets = buckets
+        self._series: Dict[Tuple, List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: Tuple, value: float) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def snapshot(self) -> Dict[Tuple, Tuple[List[int], float, int]]:
+        """回傳 {標籤: (各上界的累計筆數（最後為 +Inf）, 總和, 筆數)}"""
+        with self._lock:
+            out = {}
+            for labels, (counts, total, count) in self._series.items():
+                cumulative, running = [], 0
+                for c in counts:
+                    running += c
+                    cumulative.append(running)
+                out[labels] = (cumulative, total, count)
+            return out
+
+
+# 全域共用實例：各階段耗時（標籤為階段名稱）與 HTTP 請求耗時（標籤為方法、端點函式名稱、狀態碼）
+stage_seconds = Histogram()
+request_seconds = Histogram()
+
+
+def record_stage(name: str, seconds: float) -> None:
+    stage_seconds.observe((name,), seconds)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """計時一個階段；同一請求中同名階段的時間會累加"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(name, time.perf_counter() - start)
+
+
+def begin_request() -> Dict[str, float]:
+    timings: Dict[str, float] = {}
+    _request_timings.set(timings)
+    return timings
+
+
+def server_timing(timings: Dict[str, float], total: float) -> str:
+    """組成 Server-Timing 標頭（毫秒）"""
+    parts = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in timings.items()]
+    parts.append(f"total;dur={total * 1000:.2f}")
+    return ", ".join(parts)
+
+
+class ProfileCollector:
+    """收集一個請求的 cProfile：事件迴圈上的部分由中介層啟用，丟到執行緒的工作以 profiled() 包裝後合併"""
+
+    def __init__(self):
+        self._stats: Optional[pstats.Stats] = None
+        self._lock = threading.Lock()
+
+    def add(self, profiler: cProfile.Profile) -> None:
+        with self._lock:
+            if self._stats is None:
+                self._stats = pstats.Stats(profiler)
+            else:
+                self._stats.add(profiler)
+
+    def summary(self, top_n: int = PROFILE_TOP_N) -> Dict:
+        """依累計時間排序的前幾個函式與 pstats 文字報表"""
+        if self._stats is None:
+            return {"functions": [], "text": ""}
+        stream = io.StringIO()
+        stats = self._stats
+        stats.stream = stream
+        stats.sort_stats("cumulative").print_stats(top_n)
+        functions = []
+        for (filename, line, func), (cc, nc, tt, ct, _) in stats.stats.items():
+            functions.append({"function": f"{os.path.basename(filename)}:{line}({func})", "ncalls": nc,
+                              "tottime": round(tt, 6), "cumtime": round(ct, 6)})
+        functions.sort(key=lambda f: f["cumtime"], reverse=True)
+        return {"functions": functions[:top_n], "text": stream.getvalue()}
+
+
+def begin_profile() -> ProfileCollector:
+    collector = ProfileCollector()
+    _request_profile.set(collector)
+    return collector
+
+
+def profiled(fn: Callable) -> Callable:
+    """包裝要丟到執行緒池的工作：請求開啟 profile 時，在該執行緒上另外 profile 並合併"""
+    collector = _request_profile.get()
+    if collector is None:
+        return fn
+
+    def wrapper(*args, **kwargs):
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profiler.disable()
+            collector.add(profiler)
+    return wrapper
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, le: Optional[str] = None) -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _render_histogram(name: str, help_text: str, names: Tuple[str, ...], histogram: Histogram) -> List[str]:
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    bounds = [repr(b) for b in histogram.buckets] + ["+Inf"]
+    for labels, (cumulative, total, count) in sorted(histogram.snapshot().items()):
+        for le, c in zip(bounds, cumulative):
+            lines.append(f"{name}_bucket{_format_labels(names, labels, le)} {c}")
+        lines.append(f"{name}_sum{_format_labels(names, labels)} {total!r}")
+        lines.append(f"{name}_count{_format_labels(names, labels)} {count}")
+    return lines
+
+
+def render_metrics(caches: Dict[str, Dict]) -> str:
+    """Prometheus 文字格式：各階段與 HTTP 請求的耗時直方圖，以及各快取的命中數、未命中數與命中率
+    caches 為 {快取名稱: stats()}；hits 含磁碟命中（disk_hits）"""
+    lines = _render_histogram("backtest_stage_seconds", "Time spent in each processing stage.",
+                              ("stage",), stage_seconds)
+    lines += _render_histogram("backtest_http_request_seconds", "HTTP request latency by endpoint.",
+                               ("method", "endpoint", "status"), request_seconds)
+    counters = []
+    for cache, stats in caches.items():
+        hits = stats.get("hits", 0) + stats.get("disk_hits", 0)
+        misses = stats.get("misses", 0)
+        counters.append((cache, hits, misses, hits / (hits + misses) if hits + misses else 0.0))
+    for name, kind, help_text, column in (
+        ("backtest_cache_hits_total", "counter", "Cache hits.", 1),
+        ("backtest_cache_misses_total", "counter", "Cache misses.", 2),
+        ("backtest_cache_hit_ratio", "gauge", "Cache hit ratio since start.", 3),
+    ):
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        lines += [f'{name}{{cache="{row[0]}"}} {row[column]!r}' for row in counters]
+    return "\n".join(lines) + "\n"
+
+
+class InstrumentationMiddleware:
+    """ASGI 中介層：每個請求建立階段計時，回應加上 Server-Timing 標頭並記錄請求耗時；
+    PROFILING_ENABLED 且查詢參數 profile=1 時以 cProfile 分析該請求，回應改為 profile 摘要（JSON）。
+    事件迴圈上的 profile 也會包含同時間其他請求的工作；進程池中的掃描不在 profile 範圍內，只反映在階段計時"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = begin_request()
+        profile = PROFILING_ENABLED and parse_qs(scope.get("query_string", b"").decode("latin-1")).get("profile") == ["1"]
+        collector = begin_profile() if profile else None
+        start = time.perf_counter()
+        status = {"code": 500}
+        buffered = {"start": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+                if collector is not None:
+                    # SSE 串流照常送出，其餘回應改送摘要
+                    content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+                    if not content_type.startswith(b"text/event-stream"):
+                        buffered["start"] = message
+                        return
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing(timings, time.perf_counter() - start).encode("latin-1")))
+                message = {**message, "headers": headers}
+            elif message["type"] == "http.response.body" and buffered["start"] is not None:
+                # profile 模式：丟棄原本的回應內容，請求結束後改送摘要
+                return
+            await send(message)
+
+        profiler = None
+        if collector is not None:
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:
+                # 同一執行緒已有其他 profiler 啟用時只收集執行緒池的部分
+                profiler = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            if profiler is not None:
+                profiler.disable()
+                collector.add(profiler)
+            # 以端點函式名稱為標籤（路徑含 file_id 等參數，不適合直接當標籤）
+            endpoint = getattr(scope.get("endpoint"), "__name__", "unmatched")
+            request_seconds.observe((scope["method"], endpoint, str(status["code"])), time.perf_counter() - start)
+        if buffered["start"] is not None:
+            await self._send_profile(send, scope, buffered["start"], collector, timings, start)
+
+    @staticmethod
+    async def _send_profile(send, scope, start_message, collector, timings, start):
+        total = time.perf_counter() - start
+        body = json.dumps({
+            "path": scope["path"],
+            "status": start_message["status"],
+            "total_ms": round(total * 1000, 3),
+            "stages_ms": {name: round(seconds * 1000, 3) for name, seconds in timings.items()},
+            "profile": collector.summary(),
+        }, ensure_ascii=False).encode("utf-8")
+        # 保留原本的標頭（例如 CORS），內容相關的標頭改為摘要的
+        skip = {b"content-type", b"content-length", b"content-encoding"}
+        headers = [(k, v) for k, v in start_message.get("headers", []) if k.lower() not in skip]
+        headers += [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                    (b"server-timing", server_timing(timings, total).encode("latin-1"))]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
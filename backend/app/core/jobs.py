@@ -0,0 +1,172 @@
+# 背景工作管理 - 在執行緒池中執行長時間工作，提供進度查詢與取消
+import time
+import json
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+# 同時執行的背景工作數
+JOB_WORKERS = 2
+# 完成的工作保留秒數
+JOB_TTL_SECONDS = 600
+# 最多保留的工作數（超過時先淘汰最舊的已完成工作；全是未完成的工作時拒絕新工作）
+MAX_JOBS = 100
+# SSE 進度推送間隔（秒）
+JOB_STREAM_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    """工作已被取消"""
+
+
+class JobStoreFull(Exception):
+    """未完成的工作已達 MAX_JOBS，暫時不接受新工作"""
+
+
+@dataclass
+class Job:
+    id: str
+    kind: str
+    status: str = "pending"          # pending / running / completed / failed / cancelled
+    total: int = 0
+    done: int = 0
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    progress: Dict = field(default_factory=dict)
+    result: Any = None
+    error: Optional[str] = None
+    version: int = 0
+    cancel_event: threading.Event = field(default_factory=threading.Event)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("completed", "failed", "cancelled")
+
+    def update(self, done: int = None, total: int = None, **progress) -> None:
+        """由工作函式回報進度；已取消時拋出 JobCancelled"""
+        with self._lock:
+            if done is not None:
+                self.done = done
+            if total is not None:
+                self.total = total
+            self.progress.update(progress)
+            self.version += 1
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def check_cancelled(self) -> None:
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def snapshot(self, include_result: bool = True) -> Dict:
+        with self._lock:
+            elapsed = ((self.finished_at or time.time()) - self.started_at) if self.started_at else 0.0
+            eta = None
+            if self.status == "running" and self.done and self.total:
+                eta = round(elapsed / self.done * (self.total - self.done), 2)
+            data = {
+                "job_id": self.id,
+                "kind": self.kind,
+                "status": self.status,
+                "done": self.done,
+                "total": self.total,
+                "elapsed": round(elapsed, 2),
+                "eta": eta,
+                "progress": dict(self.progress),
+                "error": self.error,
+            }
+            if include_result and self.status == "completed":
+                data["result"] = self.result
+            return data
+
+
+class JobManager:
+    """管理背景工作的建立、查詢、取消與 TTL 淘汰"""
+
+    def __init__(self, workers: int = JOB_WORKERS, ttl: float = JOB_TTL_SECONDS):
+        self.ttl = ttl
+        self._jobs: Dict[str, Job] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+
+    def submit(self, kind: str, fn: Callable[[Job], Any], total: int = 0) -> Job:
+        """建立工作並交給執行緒池；fn 接收 Job 以回報進度。未完成的工作已滿時拋出 JobStoreFull"""
+        job = Job(id=uuid.uuid4().hex, kind=kind, total=total)
+        with self._lock:
+            self._evict()
+            if len(self._jobs) >= MAX_JOBS:
+                raise JobStoreFull(f"背景工作已達上限 {MAX_JOBS} 個，請稍後再試")
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, fn)
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self._lock:
+            self._evict()
+            return self._jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.cancel_event.set()
+        with job._lock:
+            if job.status == "pending":
+                job.status = "cancelled"
+                job.finished_at = time.time()
+                job.version += 1
+        return job
+
+    def _run(self, job: Job, fn: Callable[[Job], Any]) -> None:
+        with job._lock:
+            if job.status != "pending":
+                return
+            job.status = "running"
+            job.started_at = time.time()
+            job.version += 1
+        try:
+            result = fn(job)
+            status, error = "completed", None
+        except JobCancelled:
+            result, status, error = None, "cancelled", None
+        except Exception as e:
+            result, status, error = None, "failed", str(e)
+        with job._lock:
+            job.result = result
+            job.status = status
+            job.error = error
+            job.finished_at = time.time()
+            job.version += 1
+
+    def _evict(self) -> None:
+        now = time.time()
+        expired = [jid for jid, job in self._jobs.items()
+                   if job.finished and job.finished_at and now - job.finished_at > self.ttl]
+        for jid in expired:
+            del self._jobs[jid]
+        if len(self._jobs) >= MAX_JOBS:
+            finished = sorted((job for job in self._jobs.values() if job.finished), key=lambda j: j.finished_at)
+            for job in finished[:len(self._jobs) - MAX_JOBS + 1]:
+                del self._jobs[job.id]
+
+
+async def stream_job_events(job: Job, interval: float = JOB_STREAM_INTERVAL) -> AsyncIterator[str]:
+    """以 Server-Sent Events 格式輸出工作快照（有變動時才送出），直到工作結束"""
+    last_version = -1
+    while True:
+        if job.version != last_version:
+            last_version = job.version
+            snapshot = job.snapshot()
+            yield f"data: {json.dumps(snapshot, ensure_ascii=False, default=float)}\n\n"
+            if job.finished:
+                break
+        await asyncio.sleep(interval)
+
+
+# 全域共用實例
+job_manager = JobManager()
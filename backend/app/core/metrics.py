@@ -0,0 +1,158 @@
+# 績效指標 - 以陣列運算計算報酬、回撤、夏普等指標，可對多條權益曲線（2-D 矩陣）批次計算
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.calendar_index import CalendarIndex
+
+# 年化使用的交易日數
+TRADING_DAYS = 252
+# 無風險利率
+RISK_FREE = 0.02
+
+
+def _rows(values: np.ndarray) -> np.ndarray:
+    return np.atleast_2d(np.asarray(values, dtype=np.float64))
+
+
+def total_return(values: np.ndarray, initial_cash: float) -> np.ndarray:
+    """總報酬率（%），每列一條權益曲線"""
+    return (_rows(values)[:, -1] / initial_cash - 1) * 100
+
+
+def cagr(total_returns: np.ndarray, span_days: int) -> np.ndarray:
+    """年化報酬率（%），整個陣列一次計算次方"""
+    total_returns = np.asarray(total_returns, dtype=np.float64)
+    if span_days <= 0:
+        return np.zeros(len(total_returns))
+    with np.errstate(invalid="ignore"):
+        return (np.power(1 + total_returns / 100, 365 / span_days) - 1) * 100
+
+
+def max_drawdown(values: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """最大回撤（正值比例），回傳 (mdd, 高點位置, 低點位置)；無回撤時兩個位置皆為 0"""
+    values = _rows(values)
+    k, n = values.shape
+    if n == 0:
+        zeros = np.zeros(k, dtype=np.int64)
+        return np.zeros(k), zeros, zeros
+    peak = np.maximum.accumulate(values, axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dd = np.where(peak > 0, (values - peak) / peak, 0.0)
+    rows = np.arange(k)
+    trough = np.argmin(dd, axis=1)
+    worst = np.minimum(dd[rows, trough], 0.0)
+
+    # 每個位置對應的高點：最後一次創新高（嚴格大於先前高點）的位置
+    new_peak = np.ones((k, n), dtype=bool)
+    new_peak[:, 1:] = values[:, 1:] > peak[:, :-1]
+    peak_pos = np.maximum.accumulate(np.where(new_peak, np.arange(n), 0), axis=1)
+
+    has_dd = worst < 0
+    trough = np.where(has_dd, trough, 0)
+    peak_idx = np.where(has_dd, peak_pos[rows, trough], 0)
+    return np.abs(worst), peak_idx, trough
+
+
+def daily_returns(values: np.ndarray) -> np.ndarray:
+    """逐 bar 報酬率（與 pct_change 相同）"""
+    values = _rows(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return values[:, 1:] / values[:, :-1] - 1
+
+
+def _mean_std(returns: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """樣本數不足時與 pandas 相同得到 NaN"""
+    k, n = returns.shape
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = returns.mean(axis=1) if n else np.full(k, np.nan)
+        std = returns.std(axis=1, ddof=1) if n > 1 else np.full(k, np.nan)
+    return mean, std
+
+
+def sharpe_ratio(returns: np.ndarray, risk_free: float = RISK_FREE) -> np.ndarray:
+    """年化夏普比率；含 NaN 的列先去除 NaN 後逐列計算"""
+    returns = _rows(returns)
+    if np.isnan(returns).any():
+        return np.array([sharpe_ratio(r[~np.isnan(r)], risk_free)[0] for r in returns])
+    mean, std = _mean_std(returns)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(std == 0, 0.0, (mean * TRADING_DAYS - risk_free) / (std * np.sqrt(TRADING_DAYS)))
+
+
+def sortino_ratio(returns: np.ndarray, risk_free: float = RISK_FREE) -> np.ndarray:
+    """年化索提諾比率；NaN 與非下檔的位置以遮罩排除，沿 axis 1 一次歸約（每列樣本數可不同）。
+    無下檔樣本或下檔標準差為 0 時為 0，只有 1 個下檔樣本時與 pandas 相同得到 NaN"""
+    returns = _rows(returns)
+    valid = ~np.isnan(returns)
+    excess = np.where(valid, returns - risk_free / TRADING_DAYS, 0.0)
+    downside = excess < 0
+    n_valid = valid.sum(axis=1)
+    n_down = downside.sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean = excess.sum(axis=1) / n_valid
+        down_mean = np.where(downside, excess, 0.0).sum(axis=1) / n_down
+        dev = np.where(downside, excess - down_mean[:, None], 0.0)
+        std = np.sqrt((dev * dev).sum(axis=1) / (n_down - 1))
+        ratio = mean * TRADING_DAYS / (std * np.sqrt(TRADING_DAYS))
+    return np.where((n_down == 0) | (std == 0), 0.0, ratio)
+
+
+def year_bounds(days: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """依 int64 日數切出年度區段，回傳 (年份, 起點, 終點)"""
+    return CalendarIndex(np.asarray(days)).segments("yearly")
+
+
+def yearly_stats(days: np.ndarray, values: np.ndarray,
+                 bounds: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None) -> Tuple[List[Dict], List[Dict]]:
+    """年度報酬與年度最大回撤，一次走訪年度邊界；bounds 可直接傳入預先算好的 (年份, 起點, 終點)"""
+    values = np.asarray(values, dtype=np.float64)
+    years, starts, ends = bounds if bounds is not None else year_bounds(days)
+    returns = np.round((values[ends - 1] / values[starts] - 1) * 100, 2) if len(years) else []
+    yearly_returns, yearly_mdd = [], []
+    for year, start, end, ret in zip(years.tolist(), starts, ends, returns):
+        mdd, _, _ = max_drawdown(values[start:end])
+        yearly_returns.append({"year": year, "return": float(ret)})
+        # 無回撤的年度維持整數 0（與既有 API 輸出相同）
+        yearly_mdd.append({"year": year, "mdd": float(np.round(mdd[0] * 100, 2)) if mdd[0] > 0 else 0})
+    return yearly_returns, yearly_mdd
+
+
+def trade_stats(pnl: np.ndarray) -> Tuple[int, float, float]:
+    """由每筆交易損益（已取到 2 位）計算 (交易次數, 勝率 %, 獲利因子)"""
+    pnl = np.asarray(pnl, dtype=np.float64)
+    wins = pnl[pnl > 0].tolist()
+    losses = pnl[pnl <= 0].tolist()
+    total = len(pnl)
+    win_rate = (len(wins) / total * 100) if total > 0 else 0
+    # 依序相加，與逐筆累加結果一致
+    total_profit = sum(wins)
+    total_loss = abs(sum(losses))
+    profit_factor = total_profit / total_loss if total_loss > 0 else 0
+    return total, win_rate, profit_factor
+
+
+def batch_metrics(days: np.ndarray, values: np.ndarray, initial_cash: float,
+                  include_sortino: bool = False) -> Dict[str, np.ndarray]:
+    """同一期間的多條權益曲線（k × n，已四捨五入）一次計算主要指標，每個欄位回傳長度 k 的陣列"""
+    values = _rows(values)
+    days = np.asarray(days)
+    span = int(days[-1] - days[0]) if len(days) else 0
+    ret = total_return(values, initial_cash)
+    growth = cagr(ret, span)
+    mdd, peak_idx, trough_idx = max_drawdown(values)
+    returns = daily_returns(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        calmar = np.where(mdd > 0, growth / (mdd * 100), 0.0)
+    out = {
+        "total_return": ret,
+        "cagr": growth,
+        "mdd": mdd,
+        "mdd_peak_idx": peak_idx,
+        "mdd_trough_idx": trough_idx,
+        "sharpe_ratio": sharpe_ratio(returns),
+        "calmar_ratio": calmar,
+    }
+    if include_sortino:
+        out["sortino_ratio"] = sortino_ratio(returns)
+    return out
@@ -0,0 +1,156 @@
+# 蒙地卡羅穩健性分析 - 對回測結果做區塊重抽樣或交易順序洗牌，以矩陣批次計算每條路徑的指標
+import math
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.core import metrics as metrics_lib
+from app.core.backtest_engine import BacktestRun, date_strings, _round
+from app.core.parallel import MAX_WORKERS, get_pool, shutdown_pool
+from app.core.simulation import KIND_REBALANCE
+
+# 單次請求允許的最大路徑數
+MC_MAX_PATHS = 20000
+# 每個區塊（一個 RNG 串流、一次矩陣運算）的路徑數；結果只取決於 seed 與區塊切法，與 worker 數無關
+MC_CHUNK_PATHS = 1000
+# 權益分位帶最多輸出的點數
+MC_BAND_POINTS = 500
+# 輸出的百分位數
+PERCENTILES = (5, 25, 50, 75, 95)
+
+
+class MonteCarloParams(BaseModel):
+    """蒙地卡羅參數；method 為 block_bootstrap（日報酬區塊重抽樣）或 trade_shuffle（交易順序洗牌）"""
+    method: str = "block_bootstrap"
+    n_paths: int = 1000
+    block_size: int = 20
+    seed: Optional[int] = None
+
+
+def bootstrap_paths(returns: np.ndarray, n_paths: int, block_size: int,
+                    rng: np.random.Generator) -> np.ndarray:
+    """循環區塊重抽樣：每條路徑由隨機起點的連續區塊接成，保留區塊內的波動叢聚；回傳 (路徑數 × 報酬數)"""
+    n = len(returns)
+    block_size = max(1, min(block_size, n))
+    n_blocks = math.ceil(n / block_size)
+    starts = rng.integers(0, n, size=(n_paths, n_blocks))
+    idx = (starts[:, :, None] + np.arange(block_size)) % n
+    return returns[idx.reshape(n_paths, -1)[:, :n]]
+
+
+def shuffle_paths(returns: np.ndarray, n_paths: int, rng: np.random.Generator) -> np.ndarray:
+    """每條路徑為交易報酬的一個隨機排列；期末報酬不變，回撤分布隨順序改變"""
+    return rng.permuted(np.broadcast_to(returns, (n_paths, len(returns))), axis=1)
+
+
+def _path_metrics(values: np.ndarray, initial_cash: float, span_days: int, include_sharpe: bool) -> Dict[str, np.ndarray]:
+    ret = metrics_lib.total_return(values, initial_cash)
+    growth = metrics_lib.cagr(ret, span_days)
+    mdd, _, _ = metrics_lib.max_drawdown(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        calmar = np.where(mdd > 0, growth / (mdd * 100), 0.0)
+    out = {"total_return": ret, "cagr": growth, "mdd": mdd * 100, "calmar_ratio": calmar}
+    if include_sharpe:
+        out["sharpe_ratio"] = metrics_lib.sharpe_ratio(metrics_lib.daily_returns(values))
+    return out
+
+
+def _simulate_chunk(method: str, returns: np.ndarray, n_paths: int, block_size: int,
+                    seed: np.random.SeedSequence, initial_cash: float, span_days: int,
+                    grid: np.ndarray) -> Dict[str, np.ndarray]:
+    """產生一個區塊的路徑並計算指標；只回傳指標與分位帶取樣點上的權益，避免傳回整個矩陣"""
+    rng = np.random.default_rng(seed)
+    if method == "trade_shuffle":
+        sampled = shuffle_paths(returns, n_paths, rng)
+    else:
+        sampled = bootstrap_paths(returns, n_paths, block_size, rng)
+    values = np.empty((n_paths, sampled.shape[1] + 1))
+    values[:, 0] = initial_cash
+    np.cumprod(1 + sampled, axis=1, out=values[:, 1:])
+    values[:, 1:] *= initial_cash
+    out = _path_metrics(values, initial_cash, span_days, include_sharpe=method != "trade_shuffle")
+    out["equity"] = values[:, grid]
+    return out
+
+
+def _summary(samples: np.ndarray) -> Dict:
+    samples = samples[np.isfinite(samples)]
+    if samples.size == 0:
+        return {"mean": 0, **{f"p{q}": 0 for q in PERCENTILES}}
+    pct = np.percentile(samples, PERCENTILES)
+    return {"mean": _round(samples.mean(), 2), **{f"p{q}": _round(v, 2) for q, v in zip(PERCENTILES, pct)}}
+
+
+def run_monte_carlo(run: BacktestRun, params: MonteCarloParams, initial_cash: float,
+                    workers: int = None) -> Dict:
+    """對回測結果執行蒙地卡羅分析，回傳各指標的分布與權益分位帶。
+    區塊 i 使用 SeedSequence(seed).spawn 的第 i 個串流，相同 seed 的結果可重現"""
+    if not 1 <= params.n_paths <= MC_MAX_PATHS:
+        raise ValueError(f"路徑數需介於 1 到 {MC_MAX_PATHS}")
+    if params.method == "trade_shuffle":
+        trades = run.trades[run.trades["kind"] != KIND_REBALANCE]
+        trades = trades[trades["base"] > 0]
+        if len(trades) < 2:
+            raise ValueError("交易次數不足，至少需要 2 筆")
+        returns = trades["pnl"] / trades["base"]
+    elif params.method == "block_bootstrap":
+        if params.block_size < 1:
+            raise ValueError("區塊長度至少為 1")
+        equity = run.equity[run.equity > 0]
+        if len(equity) < 2:
+            raise ValueError("權益資料不足")
+        returns = metrics_lib.daily_returns(equity)[0]
+        # 爆倉日的權益為 0，以 -100% 報酬保留
+        if len(equity) < len(run.equity):
+            returns = np.append(returns, -1.0)
+    else:
+        raise ValueError(f"不支援的方法: {params.method}")
+
+    n_points = len(returns) + 1
+    grid = np.unique(np.linspace(0, n_points - 1, min(n_points, MC_BAND_POINTS)).round().astype(np.int64))
+    span_days = int(run.days[-1] - run.days[0]) if len(run.days) else 0
+
+    seed = params.seed if params.seed is not None else int(np.random.SeedSequence().entropy % (2 ** 63))
+    sizes = [min(MC_CHUNK_PATHS, params.n_paths - i) for i in range(0, params.n_paths, MC_CHUNK_PATHS)]
+    streams = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(params.method, returns, size, params.block_size, stream, initial_cash, span_days, grid)
+            for size, stream in zip(sizes, streams)]
+
+    workers = workers or MAX_WORKERS
+    if workers <= 1 or len(args) == 1:
+        chunks = [_simulate_chunk(*a) for a in args]
+    else:
+        pool = get_pool(workers)
+        futures = [pool.submit(_simulate_chunk, *a) for a in args]
+        try:
+            chunks = [f.result() for f in futures]
+        except BrokenProcessPool:
+            # worker 異常結束，下次請求重建進程池
+            shutdown_pool()
+            raise
+        finally:
+            for f in futures:
+                f.cancel()
+
+    merged = {k: np.concatenate([c[k] for c in chunks]) for k in chunks[0]}
+    equity_paths = merged.pop("equity")
+    bands = np.percentile(equity_paths, PERCENTILES, axis=0)
+    if params.method == "trade_shuffle":
+        labels = [{"trade": int(i)} for i in grid]
+    else:
+        labels = [{"date": d} for d in date_strings(run.days[grid])]
+    equity_bands = [
+        {**label, **{f"p{q}": _round(bands[row, col], 2) for row, q in enumerate(PERCENTILES)}}
+        for col, label in enumerate(labels)
+    ]
+
+    return {
+        "method": params.method,
+        "n_paths": params.n_paths,
+        "seed": seed,
+        "metrics": {k: _summary(v) for k, v in merged.items()},
+        "prob_loss": _round((merged["total_return"] < 0).mean() * 100, 2),
+        "equity_bands": equity_bands,
+    }
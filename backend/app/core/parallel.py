@@ -0,0 +1,148 @@
+# 多進程參數掃描 - 價格陣列放在 shared memory，只分派網格點
+import os
+import math
+import threading
+import traceback
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.backtest_engine import BacktestParams
+from app.core.sweep import SweepEngine, SweepPoint
+
+
+def _default_workers() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# 平行處理的最大進程數（OPTIMIZE_WORKERS=1 表示不使用進程池）
+MAX_WORKERS = int(os.environ.get("OPTIMIZE_WORKERS", 0)) or _default_workers()
+# 網格點少於此數量時直接在本進程計算，避免 IPC 成本
+PARALLEL_MIN_POINTS = int(os.environ.get("OPTIMIZE_PARALLEL_MIN_POINTS", 256))
+# 每個 worker 分到的區塊數（略大於 1 以平衡負載）
+CHUNKS_PER_WORKER = 2
+# 本進程執行時的區塊大小
+INLINE_CHUNK_SIZE = 128
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool(workers: int = None) -> ProcessPoolExecutor:
+    """取得常駐進程池（spawn，避免在多執行緒的 uvicorn 中 fork）"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=workers or MAX_WORKERS, mp_context=mp.get_context("spawn"))
+        return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    """worker 端掛載 shared memory"""
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 沒有 track 參數；spawn 的 worker 與主進程共用 resource tracker，重複註冊無影響
+        return shared_memory.SharedMemory(name=name)
+
+
+def _sweep_shared(shm: shared_memory.SharedMemory, n: int, points: List[SweepPoint],
+                  params: Dict) -> List[Optional[Dict]]:
+    """在 shared memory 上的陣列執行掃描；陣列只存在於此函式，回傳後即可關閉區段"""
+    days = np.ndarray((n,), dtype=np.int64, buffer=shm.buf, offset=0)
+    closes = np.ndarray((n,), dtype=np.float64, buffer=shm.buf, offset=n * 8)
+    return SweepEngine(days, closes).run(points, BacktestParams(**params))
+
+
+def _run_chunk(name: str, n: int, points: List[SweepPoint], params: Dict) -> List[Optional[Dict]]:
+    """每個區塊結束時即解除掛載：主進程在掃描結束後 unlink 區段，worker 不保留已失效的對應"""
+    shm = _attach(name)
+    try:
+        return _sweep_shared(shm, n, points, params)
+    except BaseException as e:
+        # traceback 仍引用區段上的陣列，關閉後會指向已解除對應的記憶體，先清除
+        traceback.clear_frames(e.__traceback__)
+        raise
+    finally:
+        shm.close()
+
+
+def _chunk_order(points: List[SweepPoint]) -> List[int]:
+    """依信號分組排序，讓同一區塊內盡量共用均線與信號"""
+    return sorted(range(len(points)), key=lambda i: SweepEngine._signal_key(points[i]))
+
+
+def run_sweep(days: np.ndarray, closes: np.ndarray, points: List[SweepPoint], params: BacktestParams,
+              workers: int = None,
+              on_chunk: Callable[[List[int], List[Optional[Dict]]], None] = None) -> Optional[List[Optional[Dict]]]:
+    """執行參數掃描；網格夠大且 workers > 1 時分派到進程池。
+    未指定 on_chunk 時回傳與 points 對齊的結果列表；指定時結果只以 on_chunk(索引, 結果) 逐區塊交出、
+    不另外保留（回傳 None），拋出例外即中止剩餘區塊"""
+    workers = workers or MAX_WORKERS
+    if on_chunk is None:
+        results: List[Optional[Dict]] = [None] * len(points)
+
+        def on_chunk(chunk: List[int], chunk_results: List[Optional[Dict]]):
+            for i, metrics in zip(chunk, chunk_results):
+                results[i] = metrics
+        _run_chunks(days, closes, points, params, workers, on_chunk)
+        return results
+    _run_chunks(days, closes, points, params, workers, on_chunk)
+    return None
+
+
+def _run_chunks(days: np.ndarray, closes: np.ndarray, points: List[SweepPoint], params: BacktestParams,
+                workers: int, on_chunk: Callable[[List[int], List[Optional[Dict]]], None]) -> None:
+    order = _chunk_order(points)
+
+    if workers <= 1 or len(points) < PARALLEL_MIN_POINTS:
+        # 本進程分塊執行，結果逐塊交給 on_chunk
+        engine = SweepEngine(days, closes)
+        for start in range(0, len(order), INLINE_CHUNK_SIZE):
+            chunk = order[start:start + INLINE_CHUNK_SIZE]
+            on_chunk(chunk, engine.run([points[i] for i in chunk], params))
+        return
+
+    n = len(days)
+    shm = shared_memory.SharedMemory(create=True, size=max(n * 16, 1))
+    futures = {}
+    try:
+        np.ndarray((n,), dtype=np.int64, buffer=shm.buf, offset=0)[:] = days
+        np.ndarray((n,), dtype=np.float64, buffer=shm.buf, offset=n * 8)[:] = closes
+
+        chunk_size = max(1, math.ceil(len(points) / (workers * CHUNKS_PER_WORKER)))
+        chunks = [order[i:i + chunk_size] for i in range(0, len(order), chunk_size)]
+
+        pool = get_pool(workers)
+        payload = params.model_dump()
+        futures = {
+            pool.submit(_run_chunk, shm.name, n, [points[i] for i in chunk], payload): chunk
+            for chunk in chunks
+        }
+
+        for future in as_completed(futures):
+            on_chunk(futures[future], future.result())
+    except BrokenProcessPool:
+        # worker 異常結束，下次請求重建進程池
+        shutdown_pool()
+        raise
+    finally:
+        for future in futures:
+            future.cancel()
+        shm.close()
+        shm.unlink()
@@ -0,0 +1,259 @@
+# 多資產組合回測 - 多個價格序列對齊到聯集日曆（前值填補），依權重與各資產信號配置
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from pydantic import BaseModel
+
+from app.core import metrics as metrics_lib
+from app.core.backtest_engine import date_range, date_strings, _round
+from app.core.calendar_index import CalendarIndex, Frequency
+from app.core.encoding import columns_of
+from app.core.indicator_cache import rolling_mean
+from app.core.price_store import PriceSeries
+from app.core.signals import position_state
+from app.core.strategy_registry import Indicators, get_strategy
+
+
+class PortfolioAsset(BaseModel):
+    """組合中的單一資產與其策略"""
+    file_id: str
+    weight: float = 1.0
+    strategy_mode: str = "buy_and_hold"
+    ma_fast: int = 20
+    ma_slow: int = 60
+    strategy_params: Dict[str, float] = {}
+    trade_direction: str = "long_only"
+
+
+class PortfolioParams(BaseModel):
+    """組合回測參數"""
+    assets: List[PortfolioAsset]
+    initial_cash: float = 100000
+    leverage: float = 1.0
+    fee_rate: float = 0.001
+    slippage: float = 0.0005
+    enable_rebalance: bool = True
+    rebalance_frequency: Frequency = "monthly"
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    # 權益曲線降採樣（lttb / minmax / none）；未指定點數時輸出全部
+    max_points: Optional[int] = None
+    downsample: str = "lttb"
+
+
+class PortfolioResult(BaseModel):
+    """組合回測結果"""
+    total_return: float
+    cagr: float
+    mdd: float
+    mdd_start: Optional[str]
+    mdd_end: Optional[str]
+    sharpe_ratio: float
+    sortino_ratio: float
+    calmar_ratio: float
+    rebalance_count: int
+    total_fees: float
+    equity_curve: List[Dict]
+    weights: List[Dict]
+    assets: List[Dict]
+    yearly_returns: List[Dict]
+    yearly_mdd: List[Dict]
+
+
+def align_series(series_list: List[PriceSeries]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """對齊到所有資產日期的聯集，回傳 (日數, 收盤價矩陣 k × n, 對應各資產原始位置 k × n)；
+    沒有交易的日子沿用前一筆收盤價，上市前為 NaN、位置為 -1"""
+    days = np.unique(np.concatenate([np.asarray(s.days) for s in series_list]))
+    closes = np.full((len(series_list), len(days)), np.nan)
+    positions = np.empty((len(series_list), len(days)), dtype=np.int64)
+    for row, series in enumerate(series_list):
+        pos = np.searchsorted(series.days, days, side="right") - 1
+        positions[row] = pos
+        valid = pos >= 0
+        closes[row, valid] = np.asarray(series.closes)[pos[valid]]
+    return days, closes, positions
+
+
+@dataclass
+class PortfolioRun:
+    """欄位式組合結果；dict 列表只在 API 邊界由 to_result() 產生"""
+    days: np.ndarray            # int64 日數
+    equity: np.ndarray          # 組合權益（已四捨五入至 2 位）
+    targets: np.ndarray         # 各資產目標曝險（k × n，已含方向，未含槓桿）
+    rebalance_count: int
+    total_fees: float
+    assets: List[Dict]
+    metrics: Dict
+
+    def _details(self, date_strs: List[str]) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """回傳 (年度報酬, 年度 MDD, 權重變化)；權重只輸出曝險改變的日子"""
+        yearly_returns, yearly_mdd = metrics_lib.yearly_stats(self.days, self.equity) if len(self.days) else ([], [])
+        changed = np.ones(len(self.days), dtype=bool)
+        changed[1:] = (self.targets[:, 1:] != self.targets[:, :-1]).any(axis=0)
+        weights = [
+            {"date": date_strs[i], **{a["file_id"]: _round(self.targets[row, i], 4) for row, a in enumerate(self.assets)}}
+            for i in np.flatnonzero(changed).tolist()
+        ]
+        return yearly_returns, yearly_mdd, weights
+
+    def to_columns(self, picks: Optional[np.ndarray] = None) -> Dict:
+        """欄位式輸出（與 to_result 欄位相同，列表欄位改為 {欄位: 陣列}）"""
+        picks = np.arange(len(self.days)) if picks is None else picks
+        yearly_returns, yearly_mdd, weights = self._details(date_strings(self.days))
+        return {
+            **self.metrics,
+            "rebalance_count": self.rebalance_count,
+            "total_fees": _round(self.total_fees, 2),
+            "equity_curve": {"date": date_strings(self.days[picks]), "value": self.equity[picks]},
+            "weights": columns_of(weights),
+            "assets": self.assets,
+            "yearly_returns": columns_of(yearly_returns),
+            "yearly_mdd": columns_of(yearly_mdd),
+        }
+
+    def to_result(self, picks: Optional[np.ndarray] = None) -> PortfolioResult:
+        """picks 為權益曲線要輸出的位置（例如降採樣結果），未指定時輸出全部"""
+        date_strs = date_strings(self.days)
+        picks = np.arange(len(self.days)) if picks is None else picks
+        yearly_returns, yearly_mdd, weights = self._details(date_strs)
+        return PortfolioResult(
+            **self.metrics,
+            rebalance_count=self.rebalance_count,
+            total_fees=_round(self.total_fees, 2),
+            equity_curve=[{"date": date_strs[i], "value": v} for i, v in zip(picks.tolist(), self.equity[picks].tolist())],
+            weights=weights,
+            assets=self.assets,
+            yearly_returns=yearly_returns,
+            yearly_mdd=yearly_mdd
+        )
+
+
+def simulate_portfolio(prices: np.ndarray, targets: np.ndarray, rebalance: np.ndarray,
+                       initial_cash: float, leverage: float, cost_rate: float) -> Tuple[np.ndarray, int, float]:
+    """在目標曝險改變或再平衡日調整持倉，其餘期間持倉不變、權益以矩陣乘法一次計算。
+    回傳 (權益, 調整次數, 總手續費)；權益低於初始資金 15% 時歸零並結束"""
+    k, n = prices.shape
+    px = np.nan_to_num(prices, nan=0.0)
+    change = np.zeros(n, dtype=bool)
+    change[0] = True
+    change[1:] = (targets[:, 1:] != targets[:, :-1]).any(axis=0)
+    events = np.flatnonzero(change | rebalance)
+
+    stop_level = initial_cash * 0.15
+    cash = float(initial_cash)
+    units = np.zeros(k)
+    equity = np.empty(n)
+    count = 0
+    fees = 0.0
+    for j, t in enumerate(events.tolist()):
+        end = events[j + 1] if j + 1 < len(events) else n
+        value = cash + units @ px[:, t]
+        if value > 0:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                new_units = np.where(px[:, t] > 0, value * leverage * targets[:, t] / px[:, t], 0.0)
+            traded = (new_units - units) * px[:, t]
+            if np.any(traded != 0):
+                cost = np.abs(traded).sum() * cost_rate
+                cash -= traded.sum() + cost
+                units = new_units
+                count += 1
+                fees += cost
+        segment = cash + units @ px[:, t:end]
+        blown = np.flatnonzero(segment < stop_level)
+        if blown.size:
+            stop = t + int(blown[0])
+            equity[t:stop] = segment[:blown[0]]
+            equity[stop] = 0.0
+            return equity[:stop + 1], count, fees
+        equity[t:end] = segment
+    return equity, count, fees
+
+
+class PortfolioEngine:
+    """多資產組合回測引擎"""
+
+    def __init__(self, series_list: List[PriceSeries],
+                 ma_source: Optional[Callable[[PriceSeries, int], np.ndarray]] = None):
+        """ma_source(series, window) 回傳完整歷史的移動平均（例如 indicator_cache.rolling_mean）"""
+        if not series_list:
+            raise ValueError("至少需要一個資產")
+        self.series_list = series_list
+        self.ma_source = ma_source
+        self.days, self.closes, self.positions = align_series(series_list)
+        self.calendar = CalendarIndex(self.days)
+
+    def _rolling_mean(self, series: PriceSeries, window: int) -> np.ndarray:
+        if self.ma_source is not None:
+            return self.ma_source(series, window)
+        return rolling_mean(np.asarray(series.closes), window)
+
+    def _exposure(self, row: int, asset: PortfolioAsset) -> np.ndarray:
+        """資產自身日曆上由策略註冊表產生信號與持倉方向，再對齊到聯集日曆"""
+        series = self.series_list[row]
+        strategy = get_strategy(asset.strategy_mode)
+        if strategy.hold_from_start:
+            state = np.ones(len(series))
+        else:
+            closes = np.asarray(series.closes)
+            values = strategy.resolve(asset.ma_fast, asset.ma_slow, asset.strategy_params)
+            indicators = Indicators(closes, sma_source=lambda window: self._rolling_mean(series, window))
+            buy, sell = strategy.signals(closes, [values], indicators)
+            state = position_state(buy, sell, asset.trade_direction == "long_short")[0]
+        pos = self.positions[row]
+        return np.where(pos >= 0, state[np.maximum(pos, 0)], 0.0)
+
+    def run(self, params: PortfolioParams) -> PortfolioRun:
+        """執行組合回測；信號使用完整歷史計算，區間開始前的均線暖機不受 start_date 影響"""
+        if len(params.assets) != len(self.series_list):
+            raise ValueError("資產數量與價格序列不一致")
+        weights = np.array([max(a.weight, 0.0) for a in params.assets], dtype=np.float64)
+        if weights.sum() <= 0:
+            raise ValueError("權重總和必須大於 0")
+        weights = weights / weights.sum()
+
+        lo, hi = date_range(self.days, params.start_date, params.end_date)
+        if hi - lo < 30:
+            raise ValueError("資料不足，至少需要 30 筆")
+        days = self.days[lo:hi]
+        prices = self.closes[:, lo:hi]
+        exposure = np.vstack([self._exposure(row, a) for row, a in enumerate(params.assets)])[:, lo:hi]
+        targets = weights[:, None] * exposure * ~np.isnan(prices)
+
+        if params.enable_rebalance:
+            rebalance = self.calendar.flags(params.rebalance_frequency, lo, hi)
+        else:
+            rebalance = np.zeros(len(days), dtype=bool)
+        equity, count, fees = simulate_portfolio(
+            prices, targets, rebalance, params.initial_cash, params.leverage,
+            params.fee_rate + params.slippage
+        )
+        days = days[:len(equity)]
+        values = np.round(equity, 2)
+
+        batch = metrics_lib.batch_metrics(days, values, params.initial_cash, include_sortino=True)
+        mdd_start, mdd_end = date_strings(days[[batch["mdd_peak_idx"][0], batch["mdd_trough_idx"][0]]])
+        metrics = {
+            "total_return": _round(batch["total_return"][0], 2),
+            "cagr": _round(batch["cagr"][0], 2),
+            "mdd": _round(batch["mdd"][0] * 100, 2),
+            "mdd_start": mdd_start,
+            "mdd_end": mdd_end,
+            "sharpe_ratio": _round(batch["sharpe_ratio"][0], 2),
+            "sortino_ratio": _round(batch["sortino_ratio"][0], 2),
+            "calmar_ratio": _round(batch["calmar_ratio"][0], 2),
+        }
+
+        assets = []
+        for row, (asset, series) in enumerate(zip(params.assets, self.series_list)):
+            listed = np.flatnonzero(~np.isnan(prices[row, :len(days)]))
+            first, last = (listed[0], listed[-1]) if listed.size else (None, None)
+            assets.append({
+                "file_id": asset.file_id,
+                "weight": _round(weights[row], 4),
+                "strategy_mode": asset.strategy_mode,
+                "first_date": date_strings(days[[first]])[0] if first is not None else None,
+                "price_return": _round((prices[row, last] / prices[row, first] - 1) * 100, 2) if first is not None else 0,
+            })
+        return PortfolioRun(days, values, targets[:, :len(days)], count, fees, assets, metrics)
+
@@ -0,0 +1,97 @@
+# 行情來源 - 可替換的價格下載介面（Yahoo Finance / 本地 HTTP 測試伺服器），含重試與退避
+import os
+import json
+import time
+from datetime import datetime
+from typing import Optional
+from urllib.parse import quote, urlencode
+from urllib.request import urlopen
+
+import pandas as pd
+import yfinance as yf
+
+# 下載失敗時的重試次數與初始退避秒數（每次加倍）
+FETCH_RETRIES = 3
+FETCH_BACKOFF_SECONDS = 0.5
+# HTTP 來源的逾時秒數
+FETCH_TIMEOUT_SECONDS = 30
+# PRICE_PROVIDER 未設定時使用 Yahoo Finance；設為 http(s) URL 時改用本地 HTTP 來源
+PRICE_PROVIDER = os.environ.get("PRICE_PROVIDER", "yahoo")
+
+
+class PriceProvider:
+    """價格來源介面：回傳含 date（無時區）與 close 欄位、依日期排序的 DataFrame"""
+    name = "base"
+
+    def history(self, symbol: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+        """start 為 None 時下載完整歷史"""
+        raise NotImplementedError
+
+
+class YahooProvider(PriceProvider):
+    """Yahoo Finance；未指定 session 時由 yfinance 共用同一個連線 session"""
+    name = "yahoo"
+
+    def __init__(self, session=None):
+        self.session = session
+
+    def history(self, symbol: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+        ticker = yf.Ticker(symbol, session=self.session)
+        if start is None:
+            df = ticker.history(period="max")
+        else:
+            df = ticker.history(start=start, end=end)
+        if df.empty:
+            return pd.DataFrame({"date": pd.Series(dtype="datetime64[ns]"), "close": pd.Series(dtype=float)})
+        df = df.reset_index()
+        return pd.DataFrame({
+            "date": pd.to_datetime(df["Date"]).dt.tz_localize(None),
+            "close": df["Close"].astype(float),
+        })
+
+
+class HttpJsonProvider(PriceProvider):
+    """本地或測試用 HTTP 來源：GET {base_url}/history/{symbol}?start=&end= 回傳 [{"date", "close"}, ...]"""
+    name = "http"
+
+    def __init__(self, base_url: str):
+        self.base_url = base_url.rstrip("/")
+
+    def history(self, symbol: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> pd.DataFrame:
+        query = {k: v.strftime("%Y-%m-%d") for k, v in (("start", start), ("end", end)) if v is not None}
+        url = f"{self.base_url}/history/{quote(symbol, safe='')}"
+        if query:
+            url += "?" + urlencode(query)
+        with urlopen(url, timeout=FETCH_TIMEOUT_SECONDS) as resp:
+            rows = json.loads(resp.read().decode("utf-8"))
+        df = pd.DataFrame(rows, columns=["date", "close"])
+        df["date"] = pd.to_datetime(df["date"])
+        df["close"] = df["close"].astype(float)
+        return df.sort_values("date").reset_index(drop=True)
+
+
+def fetch_history(provider: PriceProvider, symbol: str, start: Optional[datetime] = None,
+                  end: Optional[datetime] = None, retries: int = FETCH_RETRIES,
+                  backoff: float = FETCH_BACKOFF_SECONDS) -> pd.DataFrame:
+    """下載價格，失敗時以指數退避重試；重試用盡後拋出最後一次的例外"""
+    for attempt in range(retries + 1):
+        try:
+            return provider.history(symbol, start, end)
+        except Exception:
+            if attempt == retries:
+                raise
+            time.sleep(backoff * (2 ** attempt))
+
+
+def get_provider(spec: str = None) -> PriceProvider:
+    """依設定建立價格來源（'yahoo' 或 HTTP 來源的 base URL）"""
+    spec = spec or PRICE_PROVIDER
+    if spec.startswith(("http://", "https://")):
+        return HttpJsonProvider(spec)
+    if spec == "yahoo":
+        return YahooProvider()
+    raise ValueError(f"不支援的價格來源: {spec}")
+
+
+# 全域共用實例
+price_provider = get_provider()
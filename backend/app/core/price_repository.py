@@ -0,0 +1,95 @@
+# 價格序列快取 - 進程內 LRU（以位元組數為上限）
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+from app.core.price_store import DATA_DIR, PriceSeries, load_price_series, store_stamp
+
+# 快取上限 256 MB
+PRICE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+
+
+def _series_nbytes(series: PriceSeries) -> int:
+    return int(series.days.nbytes + series.closes.nbytes + series.rows.nbytes)
+
+
+class PriceSeriesRepository:
+    """依 file_id 回傳已清理、排序的價格序列，來源檔案、快照或 WAL 變動時自動失效"""
+
+    def __init__(self, max_bytes: int = PRICE_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[Tuple, PriceSeries, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, file_id: str) -> PriceSeries:
+        """取得價格序列；檔案不存在時拋出 FileNotFoundError"""
+        source = os.path.join(DATA_DIR, file_id)
+        if not os.path.isfile(source):
+            self.invalidate(file_id)
+            raise FileNotFoundError(file_id)
+        stamp = store_stamp(file_id)
+
+        with self._lock:
+            entry = self._entries.get(file_id)
+            if entry and entry[0] == stamp:
+                self._entries.move_to_end(file_id)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        series = load_price_series(file_id)
+        nbytes = _series_nbytes(series)
+
+        with self._lock:
+            self._remove(file_id)
+            if nbytes <= self.max_bytes:
+                self._entries[file_id] = (stamp, series, nbytes)
+                self._bytes += nbytes
+                while self._bytes > self.max_bytes:
+                    oldest = next(iter(self._entries))
+                    self._remove(oldest)
+                    self.evictions += 1
+        return series
+
+    def invalidate(self, file_id: str) -> None:
+        """清除指定檔案的快取（寫入路徑呼叫）"""
+        with self._lock:
+            if self._remove(file_id):
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+                "files": list(self._entries.keys()),
+            }
+
+    def _remove(self, file_id: str) -> bool:
+        entry = self._entries.pop(file_id, None)
+        if entry is None:
+            return False
+        self._bytes -= entry[2]
+        return True
+
+
+# 全域共用實例
+price_repository = PriceSeriesRepository()
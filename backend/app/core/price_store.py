@@ -0,0 +1,469 @@
+# 價格資料儲存層 - 將 Excel 轉為欄式二進位快照（.npy，可 memory-map），編輯寫入 WAL 後定期壓實
+import os
+import json
+import uuid
+import hashlib
+import threading
+from dataclasses import dataclass, field
+from functools import cached_property
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.calendar_index import CalendarIndex
+from app.core.instrumentation import stage
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    # Windows 沒有 flock，只能保證單一進程內互斥
+    FCNTL_AVAILABLE = False
+
+# BACKTEST_DATA_DIR 可改用其他資料目錄（例如基準測試的暫存目錄）
+DATA_DIR = os.environ.get("BACKTEST_DATA_DIR") or os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data"
+)
+STORE_DIR = os.path.join(DATA_DIR, ".store")
+
+# 儲存格式版本，格式變更時遞增即可讓舊快取失效
+STORE_VERSION = 2
+# WAL 累積的變更筆數達到此值時壓實為新的快照
+WAL_COMPACT_ROWS = 1000
+
+DATE_CANDIDATES = ["date", "日期", "data", "time"]
+CLOSE_CANDIDATES = ["close", "收盤價", "price", "價格"]
+
+# 每個檔案一把鎖，轉檔、寫入 WAL 與壓實互斥（可重入）
+_ingest_locks: Dict[str, "_FileLock"] = {}
+_ingest_locks_guard = threading.Lock()
+
+
+class PriceColumnError(ValueError):
+    """找不到日期或價格欄位"""
+    def __init__(self, message: str = "找不到日期或價格欄位"):
+        super().__init__(message)
+
+
+def detect_columns(df: pd.DataFrame) -> Tuple[Optional[str], Optional[str]]:
+    """取得日期和價格欄位名稱"""
+    lower_cols = [str(c).lower() for c in df.columns]
+    date_col = next((df.columns[lower_cols.index(c)] for c in DATE_CANDIDATES if c in lower_cols), None)
+    close_col = next((df.columns[lower_cols.index(c)] for c in CLOSE_CANDIDATES if c in lower_cols), None)
+    return date_col, close_col
+
+
+@dataclass
+class PriceSeries:
+    """單一檔案的已清理價格序列（依日期排序）"""
+    file_id: str
+    date_col: str
+    close_col: str
+    days: np.ndarray      # int64，自 1970-01-01 起的天數
+    closes: np.ndarray    # float64 收盤價
+    rows: np.ndarray      # int64，對應原始 Excel 的列索引
+    meta: Dict = field(default_factory=dict)
+
+    def __len__(self) -> int:
+        return len(self.days)
+
+    @property
+    def dates(self) -> np.ndarray:
+        return self.days.astype("datetime64[D]")
+
+    @cached_property
+    def calendar(self) -> CalendarIndex:
+        """週 / 月 / 季 / 年的邊界索引，隨序列一起快取（序列內容改變時會建立新的 PriceSeries）"""
+        return CalendarIndex(np.asarray(self.days))
+
+    def to_frame(self) -> pd.DataFrame:
+        """轉為 DataFrame（索引為原始列索引）"""
+        return pd.DataFrame(
+            {self.date_col: self.dates.astype("datetime64[ns]"), self.close_col: np.asarray(self.closes)},
+            index=pd.Index(np.asarray(self.rows)),
+        )
+
+
+def _source_path(file_id: str) -> str:
+    return os.path.join(DATA_DIR, file_id)
+
+
+def _entry_dir(file_id: str) -> str:
+    return os.path.join(STORE_DIR, file_id)
+
+
+def _wal_path(file_id: str) -> str:
+    return os.path.join(_entry_dir(file_id), "wal.jsonl")
+
+
+class _FileLock:
+    """單一檔案的可重入鎖：進程內以 RLock 互斥，最外層取得時再以 flock 鎖住 STORE_DIR/<file_id>.lock，
+    讓多個 uvicorn worker 進程的轉檔、WAL 寫入與壓實也互斥（沒有 fcntl 的平台只保證單一進程內互斥）"""
+
+    def __init__(self, file_id: str):
+        self.path = os.path.join(STORE_DIR, f"{file_id}.lock")
+        self._lock = threading.RLock()
+        self._depth = 0
+        self._fd: Optional[int] = None
+
+    def __enter__(self) -> "_FileLock":
+        self._lock.acquire()
+        try:
+            if self._depth == 0 and FCNTL_AVAILABLE:
+                os.makedirs(STORE_DIR, exist_ok=True)
+                fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+                try:
+                    fcntl.flock(fd, fcntl.LOCK_EX)
+                except BaseException:
+                    os.close(fd)
+                    raise
+                self._fd = fd
+            self._depth += 1
+        except BaseException:
+            self._lock.release()
+            raise
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self._depth -= 1
+        if self._depth == 0 and self._fd is not None:
+            fd, self._fd = self._fd, None
+            fcntl.flock(fd, fcntl.LOCK_UN)
+            os.close(fd)
+        self._lock.release()
+
+
+def _file_lock(file_id: str) -> _FileLock:
+    with _ingest_locks_guard:
+        lock = _ingest_locks.get(file_id)
+        if lock is None:
+            lock = _ingest_locks[file_id] = _FileLock(file_id)
+        return lock
+
+
+def _file_hash(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _read_meta(file_id: str) -> Optional[Dict]:
+    meta_path = os.path.join(_entry_dir(file_id), "meta.json")
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(file_id: str, meta: Dict) -> None:
+    """以原子替換寫入 meta.json"""
+    entry_dir = _entry_dir(file_id)
+    tmp_meta = os.path.join(entry_dir, f"meta-{meta['token']}.tmp")
+    with open(tmp_meta, "w", encoding="utf-8") as f:
+        json.dump(meta, f, ensure_ascii=False)
+    os.replace(tmp_meta, os.path.join(entry_dir, "meta.json"))
+
+
+def _is_fresh(meta: Optional[Dict], st: os.stat_result, source: str) -> bool:
+    """以 mtime/大小判斷，mtime 變動但大小相同時再比對雜湊"""
+    if not meta or meta.get("version") != STORE_VERSION:
+        return False
+    if meta.get("source_size") != st.st_size:
+        return False
+    if meta.get("source_mtime_ns") == st.st_mtime_ns:
+        return True
+    return meta.get("source_sha1") == _file_hash(source)
+
+
+def _ingest(file_id: str, source: str, st: os.stat_result) -> Dict:
+    """讀取 Excel 並寫入欄式檔案，回傳 meta"""
+    with stage("excel_parse"):
+        df = pd.read_excel(source)
+    source_rows = len(df)
+    date_col, close_col = detect_columns(df)
+
+    entry_dir = _entry_dir(file_id)
+    os.makedirs(entry_dir, exist_ok=True)
+    token = uuid.uuid4().hex[:12]
+    meta = {
+        "version": STORE_VERSION,
+        "token": token,
+        "date_col": str(date_col) if date_col else None,
+        "close_col": str(close_col) if close_col else None,
+        "columns": [str(c) for c in df.columns],
+        "source_rows": source_rows,
+        "source_size": st.st_size,
+        "source_mtime_ns": st.st_mtime_ns,
+        "source_sha1": _file_hash(source),
+    }
+    # 目前內容的雜湊（每筆 WAL 紀錄串接更新）、總列數與下一個新列 id
+    meta["content_sha1"] = meta["source_sha1"]
+    meta["total_rows"] = source_rows
+    meta["next_row_id"] = source_rows
+    # 重新轉檔代表來源檔案已被取代，舊的編輯紀錄不再適用
+    _remove_wal(file_id)
+    if not date_col or not close_col:
+        # 無法辨識欄位也記錄下來，避免每次請求都重新解析
+        _write_meta(file_id, meta)
+        return meta
+
+    dates = pd.to_datetime(df[date_col], errors='coerce')
+    closes = pd.to_numeric(df[close_col], errors='coerce')
+    mask = (dates.notna() & closes.notna()).to_numpy()
+
+    days = dates.to_numpy()[mask].astype("datetime64[D]").astype(np.int64)
+    close_values = closes.to_numpy(dtype=np.float64)[mask]
+    rows = np.arange(source_rows, dtype=np.int64)[mask]
+
+    order = np.argsort(days, kind="stable")
+    days, close_values, rows = days[order], close_values[order], rows[order]
+
+    _write_snapshot(file_id, meta, days, close_values, rows)
+    return meta
+
+
+def _write_snapshot(file_id: str, meta: Dict, days: np.ndarray, closes: np.ndarray, rows: np.ndarray) -> None:
+    """寫入 meta['token'] 對應的陣列與 meta，再清除舊版本陣列（已 mmap 的讀取者不受影響）"""
+    entry_dir = _entry_dir(file_id)
+    token = meta["token"]
+    for name, arr in (("days", days), ("close", closes), ("rows", rows)):
+        np.save(os.path.join(entry_dir, f"{name}-{token}.npy"), np.ascontiguousarray(arr))
+
+    _write_meta(file_id, meta)
+
+    for name in os.listdir(entry_dir):
+        if name.endswith(".npy") and f"-{token}." not in name:
+            try:
+                os.remove(os.path.join(entry_dir, name))
+            except OSError:
+                pass
+
+
+def _remove_wal(file_id: str) -> None:
+    try:
+        os.remove(_wal_path(file_id))
+    except OSError:
+        pass
+
+
+def _read_wal(file_id: str, token: str) -> List[Dict]:
+    """讀取屬於目前快照的 WAL 紀錄；寫到一半的最後一行（程序中斷）直接忽略"""
+    records = []
+    try:
+        with open(_wal_path(file_id), "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break
+                if record.get("base") == token:
+                    records.append(record)
+    except FileNotFoundError:
+        pass
+    return records
+
+
+def _apply_records(series: "PriceSeries", records: List[Dict]) -> "PriceSeries":
+    """將 WAL 紀錄套用到序列上；同一列 id 以最後一筆操作為準，操作可重複套用"""
+    meta = dict(series.meta)
+    changes: Dict[int, Optional[Tuple[int, float]]] = {}
+    for record in records:
+        for op in record["ops"]:
+            changes[int(op[1])] = (int(op[2]), float(op[3])) if op[0] == "u" else None
+        meta["content_sha1"] = record["hash"]
+        meta["wal_rows"] = meta.get("wal_rows", 0) + len(record["ops"])
+    if not changes:
+        return PriceSeries(series.file_id, series.date_col, series.close_col,
+                           series.days, series.closes, series.rows, meta)
+
+    ids = np.fromiter(changes.keys(), dtype=np.int64, count=len(changes))
+    existed = np.isin(ids, series.rows)
+    keep = ~np.isin(series.rows, ids)
+    upserts = [(i, v) for i, v in changes.items() if v is not None]
+    new_rows = np.array([i for i, _ in upserts], dtype=np.int64)
+    new_days = np.array([v[0] for _, v in upserts], dtype=np.int64)
+    new_closes = np.array([v[1] for _, v in upserts], dtype=np.float64)
+    removed = np.array([v is None for v in changes.values()], dtype=bool)
+    meta["total_rows"] = meta["total_rows"] + int(np.count_nonzero(~existed & ~removed)) \
+        - int(np.count_nonzero(existed & removed))
+    meta["next_row_id"] = max(meta["next_row_id"], int(ids.max()) + 1)
+
+    days = np.concatenate([series.days[keep], new_days])
+    closes = np.concatenate([series.closes[keep], new_closes])
+    rows = np.concatenate([series.rows[keep], new_rows])
+    order = np.argsort(days, kind="stable")
+    return PriceSeries(series.file_id, series.date_col, series.close_col,
+                       days[order], closes[order], rows[order], meta)
+
+
+def _open(file_id: str, meta: Dict) -> PriceSeries:
+    if not meta.get("date_col") or not meta.get("close_col"):
+        raise PriceColumnError()
+    entry_dir = _entry_dir(file_id)
+    token = meta["token"]
+    load = lambda name: np.load(os.path.join(entry_dir, f"{name}-{token}.npy"), mmap_mode="r")
+    series = PriceSeries(
+        file_id=file_id,
+        date_col=meta["date_col"],
+        close_col=meta["close_col"],
+        days=load("days"),
+        closes=load("close"),
+        rows=load("rows"),
+        meta={**meta, "wal_rows": 0},
+    )
+    records = _read_wal(file_id, token)
+    return _apply_records(series, records) if records else series
+
+
+def load_store_meta(file_id: str) -> Dict:
+    """取得檔案的 meta（欄位、筆數、雜湊等）；來源檔案變動時自動重新轉檔"""
+    source = _source_path(file_id)
+    if not os.path.isfile(source):
+        raise FileNotFoundError(file_id)
+
+    st = os.stat(source)
+    meta = _read_meta(file_id)
+    if _is_fresh(meta, st, source):
+        return meta
+    with _file_lock(file_id):
+        st = os.stat(source)
+        meta = _read_meta(file_id)
+        if not _is_fresh(meta, st, source):
+            return _ingest(file_id, source, st)
+        if meta.get("source_mtime_ns") != st.st_mtime_ns:
+            # 內容相同僅 mtime 變動，更新 meta 以免每次都計算雜湊
+            meta["source_mtime_ns"] = st.st_mtime_ns
+            _write_meta(file_id, meta)
+        return meta
+
+
+def store_stamp(file_id: str) -> Tuple:
+    """來源檔案、快照 meta 與 WAL 的 (mtime, 大小)，任一變動代表序列內容可能改變"""
+    source = os.stat(_source_path(file_id))
+    stamp = [source.st_mtime_ns, source.st_size]
+    for path in (os.path.join(_entry_dir(file_id), "meta.json"), _wal_path(file_id)):
+        try:
+            st = os.stat(path)
+            stamp += [st.st_mtime_ns, st.st_size]
+        except FileNotFoundError:
+            stamp += [0, 0]
+    return tuple(stamp)
+
+
+def load_price_series(file_id: str) -> PriceSeries:
+    """取得價格序列（快照為 memory-mapped，多個 worker 共用同一份檔案；有 WAL 時套用後回傳）"""
+    meta = load_store_meta(file_id)
+    try:
+        return _open(file_id, meta)
+    except OSError:
+        # 其他進程剛好重新轉檔並清掉舊陣列，重新讀取 meta
+        meta = _read_meta(file_id)
+        if meta is None:
+            raise
+        return _open(file_id, meta)
+
+
+def drop_price_series(file_id: str) -> None:
+    """刪除檔案對應的欄式快取"""
+    entry_dir = _entry_dir(file_id)
+    if not os.path.isdir(entry_dir):
+        return
+    with _file_lock(file_id):
+        for name in os.listdir(entry_dir):
+            try:
+                os.remove(os.path.join(entry_dir, name))
+            except OSError:
+                pass
+        try:
+            os.rmdir(entry_dir)
+        except OSError:
+            pass
+
+
+def to_epoch_day(value) -> int:
+    """日期字串或 Timestamp 轉為自 1970-01-01 起的天數"""
+    return int(np.datetime64(pd.Timestamp(value).date(), "D").astype(np.int64))
+
+
+@dataclass
+class PriceChanges:
+    """一次編輯的變更：以列 id 為單位的新增/覆寫與刪除"""
+    next_row_id: int
+    ops: List[List] = field(default_factory=list)
+
+    def append(self, day: int, close: float) -> int:
+        """新增一列，回傳配置的列 id"""
+        row_id = self.next_row_id
+        self.next_row_id += 1
+        self.upsert(row_id, day, close)
+        return row_id
+
+    def upsert(self, row_id: int, day: int, close: float) -> None:
+        self.ops.append(["u", int(row_id), int(day), float(close)])
+
+    def delete(self, row_id: int) -> None:
+        self.ops.append(["d", int(row_id)])
+
+    def __len__(self) -> int:
+        return len(self.ops)
+
+
+def update_price_series(file_id: str, build: Callable[[PriceSeries, PriceChanges], None]) -> PriceSeries:
+    """在檔案鎖內讀取目前序列，由 build 產生變更後附加到 WAL（寫入量只與變更筆數有關）。
+    build 拋出例外時不寫入任何資料；回傳套用變更後的序列"""
+    with _file_lock(file_id):
+        series = load_price_series(file_id)
+        changes = PriceChanges(next_row_id=series.meta["next_row_id"])
+        build(series, changes)
+        if not changes:
+            return series
+
+        payload = json.dumps(changes.ops, separators=(",", ":"))
+        record = {
+            "base": series.meta["token"],
+            "hash": hashlib.sha1((series.meta["content_sha1"] + payload).encode("utf-8")).hexdigest(),
+            "ops": changes.ops,
+        }
+        with open(_wal_path(file_id), "a", encoding="utf-8") as f:
+            f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+        series = _apply_records(series, [record])
+        if series.meta["wal_rows"] >= WAL_COMPACT_ROWS:
+            series = compact_price_series(file_id)
+        return series
+
+
+def compact_price_series(file_id: str) -> PriceSeries:
+    """將 WAL 併入新的欄式快照並清空 WAL"""
+    with _file_lock(file_id):
+        series = load_price_series(file_id)
+        if not series.meta.get("wal_rows"):
+            return series
+        meta = {k: v for k, v in series.meta.items() if k != "wal_rows"}
+        meta["token"] = uuid.uuid4().hex[:12]
+        _write_snapshot(file_id, meta, np.asarray(series.days), np.asarray(series.closes), np.asarray(series.rows))
+        # 新快照的 token 不同，即使刪除前中斷，舊 WAL 紀錄也不會再被套用
+        _remove_wal(file_id)
+        return _open(file_id, meta)
+
+
+def export_price_frame(file_id: str) -> pd.DataFrame:
+    """依目前內容產生完整表格（保留原始 Excel 的其他欄位），供需要時匯出 Excel"""
+    with _file_lock(file_id):
+        series = load_price_series(file_id)
+        base = pd.read_excel(_source_path(file_id))
+    rows = np.asarray(series.rows)
+    # 原始列取回其他欄位；新增的列其他欄位為空
+    frame = base.reindex(rows)
+    columns = {str(c): c for c in base.columns}
+    date_col = columns.get(series.date_col, series.date_col)
+    close_col = columns.get(series.close_col, series.close_col)
+    frame[date_col] = series.dates.astype("datetime64[ns]")
+    frame[close_col] = np.asarray(series.closes)
+    return frame.reset_index(drop=True)
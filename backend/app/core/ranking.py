@@ -0,0 +1,118 @@
+# 串流排名 - 結果到達時即過濾爆倉策略，每個排序指標只保留固定大小的堆積，並可同時維護報酬 / MDD 的 Pareto 前緣
+import bisect
+import heapq
+import math
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# 爆倉門檻：MDD >= 99% 或總報酬 <= -99% 表示幾乎全部虧損
+BLOWUP_MDD = 99
+BLOWUP_RETURN = -99
+# 以報酬與 MDD 的非支配集合取代單一指標排名
+PARETO = "pareto"
+
+
+def is_viable(metrics: Optional[Dict]) -> bool:
+    """可執行且未爆倉"""
+    return metrics is not None and metrics["mdd"] < BLOWUP_MDD and metrics["total_return"] > BLOWUP_RETURN
+
+
+def _score(value: Any) -> float:
+    """NaN 視為最低分，堆積比較才有一致的順序"""
+    value = float(value)
+    return -math.inf if math.isnan(value) else value
+
+
+class TopN:
+    """保留指標最高的 n 筆的最小堆積；同分時保留較早加入（seq 較小）者，結果與穩定排序後取前 n 筆相同"""
+
+    def __init__(self, metric: str, n: int):
+        self.metric = metric
+        self.n = n
+        self._heap: List[Tuple[float, int, Any]] = []
+
+    def push(self, seq: int, metrics: Dict, item: Any) -> None:
+        if self.n <= 0:
+            return
+        entry = (_score(metrics[self.metric]), -seq, item)
+        if len(self._heap) < self.n:
+            heapq.heappush(self._heap, entry)
+        elif entry[:2] > self._heap[0][:2]:
+            heapq.heapreplace(self._heap, entry)
+
+    def items(self) -> List[Any]:
+        """由高到低"""
+        return [item for _, _, item in sorted(self._heap, key=lambda e: e[:2], reverse=True)]
+
+
+class ParetoFrontier:
+    """總報酬越高越好、MDD 越低越好的非支配集合；依 MDD 遞增保存，前緣上的報酬也嚴格遞增。
+    兩者都相同的結果只保留 seq 最小者，結果與加入順序無關"""
+
+    def __init__(self):
+        self._mdd: List[float] = []
+        self._ret: List[float] = []
+        self._seq: List[int] = []
+        self._items: List[Any] = []
+
+    def push(self, seq: int, metrics: Dict, item: Any) -> bool:
+        """加入一筆結果，回傳是否進入前緣"""
+        ret, mdd = float(metrics["total_return"]), float(metrics["mdd"])
+        if math.isnan(ret) or math.isnan(mdd):
+            return False
+        k = bisect.bisect_right(self._mdd, mdd)
+        # MDD 不高於它的點中報酬最高者為 k-1
+        if k > 0 and self._ret[k - 1] >= ret:
+            if self._mdd[k - 1] == mdd and self._ret[k - 1] == ret and seq < self._seq[k - 1]:
+                self._seq[k - 1] = seq
+                self._items[k - 1] = item
+                return True
+            return False
+        # 移除被新點支配的：MDD 相同或較高、報酬不高於它
+        start = k - 1 if k > 0 and self._mdd[k - 1] == mdd else k
+        end = k
+        while end < len(self._ret) and self._ret[end] <= ret:
+            end += 1
+        self._mdd[start:end] = [mdd]
+        self._ret[start:end] = [ret]
+        self._seq[start:end] = [seq]
+        self._items[start:end] = [item]
+        return True
+
+    def items(self) -> List[Any]:
+        """依總報酬由高到低（MDD 也由高到低）"""
+        return self._items[::-1]
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+
+class Leaderboard:
+    """一次掃描同時產生多個指標的前 N 名與（選用的）Pareto 前緣；
+    add(seq, metrics, item) 於每筆結果到達時呼叫，seq 為網格中的順序（決定同分時的先後）"""
+
+    def __init__(self, metrics: Sequence[str], top_n: int, pareto: bool = False,
+                 fields: Optional[Sequence[str]] = None):
+        if fields is not None:
+            for metric in metrics:
+                if metric not in fields:
+                    raise ValueError(f"不支援的排序欄位: {metric}")
+        self.rankings: Dict[str, TopN] = {metric: TopN(metric, top_n) for metric in dict.fromkeys(metrics)}
+        self.frontier: Optional[ParetoFrontier] = ParetoFrontier() if pareto else None
+        self.evaluated = 0
+        self.viable = 0
+
+    def add(self, seq: int, metrics: Optional[Dict], item: Any) -> None:
+        self.evaluated += 1
+        if not is_viable(metrics):
+            return
+        self.viable += 1
+        for ranking in self.rankings.values():
+            ranking.push(seq, metrics, item)
+        if self.frontier is not None:
+            self.frontier.push(seq, metrics, item)
+
+    def ranking(self, metric: str) -> List[Any]:
+        return self.rankings[metric].items()
+
+    def pareto(self) -> List[Any]:
+        return self.frontier.items() if self.frontier is not None else []
@@ -0,0 +1,229 @@
+# 回測結果快取 - 以 (資料內容雜湊, 正規化參數) 為鍵，記憶體 LRU + 可選的磁碟層
+import os
+import json
+import uuid
+import pickle
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Iterable, Optional, Sequence, Tuple
+
+from app.core.price_store import DATA_DIR
+
+CACHE_DIR = os.path.join(DATA_DIR, ".cache")
+
+# 結果格式版本，引擎輸出格式變更時遞增即可讓舊快取失效
+RESULT_CACHE_VERSION = 3
+# 記憶體層最多保留的項目數
+RESULT_CACHE_MAX_ENTRIES = 256
+# 磁碟層最多保留的檔案數（超過時刪除最久未寫入的檔案，降到上限的 90%）
+RESULT_CACHE_DISK_MAX_FILES = 2048
+RESULT_CACHE_DISK_PRUNE_RATIO = 0.9
+# 磁碟層預設關閉，設定 RESULT_CACHE_DISK=1 才啟用。
+# 磁碟層以 pickle 保存，讀取時會反序列化 CACHE_DIR 中的檔案：只能用於僅服務本身可寫入的目錄，
+# 不可指向共用或其他使用者可寫入的位置（可被放入任意程式碼）
+RESULT_CACHE_DISK = os.environ.get("RESULT_CACHE_DISK", "0") == "1"
+# 網格點績效快取最多保留的點數
+SWEEP_CACHE_MAX_POINTS = 50_000
+
+
+def cache_key(kind: str, version: str, params: Dict) -> str:
+    """正規化參數（排序鍵、固定分隔符號）後取雜湊"""
+    payload = json.dumps(
+        {"v": RESULT_CACHE_VERSION, "kind": kind, "data": version, "params": params},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """內容定址的結果快取；資料內容改變時雜湊不同，舊結果自然不再命中"""
+
+    def __init__(self, max_entries: int = RESULT_CACHE_MAX_ENTRIES,
+                 disk_dir: Optional[str] = CACHE_DIR if RESULT_CACHE_DISK else None,
+                 disk_max_files: int = RESULT_CACHE_DISK_MAX_FILES):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self.disk_max_files = disk_max_files
+        self._entries: "OrderedDict[str, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        # 磁碟層檔案數：第一次寫入時掃描一次，之後只在新增檔案時累加
+        self._disk_files: Optional[int] = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Any]:
+        """取得快取值；記憶體未命中時讀磁碟並回填記憶體"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._store(key, value)
+        return value
+
+    def put(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._store(key, value)
+        self._write_disk(key, value)
+
+    def clear(self) -> None:
+        """清除記憶體與磁碟層"""
+        with self._lock:
+            self._entries.clear()
+            self._disk_files = None
+        if self.disk_dir and os.path.isdir(self.disk_dir):
+            for name in os.listdir(self.disk_dir):
+                if name.endswith(".pkl"):
+                    try:
+                        os.remove(os.path.join(self.disk_dir, name))
+                    except OSError:
+                        pass
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.disk_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round((self.hits + self.disk_hits) / total, 4) if total else 0.0,
+                "disk": self.disk_dir is not None,
+            }
+
+    def _store(self, key: str, value: Any) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.pkl")
+
+    def _read_disk(self, key: str) -> Optional[Any]:
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._path(key), "rb") as f:
+                return pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # 損壞或舊版格式的檔案直接捨棄
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+            return None
+
+    def _write_disk(self, key: str, value: Any) -> None:
+        """以暫存檔 + 原子替換寫入；磁碟層失敗不影響結果"""
+        if not self.disk_dir:
+            return
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            tmp = os.path.join(self.disk_dir, f"{key}-{uuid.uuid4().hex}.tmp")
+            with open(tmp, "wb") as f:
+                pickle.dump(value, f, protocol=pickle.HIGHEST_PROTOCOL)
+            path = self._path(key)
+            added = not os.path.exists(path)
+            os.replace(tmp, path)
+            if added:
+                self._count_disk_file()
+        except OSError:
+            pass
+
+    def _count_disk_file(self) -> None:
+        """新增檔案時累加檔案數，超過上限才掃描目錄並刪除"""
+        with self._lock:
+            if self._disk_files is None:
+                self._disk_files = sum(1 for e in os.scandir(self.disk_dir) if e.name.endswith(".pkl"))
+            else:
+                self._disk_files += 1
+            if self._disk_files <= self.disk_max_files:
+                return
+        self._prune_disk()
+
+    def _prune_disk(self) -> None:
+        entries = [e for e in os.scandir(self.disk_dir) if e.name.endswith(".pkl")]
+        keep = int(self.disk_max_files * RESULT_CACHE_DISK_PRUNE_RATIO)
+        entries.sort(key=lambda e: e.stat().st_mtime)
+        removed = 0
+        for entry in entries[:max(len(entries) - keep, 0)]:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_files = len(entries) - removed
+
+
+class SweepCache:
+    """網格點績效快取：以 (資料內容與共用參數的雜湊, 網格點) 逐點保存，記憶體 LRU 以點數為上限；
+    掃描只讀寫用到的點，不複製整張表，也不寫入磁碟"""
+
+    def __init__(self, max_points: int = SWEEP_CACHE_MAX_POINTS):
+        self.max_points = max_points
+        self._entries: "OrderedDict[Tuple[str, Hashable], Optional[Dict]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, table: str, points: Sequence[Hashable]) -> Dict[int, Optional[Dict]]:
+        """回傳 {索引: 績效}，只包含已快取的點（績效為 None 表示該點無法執行）"""
+        found: Dict[int, Optional[Dict]] = {}
+        with self._lock:
+            for i, point in enumerate(points):
+                key = (table, point)
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    found[i] = self._entries[key]
+            self.hits += len(found)
+            self.misses += len(points) - len(found)
+        return found
+
+    def put_many(self, table: str, items: Iterable[Tuple[Hashable, Optional[Dict]]]) -> None:
+        with self._lock:
+            for point, metrics in items:
+                key = (table, point)
+                self._entries[key] = metrics
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_points:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "points": len(self._entries),
+                "max_points": self.max_points,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# 全域共用實例
+result_cache = ResultCache()
+sweep_cache = SweepCache()
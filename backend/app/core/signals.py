@@ -0,0 +1,34 @@
+# 交易信號 - 以 NumPy 陣列產生均線交叉信號
+from typing import Tuple
+
+import numpy as np
+
+
+def crossover_signals(fast: np.ndarray, slow: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """上穿/下穿信號，fast 與 slow 可為 1-D 或逐列對應的 2-D 矩陣（NaN 視為 False）"""
+    fast = np.atleast_2d(fast)
+    slow = np.atleast_2d(slow)
+    fast_prev = np.empty_like(fast)
+    slow_prev = np.empty_like(slow)
+    fast_prev[:, 0] = np.nan
+    slow_prev[:, 0] = np.nan
+    fast_prev[:, 1:] = fast[:, :-1]
+    slow_prev[:, 1:] = slow[:, :-1]
+    with np.errstate(invalid="ignore"):
+        buy = (fast > slow) & (fast_prev <= slow_prev)
+        sell = (fast < slow) & (fast_prev >= slow_prev)
+    return buy, sell
+
+
+def position_state(buy: np.ndarray, sell: np.ndarray, long_short: bool = False) -> np.ndarray:
+    """由買賣信號推得每個 bar 收盤後的持倉方向（1 / 0 / -1），第一個信號前為 0；
+    buy 與 sell 可為 1-D 或 2-D（沿最後一軸）"""
+    buy = np.atleast_2d(buy)
+    sell = np.atleast_2d(sell)
+    exit_state = -1.0 if long_short else 0.0
+    events = np.where(buy, 1.0, np.where(sell, exit_state, np.nan))
+    n = events.shape[1]
+    last = np.where(~np.isnan(events), np.arange(n), -1)
+    last = np.maximum.accumulate(last, axis=1)
+    state = np.take_along_axis(events, np.maximum(last, 0), axis=1)
+    return np.where(last >= 0, state, 0.0)
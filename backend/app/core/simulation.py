@@ -0,0 +1,202 @@
+# 交易模擬核心 - 以連續 NumPy 陣列執行，可選用 Numba JIT 加速
+import numpy as np
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# 交易紀錄種類
+KIND_LONG = 1
+KIND_SHORT = -1
+KIND_REBALANCE = 0
+
+# 交易紀錄欄位（每筆紀錄一列 float64）
+TRADE_DTYPE = np.dtype([
+    ("kind", "f8"),          # KIND_LONG / KIND_SHORT / KIND_REBALANCE
+    ("entry_idx", "f8"),     # 進場 bar 索引
+    ("exit_idx", "f8"),      # 出場 bar 索引
+    ("entry_price", "f8"),
+    ("exit_price", "f8"),
+    ("units", "f8"),
+    ("pnl", "f8"),           # 實際總損益（再平衡為 -手續費）
+    ("base", "f8"),          # 報酬率分母：進場資產（再平衡為當下權益）
+    ("cash_after", "f8"),
+    ("prev_units", "f8"),    # 再平衡前的單位數
+])
+TRADE_FIELDS = len(TRADE_DTYPE.names)
+
+
+def _simulate_loop(closes, rebalance_flags, sig_buy, sig_sell,
+                   initial_cash, leverage, fee_rate, slippage,
+                   long_short, enable_rebalance, enable_yield, annual_yield,
+                   equity, trades):
+    """逐 bar 模擬；運算順序與原本 BacktestEngine 迴圈完全一致。
+    回傳 (權益筆數, 交易筆數)，權益陣列在爆倉時提前結束"""
+    n = len(closes)
+    cash = initial_cash
+    pos = 0
+    entry_price = 0.0
+    entry_idx = -1
+    entry_cash = 0.0
+    units = 0.0
+    n_trades = 0
+
+    for i in range(n):
+        price = closes[i]
+
+        current_equity = cash
+        if pos != 0:
+            unrealized_pnl = (price - entry_price) * units * pos
+
+            if enable_yield and pos == 1 and i > 0:
+                prev_price = closes[i - 1]
+                daily_yield_rate = annual_yield / 252
+                yield_pnl = prev_price * daily_yield_rate * units
+                cash += yield_pnl
+
+            current_equity = cash + unrealized_pnl
+
+            if current_equity < (initial_cash * 0.15):
+                equity[i] = 0.0
+                return i + 1, n_trades
+
+        equity[i] = current_equity
+
+        # 再平衡（rebalance_flags 為新區段的第一個 bar，預設為每月）
+        if enable_rebalance and i > 0 and rebalance_flags[i] and pos != 0 and cash > 0:
+            realized_pnl = (price - entry_price) * units * pos
+            cash = cash + realized_pnl
+            target_units = (cash * leverage) / price
+            diff_units = abs(target_units - units)
+            rebalance_fee = diff_units * price * fee_rate
+            cash = cash - rebalance_fee
+            trades[n_trades, 0] = KIND_REBALANCE
+            trades[n_trades, 1] = i
+            trades[n_trades, 2] = i
+            trades[n_trades, 3] = price
+            trades[n_trades, 4] = price
+            trades[n_trades, 5] = target_units
+            trades[n_trades, 6] = -rebalance_fee
+            trades[n_trades, 7] = current_equity
+            trades[n_trades, 8] = cash
+            trades[n_trades, 9] = units
+            n_trades += 1
+            units = target_units
+            entry_price = price
+
+        if pos == 1 and sig_sell[i]:
+            exit_p = price * (1 - slippage)
+            pnl = (exit_p - entry_price) * units
+            fee = exit_p * units * fee_rate
+            net_pnl = pnl - fee
+            cash_after = cash + net_pnl
+            trades[n_trades, 0] = KIND_LONG
+            trades[n_trades, 1] = entry_idx
+            trades[n_trades, 2] = i
+            trades[n_trades, 3] = entry_price
+            trades[n_trades, 4] = exit_p
+            trades[n_trades, 5] = units
+            trades[n_trades, 6] = cash_after - entry_cash
+            trades[n_trades, 7] = entry_cash
+            trades[n_trades, 8] = cash_after
+            trades[n_trades, 9] = units
+            n_trades += 1
+            cash += net_pnl
+            pos = 0
+            units = 0.0
+
+            if long_short and cash > 0:
+                pos = -1
+                entry_price = price * (1 - slippage)
+                entry_cash = cash
+                position_value = cash * leverage
+                units = position_value / entry_price / (1 + fee_rate)
+                entry_idx = i
+
+        elif pos == -1 and sig_buy[i]:
+            exit_p = price * (1 + slippage)
+            pnl = (entry_price - exit_p) * units
+            fee = exit_p * units * fee_rate
+            net_pnl = pnl - fee
+            cash_after = cash + net_pnl
+            trades[n_trades, 0] = KIND_SHORT
+            trades[n_trades, 1] = entry_idx
+            trades[n_trades, 2] = i
+            trades[n_trades, 3] = entry_price
+            trades[n_trades, 4] = exit_p
+            trades[n_trades, 5] = units
+            trades[n_trades, 6] = cash_after - entry_cash
+            trades[n_trades, 7] = entry_cash
+            trades[n_trades, 8] = cash_after
+            trades[n_trades, 9] = units
+            n_trades += 1
+            cash += net_pnl
+            pos = 0
+            units = 0.0
+
+            if cash > 0:
+                pos = 1
+                entry_price = price * (1 + slippage)
+                entry_cash = cash
+                position_value = cash * leverage
+                units = position_value / entry_price / (1 + fee_rate)
+                entry_idx = i
+
+        elif pos == 0 and cash > 0:
+            if sig_buy[i]:
+                pos = 1
+                entry_price = price * (1 + slippage)
+                entry_cash = cash
+                position_value = cash * leverage
+                units = position_value / entry_price / (1 + fee_rate)
+                entry_idx = i
+            elif sig_sell[i] and long_short:
+                pos = -1
+                entry_price = price * (1 - slippage)
+                entry_cash = cash
+                position_value = cash * leverage
+                units = position_value / entry_price / (1 + fee_rate)
+                entry_idx = i
+
+    return n, n_trades
+
+
+if NUMBA_AVAILABLE:
+    _simulate_jit = njit(cache=True, error_model="numpy")(_simulate_loop)
+
+
+def simulate(closes: np.ndarray, rebalance_flags: np.ndarray, sig_buy: np.ndarray, sig_sell: np.ndarray,
+             initial_cash: float, leverage: float, fee_rate: float, slippage: float,
+             long_short: bool, enable_rebalance: bool, enable_yield: bool, annual_yield: float,
+             use_numba: bool = True):
+    """執行交易模擬，回傳 (equity float64 陣列, 交易紀錄陣列 TRADE_DTYPE)；
+    equity 為未四捨五入的權益，爆倉時於該 bar 以 0 結束"""
+    n = len(closes)
+    # 每個 bar 至多一筆出場紀錄，另加每個再平衡日一筆紀錄
+    max_trades = n + int(np.count_nonzero(rebalance_flags)) + 1
+    equity = np.empty(n, dtype=np.float64)
+    trades = np.empty((max_trades, TRADE_FIELDS), dtype=np.float64)
+
+    args = (float(initial_cash), float(leverage), float(fee_rate), float(slippage),
+            bool(long_short), bool(enable_rebalance), bool(enable_yield), float(annual_yield))
+    if use_numba and NUMBA_AVAILABLE:
+        n_equity, n_trades = _simulate_jit(
+            np.ascontiguousarray(closes, dtype=np.float64),
+            np.ascontiguousarray(rebalance_flags, dtype=np.bool_),
+            np.ascontiguousarray(sig_buy, dtype=np.bool_),
+            np.ascontiguousarray(sig_sell, dtype=np.bool_),
+            *args, equity, trades
+        )
+    else:
+        n_equity, n_trades = _simulate_loop(
+            np.asarray(closes, dtype=np.float64),
+            np.asarray(rebalance_flags, dtype=np.bool_),
+            np.asarray(sig_buy, dtype=np.bool_),
+            np.asarray(sig_sell, dtype=np.bool_),
+            *args, equity, trades
+        )
+
+    records = np.ascontiguousarray(trades[:n_trades]).view(TRADE_DTYPE).reshape(-1)
+    return equity[:n_equity], records
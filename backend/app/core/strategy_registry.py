@@ -0,0 +1,275 @@
+# 策略外掛註冊表 - 每個策略宣告參數空間，並以向量化方式一次產生一批參數的買賣信號
+import itertools
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from app.core.signals import crossover_signals
+
+# 名稱為 ma_fast / ma_slow 的參數對應回測參數與網格的同名欄位，其餘參數放在 strategy_params
+WINDOW_FIELDS = ("ma_fast", "ma_slow")
+
+
+@dataclass(frozen=True)
+class ParamSpec:
+    """策略參數：grid 為優化時未指定範圍的預設掃描值"""
+    name: str
+    label: str
+    default: float
+    minimum: float = 1
+    integer: bool = True
+    grid: Tuple = ()
+
+
+class Indicators:
+    """同一段收盤價上的指標，每個視窗只計算一次，供同一批策略共用"""
+
+    def __init__(self, closes: np.ndarray, sma_source: Optional[Callable[[int], np.ndarray]] = None):
+        """sma_source(window) 可改用外部的均線（例如均線快取），須與 closes 逐筆對齊"""
+        self.closes = np.asarray(closes, dtype=np.float64)
+        self.sma_source = sma_source
+        self._series = None
+        self._cache: Dict[Tuple, np.ndarray] = {}
+
+    @property
+    def series(self) -> pd.Series:
+        if self._series is None:
+            self._series = pd.Series(self.closes)
+        return self._series
+
+    def _memo(self, key: Tuple, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = compute()
+        return value
+
+    def sma(self, window: int) -> np.ndarray:
+        if self.sma_source is not None:
+            return self._memo(("sma", window), lambda: self.sma_source(window))
+        return self._memo(("sma", window), lambda: self.series.rolling(window=window).mean().to_numpy())
+
+    def ema(self, span: int) -> np.ndarray:
+        return self._memo(("ema", span),
+                          lambda: self.series.ewm(span=span, adjust=False, min_periods=span).mean().to_numpy())
+
+    def std(self, window: int) -> np.ndarray:
+        return self._memo(("std", window), lambda: self.series.rolling(window=window).std().to_numpy())
+
+    def rsi(self, window: int) -> np.ndarray:
+        """Wilder RSI（以 1/window 為平滑係數）"""
+        def compute():
+            delta = self.series.diff()
+            gain = delta.clip(lower=0).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+            loss = (-delta.clip(upper=0)).ewm(alpha=1 / window, adjust=False, min_periods=window).mean()
+            with np.errstate(divide="ignore", invalid="ignore"):
+                return (100 - 100 / (1 + gain / loss)).to_numpy()
+        return self._memo(("rsi", window), compute)
+
+    def channel(self, window: int) -> Tuple[np.ndarray, np.ndarray]:
+        """前 window 根（不含當根）收盤價的最高與最低"""
+        def compute():
+            shifted = self.series.shift(1)
+            return np.vstack([shifted.rolling(window=window).max().to_numpy(),
+                              shifted.rolling(window=window).min().to_numpy()])
+        return tuple(self._memo(("channel", window), compute))
+
+
+class Strategy:
+    """策略介面：signals(closes, params_batch) 回傳 (買進, 賣出) 兩個 (批次數 × bar 數) 布林矩陣"""
+    name = ""
+    label = ""
+    params: Tuple[ParamSpec, ...] = ()
+    # 只做多且第一根即進場（不使用信號方向）
+    hold_from_start = False
+
+    def resolve(self, ma_fast=None, ma_slow=None, extra: Dict = None) -> Dict:
+        """由回測 / 網格欄位取出本策略的參數值，未指定的其他參數使用預設值"""
+        extra = extra or {}
+        fields = {"ma_fast": ma_fast, "ma_slow": ma_slow}
+        values = {}
+        for spec in self.params:
+            value = fields[spec.name] if spec.name in WINDOW_FIELDS else extra.get(spec.name, spec.default)
+            if value is not None:
+                value = int(value) if spec.integer else float(value)
+            values[spec.name] = value
+        return values
+
+    def is_valid(self, values: Dict) -> bool:
+        return all(values[s.name] is not None and values[s.name] >= s.minimum for s in self.params)
+
+    def accepts(self, values: Dict) -> bool:
+        """網格展開時是否保留此組合"""
+        return True
+
+    def warmup(self, values: Dict) -> int:
+        """模擬的起始 bar（指標就緒之前不交易）"""
+        return max((values[s.name] for s in self.params if s.integer), default=0)
+
+    def signal_key(self, values: Dict) -> Tuple:
+        """相同鍵的參數產生相同信號，批次中只計算一次"""
+        return (self.name,) + tuple(values[s.name] for s in self.params)
+
+    def grid(self, ranges: Dict[str, List]) -> List[Dict]:
+        """依指定範圍（未指定的參數用預設掃描值）展開參數組合"""
+        names = [s.name for s in self.params]
+        axes = [ranges[s.name] if s.name in ranges else (s.grid or (s.default,)) for s in self.params]
+        combos = []
+        for combo in itertools.product(*axes):
+            chosen = dict(zip(names, combo))
+            values = self.resolve(chosen.get("ma_fast"), chosen.get("ma_slow"), chosen)
+            if self.accepts(values):
+                combos.append(values)
+        return combos
+
+    def signals(self, closes: np.ndarray, params_batch: List[Dict],
+                indicators: Indicators = None) -> Tuple[np.ndarray, np.ndarray]:
+        raise NotImplementedError
+
+    def describe(self) -> Dict:
+        return {
+            "name": self.name,
+            "label": self.label,
+            "params": [{"name": s.name, "label": s.label, "default": s.default, "minimum": s.minimum,
+                        "integer": s.integer} for s in self.params],
+        }
+
+
+# 已註冊的策略（名稱 -> 實例）
+STRATEGIES: Dict[str, Strategy] = {}
+
+
+def register(cls):
+    """類別裝飾器：註冊策略實例"""
+    STRATEGIES[cls.name] = cls()
+    return cls
+
+
+def get_strategy(name: str) -> Strategy:
+    strategy = STRATEGIES.get(name)
+    if strategy is None:
+        raise ValueError(f"不支援的策略: {name}")
+    return strategy
+
+
+def _stack(rows: List[np.ndarray]) -> np.ndarray:
+    return np.vstack(rows) if rows else np.empty((0, 0))
+
+
+@register
+class BuyAndHold(Strategy):
+    name = "buy_and_hold"
+    label = "永遠做多"
+    hold_from_start = True
+
+    def signals(self, closes, params_batch, indicators=None):
+        buy = np.zeros((len(params_batch), len(closes)), dtype=bool)
+        buy[:, 0] = True
+        return buy, np.zeros_like(buy)
+
+
+@register
+class SingleMA(Strategy):
+    name = "single_ma"
+    label = "單均線"
+    params = (ParamSpec("ma_fast", "均線週期", 20, grid=(5, 10, 20, 30, 60)),)
+
+    def signals(self, closes, params_batch, indicators=None):
+        indicators = indicators or Indicators(closes)
+        ma = _stack([indicators.sma(p["ma_fast"]) for p in params_batch])
+        return crossover_signals(np.broadcast_to(indicators.closes, ma.shape), ma)
+
+
+@register
+class DualMA(Strategy):
+    name = "dual_ma"
+    label = "雙均線"
+    params = (ParamSpec("ma_fast", "快線週期", 20, grid=(5, 10, 20, 30, 60)),
+              ParamSpec("ma_slow", "慢線週期", 60, grid=(60, 120, 200)))
+
+    def accepts(self, values):
+        return values["ma_slow"] > values["ma_fast"]
+
+    def warmup(self, values):
+        return values["ma_slow"]
+
+    def _lines(self, indicators: Indicators, window: int) -> np.ndarray:
+        return indicators.sma(window)
+
+    def signals(self, closes, params_batch, indicators=None):
+        indicators = indicators or Indicators(closes)
+        fast = _stack([self._lines(indicators, p["ma_fast"]) for p in params_batch])
+        slow = _stack([self._lines(indicators, p["ma_slow"]) for p in params_batch])
+        return crossover_signals(fast, slow)
+
+
+@register
+class EMACross(DualMA):
+    name = "ema_cross"
+    label = "EMA 交叉"
+
+    def _lines(self, indicators, window):
+        return indicators.ema(window)
+
+
+@register
+class Bollinger(Strategy):
+    """均值回歸：收盤價由下往上穿越下軌買進，由上往下跌破上軌賣出"""
+    name = "bollinger"
+    label = "布林通道"
+    params = (ParamSpec("ma_fast", "週期", 20, grid=(10, 20, 30)),
+              ParamSpec("num_std", "標準差倍數", 2.0, minimum=0, integer=False, grid=(1.5, 2.0, 2.5)))
+
+    def signals(self, closes, params_batch, indicators=None):
+        indicators = indicators or Indicators(closes)
+        mid = _stack([indicators.sma(p["ma_fast"]) for p in params_batch])
+        width = _stack([indicators.std(p["ma_fast"]) * p["num_std"] for p in params_batch])
+        price = np.broadcast_to(indicators.closes, mid.shape)
+        buy, _ = crossover_signals(price, mid - width)
+        _, sell = crossover_signals(price, mid + width)
+        return buy, sell
+
+
+@register
+class RSI(Strategy):
+    """RSI 由下往上穿越 lower 買進，由上往下跌破 upper 賣出"""
+    name = "rsi"
+    label = "RSI"
+    params = (ParamSpec("ma_fast", "RSI 週期", 14, grid=(7, 14, 21)),
+              ParamSpec("lower", "超賣線", 30, minimum=0, integer=False, grid=(20, 30)),
+              ParamSpec("upper", "超買線", 70, minimum=0, integer=False, grid=(70, 80)))
+
+    def accepts(self, values):
+        return values["upper"] > values["lower"]
+
+    def signals(self, closes, params_batch, indicators=None):
+        indicators = indicators or Indicators(closes)
+        rsi = _stack([indicators.rsi(p["ma_fast"]) for p in params_batch])
+        lower = np.array([p["lower"] for p in params_batch], dtype=np.float64)[:, None]
+        upper = np.array([p["upper"] for p in params_batch], dtype=np.float64)[:, None]
+        buy, _ = crossover_signals(rsi, np.broadcast_to(lower, rsi.shape))
+        _, sell = crossover_signals(rsi, np.broadcast_to(upper, rsi.shape))
+        return buy, sell
+
+
+@register
+class Donchian(Strategy):
+    """唐奇安突破（僅用收盤價）：突破前 ma_fast 根高點買進，跌破前 ma_slow 根低點賣出"""
+    name = "donchian"
+    label = "唐奇安通道突破"
+    params = (ParamSpec("ma_fast", "進場通道週期", 20, grid=(20, 55)),
+              ParamSpec("ma_slow", "出場通道週期", 10, grid=(10, 20)))
+
+    def signals(self, closes, params_batch, indicators=None):
+        indicators = indicators or Indicators(closes)
+        upper = _stack([indicators.channel(p["ma_fast"])[0] for p in params_batch])
+        lower = _stack([indicators.channel(p["ma_slow"])[1] for p in params_batch])
+        price = np.broadcast_to(indicators.closes, upper.shape)
+        buy, _ = crossover_signals(price, upper)
+        _, sell = crossover_signals(price, lower)
+        return buy, sell
+
+
+def list_strategies() -> List[Dict]:
+    return [s.describe() for s in STRATEGIES.values()]
@@ -0,0 +1,376 @@
+# 批次參數掃描引擎 - 一次計算所有均線組合
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.backtest_engine import BacktestParams, date_range, _round
+from app.core.calendar_index import CalendarIndex
+from app.core.metrics import batch_metrics
+from app.core.strategy_registry import STRATEGIES, Indicators, Strategy
+
+try:
+    from numba import njit
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+
+@dataclass(frozen=True)
+class SweepPoint:
+    """單一網格點"""
+    strategy_mode: str
+    direction: str
+    ma_fast: int
+    ma_slow: Optional[int]
+    leverage: float
+    # ma_fast / ma_slow 以外的策略參數，以 (名稱, 值) 排序後保存以便雜湊
+    extra: Tuple[Tuple[str, float], ...] = ()
+
+    def resolve(self) -> Optional[Tuple[Strategy, Dict]]:
+        """回傳 (策略, 參數值)；未註冊的策略或參數不合法時為 None"""
+        strategy = STRATEGIES.get(self.strategy_mode)
+        if strategy is None:
+            return None
+        values = strategy.resolve(self.ma_fast, self.ma_slow, dict(self.extra))
+        return (strategy, values) if strategy.is_valid(values) else None
+
+
+@dataclass
+class SweepSignals:
+    """一組網格點共用的信號：valid 標記可執行的點，signal_keys 對應到信號矩陣的列"""
+    valid: List[bool]
+    signal_keys: Dict[Tuple, int]
+    sig_buy: np.ndarray
+    sig_sell: np.ndarray
+
+
+class SweepEngine:
+    """對同一份價格序列批次執行多組參數，結果與 BacktestEngine 逐一執行相同"""
+
+    def __init__(self, days: np.ndarray, closes: np.ndarray, calendar: Optional[CalendarIndex] = None):
+        self.days = np.asarray(days, dtype=np.int64)
+        self.closes = np.asarray(closes, dtype=np.float64)
+        self.calendar = calendar if calendar is not None else CalendarIndex(self.days)
+
+    def run(self, points: List[SweepPoint], params: BacktestParams) -> List[Optional[Dict]]:
+        """回傳每個網格點的績效（無法執行的點為 None）"""
+        lo, hi = date_range(self.days, params.start_date, params.end_date)
+        if hi - lo < 30:
+            return [None] * len(points)
+        closes = self.closes[lo:hi]
+        signals = self.signals(closes, points)
+        results, _, _, _ = self.evaluate(closes, self.days[lo:hi], points, signals, params)
+        return results
+
+    def signals(self, closes: np.ndarray, points: List[SweepPoint]) -> "SweepSignals":
+        """每種信號只產生一次，同一策略的所有參數組合一次交給策略向量化計算，指標在策略間共用"""
+        n = len(closes)
+        resolved = [p.resolve() for p in points]
+        valid = [r is not None for r in resolved]
+
+        # (策略, 參數...) -> 信號列
+        signal_keys: Dict[Tuple, int] = {}
+        batches: Dict[str, List[Tuple[int, Dict]]] = {}
+        for r in resolved:
+            if r is None:
+                continue
+            strategy, values = r
+            key = strategy.signal_key(values)
+            if key not in signal_keys:
+                signal_keys[key] = len(signal_keys)
+                batches.setdefault(strategy.name, []).append((signal_keys[key], values))
+        sig_buy = np.zeros((len(signal_keys), n), dtype=bool)
+        sig_sell = np.zeros((len(signal_keys), n), dtype=bool)
+
+        indicators = Indicators(closes)
+        for name, items in batches.items():
+            rows = [row for row, _ in items]
+            sig_buy[rows], sig_sell[rows] = STRATEGIES[name].signals(closes, [v for _, v in items], indicators)
+        return SweepSignals(valid, signal_keys, sig_buy, sig_sell)
+
+    def evaluate(self, closes: np.ndarray, days: np.ndarray, points: List[SweepPoint], signals: "SweepSignals",
+                 params: BacktestParams, offset: int = 0) -> Tuple[List[Optional[Dict]], np.ndarray, List[int], np.ndarray]:
+        """以已產生的信號模擬一段區間；信號由完整歷史計算並切片時，offset 為區間在原序列中的起點，
+        均線暖機期已在區間之前的變體從區間第一個 bar 開始。
+        回傳 (各點績效, 權益矩陣, 有效變體索引, 各變體 (起點, 終點))"""
+        n = len(closes)
+        sig_buy = np.array(signals.sig_buy[:, offset:offset + n])
+        sig_sell = signals.sig_sell[:, offset:offset + n]
+        for k, row in signals.signal_keys.items():
+            if STRATEGIES[k[0]].hold_from_start:
+                sig_buy[row, 0] = True
+
+        variants = [i for i, ok in enumerate(signals.valid) if ok]
+        results: List[Optional[Dict]] = [None] * len(points)
+        if not variants:
+            return results, np.empty((0, n)), variants, np.empty((0, 2), dtype=np.int64)
+
+        sig_rows = np.array([signals.signal_keys[self._signal_key(points[i])] for i in variants], dtype=np.int64)
+        starts = np.array([max(self._start_idx(points[i]) - offset, 0) for i in variants], dtype=np.int64)
+        leverage = np.array([float(points[i].leverage) for i in variants], dtype=np.float64)
+        long_short = np.array([points[i].direction == "long_short"
+                               and not STRATEGIES[points[i].strategy_mode].hold_from_start
+                               for i in variants], dtype=bool)
+
+        # days 為 self.days 的連續切片，以其起點位置查日曆索引
+        first = int(np.searchsorted(self.days, days[0])) if n else 0
+        rebalance_flags = self.calendar.flags(params.rebalance_frequency, first, first + n)
+        equity, ends, trade_counts, win_counts = self._simulate_batch(
+            closes, rebalance_flags, sig_buy, sig_sell, sig_rows, starts, leverage, long_short, params
+        )
+
+        # 同一區間（起點、終點相同）的變體一起以 2-D 矩陣計算指標
+        groups: Dict[Tuple[int, int], List[int]] = {}
+        for col in range(len(variants)):
+            groups.setdefault((int(starts[col]), int(ends[col])), []).append(col)
+        for (start, end), cols in groups.items():
+            for col, metrics in zip(cols, self._metrics(equity[cols, start:end], days[start:end],
+                                                        trade_counts[cols], win_counts[cols], params.initial_cash)):
+                results[variants[col]] = metrics
+        return results, equity, variants, np.column_stack([starts, ends])
+
+    @staticmethod
+    def _signal_key(p: SweepPoint) -> Tuple:
+        resolved = p.resolve()
+        if resolved is None:
+            return ("",)
+        strategy, values = resolved
+        return strategy.signal_key(values)
+
+    @staticmethod
+    def _start_idx(p: SweepPoint) -> int:
+        strategy, values = p.resolve()
+        return strategy.warmup(values)
+
+    def _simulate_batch(self, closes, rebalance_flags, sig_buy, sig_sell, sig_rows, starts, leverage, long_short,
+                        params: BacktestParams):
+        """回傳 (權益矩陣, 各變體終點, 交易次數, 獲利次數)；有 Numba 時逐變體編譯執行，否則所有變體一起逐 bar 推進"""
+        if not NUMBA_AVAILABLE:
+            return self._simulate_vectorized(closes, rebalance_flags, sig_buy, sig_sell, sig_rows, starts, leverage,
+                                             long_short, params)
+        n = len(closes)
+        k = len(starts)
+        equity = np.full((k, n), np.nan)
+        ends = np.where(starts < n, n, starts).astype(np.int64)
+        trade_counts = np.zeros(k, dtype=np.int64)
+        win_counts = np.zeros(k, dtype=np.int64)
+        _sweep_jit(
+            np.ascontiguousarray(closes, dtype=np.float64),
+            np.ascontiguousarray(rebalance_flags, dtype=np.bool_),
+            np.ascontiguousarray(sig_buy, dtype=np.bool_),
+            np.ascontiguousarray(sig_sell, dtype=np.bool_),
+            sig_rows, starts, leverage, long_short,
+            float(params.initial_cash), float(params.fee_rate), float(params.slippage),
+            bool(params.enable_rebalance), bool(params.enable_yield), params.annual_yield / 252,
+            equity, ends, trade_counts, win_counts,
+        )
+        return equity, ends, trade_counts, win_counts
+
+    def _simulate_vectorized(self, closes, rebalance_flags, sig_buy, sig_sell, sig_rows, starts, leverage, long_short,
+                             params: BacktestParams):
+        """所有變體同時逐 bar 推進；每個欄位的運算與 _sweep_loop 相同"""
+        n = len(closes)
+        k = len(starts)
+        buy_t = np.ascontiguousarray(sig_buy.T)
+        sell_t = np.ascontiguousarray(sig_sell.T)
+
+        initial_cash = float(params.initial_cash)
+        fee_rate = float(params.fee_rate)
+        slippage = float(params.slippage)
+        daily_yield_rate = params.annual_yield / 252
+        stop_level = initial_cash * 0.15
+
+        cash = np.full(k, initial_cash)
+        pos = np.zeros(k)
+        entry_price = np.zeros(k)
+        entry_cash = np.zeros(k)
+        units = np.zeros(k)
+        alive = np.ones(k, dtype=bool)
+        ends = np.where(starts < n, n, starts).astype(np.int64)
+        trade_counts = np.zeros(k, dtype=np.int64)
+        win_counts = np.zeros(k, dtype=np.int64)
+        equity = np.full((k, n), np.nan)
+
+        with np.errstate(all="ignore"):
+            for i in range(n):
+                price = closes[i]
+                live = alive & (starts <= i)
+                if not live.any():
+                    if (starts > i).any():
+                        continue
+                    break
+                started = starts < i
+                holding = live & (pos != 0)
+
+                current_equity = cash.copy()
+                if holding.any():
+                    unrealized_pnl = (price - entry_price) * units * pos
+                    if params.enable_yield:
+                        y = holding & (pos == 1) & started
+                        if y.any():
+                            cash = np.where(y, cash + closes[i - 1] * daily_yield_rate * units, cash)
+                    current_equity = np.where(holding, cash + unrealized_pnl, cash)
+
+                    blown = holding & (current_equity < stop_level)
+                    if blown.any():
+                        equity[blown, i] = 0.0
+                        ends[blown] = i + 1
+                        alive &= ~blown
+                        live &= ~blown
+                        holding &= ~blown
+
+                equity[live, i] = current_equity[live]
+
+                # 定期再平衡（預設每月）
+                if params.enable_rebalance and rebalance_flags[i]:
+                    r = holding & started & (cash > 0)
+                    if r.any():
+                        realized_cash = cash + (price - entry_price) * units * pos
+                        target_units = (realized_cash * leverage) / price
+                        rebalance_fee = np.abs(target_units - units) * price * fee_rate
+                        cash = np.where(r, realized_cash - rebalance_fee, cash)
+                        units = np.where(r, target_units, units)
+                        entry_price = np.where(r, price, entry_price)
+
+                sb = buy_t[i][sig_rows]
+                ss = sell_t[i][sig_rows]
+                long_exit = live & (pos == 1) & ss
+                short_exit = live & (pos == -1) & sb
+                flat = live & (pos == 0) & (cash > 0)
+
+                if long_exit.any() or short_exit.any():
+                    exit_long_p = price * (1 - slippage)
+                    exit_short_p = price * (1 + slippage)
+                    pnl = np.where(long_exit, (exit_long_p - entry_price) * units, (entry_price - exit_short_p) * units)
+                    fee = np.where(long_exit, exit_long_p * units * fee_rate, exit_short_p * units * fee_rate)
+                    net_pnl = pnl - fee
+                    exiting = long_exit | short_exit
+                    cash_after = cash + net_pnl
+                    trade_pnl = cash_after - entry_cash
+                    trade_counts += exiting
+                    win_counts += exiting & (np.round(trade_pnl, 2) > 0)
+                    cash = np.where(exiting, cash + net_pnl, cash)
+                    units = np.where(exiting, 0.0, units)
+                    pos = np.where(exiting, 0.0, pos)
+                    reverse_short = long_exit & long_short & (cash > 0)
+                    reverse_long = short_exit & (cash > 0)
+                else:
+                    reverse_short = reverse_long = np.zeros(k, dtype=bool)
+
+                enter_long = reverse_long | (flat & sb)
+                enter_short = reverse_short | (flat & ~sb & ss & long_short)
+                entering = enter_long | enter_short
+                if entering.any():
+                    new_entry = np.where(enter_long, price * (1 + slippage), price * (1 - slippage))
+                    entry_price = np.where(entering, new_entry, entry_price)
+                    entry_cash = np.where(entering, cash, entry_cash)
+                    units = np.where(entering, cash * leverage / new_entry / (1 + fee_rate), units)
+                    pos = np.where(enter_long, 1.0, np.where(enter_short, -1.0, pos))
+
+        return equity, ends, trade_counts, win_counts
+
+    @staticmethod
+    def _metrics(equity: np.ndarray, days: np.ndarray, trade_counts: np.ndarray, win_counts: np.ndarray,
+                 initial_cash: float) -> List[Dict]:
+        """同一區間的多列權益一次計算，指標與 BacktestEngine 相同（只取優化需要的欄位）"""
+        if equity.shape[1] == 0:
+            return [{"total_return": 0, "cagr": 0, "mdd": 0, "sharpe_ratio": 0,
+                     "calmar_ratio": 0, "total_trades": 0, "win_rate": 0} for _ in range(len(equity))]
+        batch = batch_metrics(days, np.round(equity, 2), initial_cash)
+        out = []
+        for row, (total_trades, wins) in enumerate(zip(trade_counts.tolist(), win_counts.tolist())):
+            win_rate = (wins / total_trades * 100) if total_trades > 0 else 0
+            out.append({
+                "total_return": _round(batch["total_return"][row], 2),
+                "cagr": _round(batch["cagr"][row], 2),
+                "mdd": _round(batch["mdd"][row] * 100, 2),
+                "sharpe_ratio": _round(batch["sharpe_ratio"][row], 2),
+                "calmar_ratio": _round(batch["calmar_ratio"][row], 2),
+                "total_trades": total_trades,
+                "win_rate": round(win_rate, 2),
+            })
+        return out
+
+
+def _sweep_loop(closes, rebalance_flags, sig_buy, sig_sell, sig_rows, starts, leverage, long_short,
+                initial_cash, fee_rate, slippage, enable_rebalance, enable_yield, daily_yield_rate,
+                equity, ends, trade_counts, win_counts):
+    """逐變體、逐 bar 模擬，結果寫入 equity / ends / trade_counts / win_counts；
+    運算順序與 simulation._simulate_loop 相同（變體從 starts 開始，之前的權益保留 NaN）"""
+    n = len(closes)
+    stop_level = initial_cash * 0.15
+    for v in range(len(starts)):
+        row = sig_rows[v]
+        start = starts[v]
+        lev = leverage[v]
+        cash = initial_cash
+        pos = 0.0
+        entry_price = 0.0
+        entry_cash = 0.0
+        units = 0.0
+        trades = 0
+        wins = 0
+        for i in range(start, n):
+            price = closes[i]
+
+            current_equity = cash
+            if pos != 0:
+                unrealized_pnl = (price - entry_price) * units * pos
+                if enable_yield and pos == 1 and i > start:
+                    cash = cash + closes[i - 1] * daily_yield_rate * units
+                current_equity = cash + unrealized_pnl
+                if current_equity < stop_level:
+                    equity[v, i] = 0.0
+                    ends[v] = i + 1
+                    break
+
+            equity[v, i] = current_equity
+
+            # 定期再平衡（預設每月）
+            if enable_rebalance and rebalance_flags[i] and pos != 0 and i > start and cash > 0:
+                realized_cash = cash + (price - entry_price) * units * pos
+                target_units = (realized_cash * lev) / price
+                rebalance_fee = np.abs(target_units - units) * price * fee_rate
+                cash = realized_cash - rebalance_fee
+                units = target_units
+                entry_price = price
+
+            sb = sig_buy[row, i]
+            ss = sig_sell[row, i]
+            flat = pos == 0 and cash > 0
+            enter_long = False
+            enter_short = False
+            if (pos == 1 and ss) or (pos == -1 and sb):
+                is_long = pos == 1
+                if is_long:
+                    exit_p = price * (1 - slippage)
+                    pnl = (exit_p - entry_price) * units
+                else:
+                    exit_p = price * (1 + slippage)
+                    pnl = (entry_price - exit_p) * units
+                net_pnl = pnl - exit_p * units * fee_rate
+                trades += 1
+                if np.round(cash + net_pnl - entry_cash, 2) > 0:
+                    wins += 1
+                cash = cash + net_pnl
+                units = 0.0
+                pos = 0.0
+                if cash > 0:
+                    enter_short = is_long and long_short[v]
+                    enter_long = not is_long
+            elif flat:
+                enter_long = sb
+                enter_short = not sb and ss and long_short[v]
+
+            if enter_long or enter_short:
+                entry_price = price * (1 + slippage) if enter_long else price * (1 - slippage)
+                entry_cash = cash
+                units = cash * lev / entry_price / (1 + fee_rate)
+                pos = 1.0 if enter_long else -1.0
+        trade_counts[v] = trades
+        win_counts[v] = wins
+
+
+if NUMBA_AVAILABLE:
+    _sweep_jit = njit(cache=True, error_model="numpy")(_sweep_loop)
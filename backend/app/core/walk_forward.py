@@ -0,0 +1,132 @@
+# 滾動式前進優化 - 均線與信號以完整歷史計算一次，各訓練 / 測試區間只切片模擬
+from dataclasses import dataclass, replace
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from app.core.backtest_engine import BacktestParams, date_range, date_strings, _round
+from app.core.encoding import rows_of
+from app.core.metrics import batch_metrics
+from app.core.ranking import is_viable
+from app.core.sweep import SweepEngine, SweepPoint
+
+# 訓練與測試區間的最少 bar 數
+MIN_TRAIN_BARS = 30
+MIN_TEST_BARS = 5
+# 可用於挑選最佳網格點的績效欄位
+SORT_FIELDS = ("total_return", "cagr", "mdd", "sharpe_ratio", "calmar_ratio", "total_trades", "win_rate")
+
+
+def walk_forward_windows(lo: int, hi: int, train_bars: int, test_bars: int,
+                         anchored: bool = False) -> List[Tuple[int, int, int]]:
+    """切出 (訓練起點, 測試起點, 測試終點)；測試區間首尾相接，anchored 時訓練區間固定從 lo 開始"""
+    if train_bars < MIN_TRAIN_BARS:
+        raise ValueError(f"訓練區間至少需要 {MIN_TRAIN_BARS} 筆")
+    if test_bars < MIN_TEST_BARS:
+        raise ValueError(f"測試區間至少需要 {MIN_TEST_BARS} 筆")
+    windows = []
+    test_start = lo + train_bars
+    while test_start + MIN_TEST_BARS <= hi:
+        test_end = min(test_start + test_bars, hi)
+        windows.append((lo if anchored else test_start - train_bars, test_start, test_end))
+        test_start = test_end
+    if not windows:
+        raise ValueError("資料不足以切出任何訓練 / 測試區間")
+    return windows
+
+
+def best_point(results: List[Optional[Dict]], sort_by: str) -> Optional[int]:
+    """排除爆倉策略（MDD >= 99% 或幾乎全部虧損）後取指定指標最高的網格點，同分取較前者"""
+    best = None
+    for i, m in enumerate(results):
+        if not is_viable(m):
+            continue
+        if best is None or m[sort_by] > results[best][sort_by]:
+            best = i
+    return best
+
+
+@dataclass
+class WalkForwardRun:
+    """欄位式結果：folds 為各區間的最佳網格點與樣本內 / 樣本外績效，
+    equity 為串接後的樣本外權益（每段以前一段的期末權益為本金）"""
+    days: np.ndarray
+    equity: np.ndarray
+    folds: List[Dict]
+    metrics: Dict
+
+    def to_dict(self, picks: Optional[np.ndarray] = None, columnar: bool = False) -> Dict:
+        """picks 為權益曲線要輸出的位置（例如降採樣結果），未指定時輸出全部；
+        columnar 時權益曲線為 {"date": [...], "value": [...]}"""
+        picks = np.arange(len(self.days)) if picks is None else picks
+        curve = {"date": date_strings(self.days[picks]), "value": self.equity[picks]}
+        return {
+            **self.metrics,
+            "folds": self.folds,
+            "equity_curve": curve if columnar else rows_of(curve),
+        }
+
+
+def run_walk_forward(days: np.ndarray, closes: np.ndarray, points: List[SweepPoint], params: BacktestParams,
+                     train_bars: int, test_bars: int, anchored: bool = False,
+                     sort_by: str = "sharpe_ratio") -> WalkForwardRun:
+    """在 [start_date, end_date] 內滾動切出訓練 / 測試區間：訓練區間掃描整個網格取最佳點，
+    測試區間只模擬該點。信號在完整歷史上只產生一次，區間之前的資料可作為均線暖機"""
+    if sort_by not in SORT_FIELDS:
+        raise ValueError(f"不支援的排序欄位: {sort_by}")
+    engine = SweepEngine(days, closes)
+    lo, hi = date_range(engine.days, params.start_date, params.end_date)
+    windows = walk_forward_windows(lo, hi, train_bars, test_bars, anchored)
+    signals = engine.signals(engine.closes, points)
+
+    capital = float(params.initial_cash)
+    equity = np.empty(windows[-1][2] - windows[0][1])
+    folds = []
+    for train_start, test_start, test_end in windows:
+        span = slice(test_start - windows[0][1], test_end - windows[0][1])
+        fold = {
+            "train_start": date_strings(engine.days[[train_start]])[0],
+            "train_end": date_strings(engine.days[[test_start - 1]])[0],
+            "test_start": date_strings(engine.days[[test_start]])[0],
+            "test_end": date_strings(engine.days[[test_end - 1]])[0],
+            "point": None, "train": None, "test": None,
+        }
+        folds.append(fold)
+        train, _, _, _ = engine.evaluate(engine.closes[train_start:test_start], engine.days[train_start:test_start],
+                                         points, signals, params, offset=train_start)
+        best = best_point(train, sort_by)
+        if best is None or capital <= 0:
+            # 沒有可用的參數或已爆倉：本段維持現金
+            equity[span] = capital
+            continue
+
+        point = points[best]
+        fold["point"] = {"strategy_type": point.strategy_mode, "direction": point.direction,
+                         "ma_fast": point.ma_fast, "ma_slow": point.ma_slow, "leverage": point.leverage,
+                         "strategy_params": dict(point.extra)}
+        fold["train"] = train[best]
+        test_params = params.model_copy(update={"initial_cash": capital})
+        test, test_equity, _, bounds = engine.evaluate(
+            engine.closes[test_start:test_end], engine.days[test_start:test_end],
+            [point], replace(signals, valid=[True]), test_params, offset=test_start
+        )
+        fold["test"] = test[0]
+        # 均線尚未就緒的 bar 維持現金，爆倉後為 0
+        row = np.round(test_equity[0], 2)
+        start, end = bounds[0]
+        row[:start] = capital
+        row[end:] = 0.0
+        equity[span] = row
+        capital = float(row[-1])
+
+    out_days = engine.days[windows[0][1]:windows[-1][2]]
+    batch = batch_metrics(out_days, equity, params.initial_cash)
+    metrics = {
+        "total_return": _round(batch["total_return"][0], 2),
+        "cagr": _round(batch["cagr"][0], 2),
+        "mdd": _round(batch["mdd"][0] * 100, 2),
+        "sharpe_ratio": _round(batch["sharpe_ratio"][0], 2),
+        "calmar_ratio": _round(batch["calmar_ratio"][0], 2),
+        "fold_count": len(folds),
+    }
+    return WalkForwardRun(out_days, equity, folds, metrics)
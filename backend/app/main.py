@@ -1,14 +1,38 @@
 # FastAPI Backend
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.datastructures import Default
 from fastapi.middleware.cors import CORSMiddleware
-from app.api import files, backtest, strategies, optimize, yahoo_finance
+from fastapi.middleware.gzip import GZipMiddleware
+from app.api import files, backtest, strategies, optimize, yahoo_finance, portfolio, metrics
+from app.core import parallel
+from app.core.encoding import FastJSONResponse
+from app.core.instrumentation import InstrumentationMiddleware
+
+# 回應超過此大小（bytes）且用戶端支援時以 gzip 壓縮
+GZIP_MINIMUM_SIZE = 1024
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # 關閉參數優化使用的進程池
+    parallel.shutdown_pool()
 
 app = FastAPI(
+    lifespan=lifespan,
     title="高級回測系統 Pro API",
     description="策略回測系統後端 API",
-    version="1.0.0"
+    version="1.0.0",
+    # 沒有回傳型別的路由以 orjson 編碼；有回傳型別的路由仍由 Pydantic 直接輸出 JSON
+    default_response_class=Default(FastJSONResponse)
 )
 
+# 各階段計時（Server-Timing 標頭）與 ?profile=1；放在最內層，profile 摘要同樣經過壓縮與 CORS
+app.add_middleware(InstrumentationMiddleware)
+
+# 大型結果（權益曲線、交易明細）壓縮後傳輸；SSE 進度串流不壓縮
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=6)
+
 # CORS 設定 - 明確列出允許的 origins
 app.add_middleware(
     CORSMiddleware,
@@ -29,6 +53,8 @@ app.include_router(backtest.router, prefix="/api/backtest", tags=["Backtest"])
 app.include_router(strategies.router, prefix="/api/strategies", tags=["Strategies"])
 app.include_router(optimize.router, prefix="/api/optimize", tags=["Optimize"])
 app.include_router(yahoo_finance.router, prefix="/api/yahoo", tags=["Yahoo Finance"])
+app.include_router(portfolio.router, prefix="/api/portfolio", tags=["Portfolio"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 @app.get("/")
 async def root():
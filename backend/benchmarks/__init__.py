@@ -0,0 +1 @@
+# 效能基準測試 - 於 backend/ 目錄執行 python -m benchmarks run，結果輸出為 JSON 供跨版本比較
@@ -0,0 +1,100 @@
+# 命令列入口（於 backend/ 目錄執行）：
+#   python -m benchmarks run [--full] [--only 正規表示式] [--output 結果.json] [--baseline 基準.json]
+#   python -m benchmarks compare 基準.json 結果.json [--threshold 0.25]
+# 有 --baseline 或 compare 時，任一測項中位數變慢超過門檻即以結束碼 1 結束
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+from benchmarks.harness import (
+    DEFAULT_THRESHOLD, RESULT_VERSION, compare, format_comparison, format_results,
+)
+
+# 隨 repo 附帶的 Excel，複製到暫存資料目錄作為真實資料的測項
+BUNDLED_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
+
+
+def _load(path: str) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _gate(baseline: dict, current: dict, threshold: float) -> int:
+    rows = compare(baseline, current, threshold)
+    print(format_comparison(rows))
+    regressions = [r["name"] for r in rows if r["status"] == "regression"]
+    if regressions:
+        print(f"\n{len(regressions)} 項退步超過 {threshold:.0%}: {', '.join(regressions)}")
+        return 1
+    return 0
+
+
+def _prepare_data_dir() -> str:
+    """建立暫存資料目錄並複製附帶的 Excel；須在匯入 app 模組之前設定 BACKTEST_DATA_DIR"""
+    data_dir = tempfile.mkdtemp(prefix="backtest-bench-")
+    for name in os.listdir(BUNDLED_DIR):
+        if name.endswith((".xlsx", ".xls")):
+            shutil.copy2(os.path.join(BUNDLED_DIR, name), data_dir)
+    os.environ["BACKTEST_DATA_DIR"] = data_dir
+    return data_dir
+
+
+def run(args) -> int:
+    data_dir = _prepare_data_dir()
+    try:
+        from benchmarks.harness import environment, measure
+        from benchmarks.scenarios import iter_cases
+        from app.core.parallel import shutdown_pool
+
+        results = {}
+        try:
+            for case in iter_cases(full=args.full, only=args.only):
+                results[case.name] = measure(case, repeat=args.repeat, warmup=args.warmup)
+                r = results[case.name]
+                print(f"{case.name:<40} {r['median_s'] * 1000:>10.2f} ms", file=sys.stderr)
+        finally:
+            shutdown_pool()
+        report = {"version": RESULT_VERSION, "mode": "full" if args.full else "quick",
+                  "environment": environment(), "results": results}
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    print(format_results(results))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    if args.baseline:
+        print()
+        return _gate(_load(args.baseline), report, args.threshold)
+    return 0
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks", description="回測系統效能基準測試")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = sub.add_parser("run", help="執行基準測試")
+    run_parser.add_argument("--full", action="store_true", help="完整規模（含 1M bars 與大型網格）")
+    run_parser.add_argument("--only", help="只執行名稱符合此正規表示式的測項")
+    run_parser.add_argument("--repeat", type=int, default=5, help="每個測項計時次數")
+    run_parser.add_argument("--warmup", type=int, default=1, help="計時前的暖機次數")
+    run_parser.add_argument("--output", help="結果 JSON 輸出路徑")
+    run_parser.add_argument("--baseline", help="與此結果 JSON 比較並套用退步門檻")
+    run_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, help="退步門檻（中位數變慢比例）")
+
+    cmp_parser = sub.add_parser("compare", help="比較兩份結果 JSON")
+    cmp_parser.add_argument("baseline")
+    cmp_parser.add_argument("current")
+    cmp_parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+
+    args = parser.parse_args(argv)
+    if args.command == "compare":
+        return _gate(_load(args.baseline), _load(args.current), args.threshold)
+    return run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+# 計時、環境資訊與結果比較
+import math
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 結果檔格式版本
+RESULT_VERSION = 1
+# 中位數變慢超過此比例視為退步
+DEFAULT_THRESHOLD = 0.25
+# 基準中位數低於此秒數的項目只報告不判定（計時雜訊大於差異）
+MIN_GATE_SECONDS = 0.001
+
+
+@dataclass
+class Case:
+    """單一測項：fn 為計時的工作，setup 於每次計時前執行（不計時），items 為一次處理的筆數（用於計算吞吐量），
+    repeat 為計時次數上限（大型測項使用）"""
+    name: str
+    fn: Callable[[], object]
+    setup: Optional[Callable[[], None]] = None
+    items: int = 1
+    repeat: Optional[int] = None
+
+
+def measure(case: Case, repeat: int, warmup: int = 1) -> Dict:
+    """先執行 warmup 次（JIT 編譯、快取填入），再計時 repeat 次（測項另有上限時取較小者）"""
+    repeat = min(case.repeat, repeat) if case.repeat else repeat
+    for _ in range(warmup):
+        if case.setup:
+            case.setup()
+        case.fn()
+    times = []
+    for _ in range(repeat):
+        if case.setup:
+            case.setup()
+        start = time.perf_counter()
+        case.fn()
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+    return {
+        "median_s": median,
+        "min_s": min(times),
+        "mean_s": statistics.fmean(times),
+        "stdev_s": statistics.stdev(times) if len(times) > 1 else 0.0,
+        "repeat": repeat,
+        "items": case.items,
+        "items_per_s": case.items / median if median > 0 else math.inf,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                             timeout=5, cwd=os.path.dirname(os.path.abspath(__file__)))
+        return out.stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def environment() -> Dict:
+    """執行環境（比較不同機器的結果時需一併檢查）"""
+    from app.core.parallel import MAX_WORKERS
+    from app.core.simulation import NUMBA_AVAILABLE
+    return {
+        "commit": _git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "numba": NUMBA_AVAILABLE,
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "optimize_workers": MAX_WORKERS,
+    }
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = DEFAULT_THRESHOLD) -> List[Dict]:
+    """逐項比較中位數；status 為 regression / improved / ok / new / missing"""
+    base_results = baseline.get("results", {})
+    rows = []
+    for name, result in current.get("results", {}).items():
+        base = base_results.get(name)
+        if base is None:
+            rows.append({"name": name, "status": "new", "current_s": result["median_s"]})
+            continue
+        ratio = result["median_s"] / base["median_s"] if base["median_s"] > 0 else math.inf
+        status = "ok"
+        if base["median_s"] >= MIN_GATE_SECONDS:
+            if ratio > 1 + threshold:
+                status = "regression"
+            elif ratio < 1 / (1 + threshold):
+                status = "improved"
+        rows.append({"name": name, "status": status, "baseline_s": base["median_s"],
+                     "current_s": result["median_s"], "ratio": ratio})
+    for name in base_results:
+        if name not in current.get("results", {}):
+            rows.append({"name": name, "status": "missing", "baseline_s": base_results[name]["median_s"]})
+    return rows
+
+
+def _ms(seconds: Optional[float]) -> str:
+    return "" if seconds is None else f"{seconds * 1000:.2f}"
+
+
+def format_results(results: Dict[str, Dict]) -> str:
+    lines = [f"{'case':<40} {'median ms':>12} {'min ms':>12} {'items/s':>14}"]
+    for name, r in results.items():
+        lines.append(f"{name:<40} {_ms(r['median_s']):>12} {_ms(r['min_s']):>12} {r['items_per_s']:>14.1f}")
+    return "\n".join(lines)
+
+
+def format_comparison(rows: List[Dict]) -> str:
+    lines = [f"{'case':<40} {'baseline ms':>12} {'current ms':>12} {'ratio':>8}  status"]
+    for row in rows:
+        ratio = f"{row['ratio']:.2f}" if "ratio" in row else ""
+        lines.append(f"{row['name']:<40} {_ms(row.get('baseline_s')):>12} {_ms(row.get('current_s')):>12} "
+                     f"{ratio:>8}  {row['status']}")
+    return "\n".join(lines)
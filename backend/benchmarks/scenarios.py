@@ -0,0 +1,199 @@
+# 測試情境 - 每個情境依規模產生測項；資料目錄由 __main__ 以 BACKTEST_DATA_DIR 指到暫存目錄
+import asyncio
+import itertools
+import os
+import re
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Sequence, Union
+
+import numpy as np
+
+from app.api import files as files_api
+from app.api.optimize import OptimizeRequest, execute_optimization
+from app.core.backtest_engine import BacktestEngine, BacktestParams, date_strings
+from app.core.parallel import run_sweep
+from app.core.price_repository import price_repository
+from app.core.price_store import DATA_DIR, drop_price_series, load_price_series
+from app.core.result_cache import result_cache
+from app.core.sweep import SweepEngine, SweepPoint
+from benchmarks.harness import Case
+from benchmarks.synthetic import gbm_prices, write_excel
+
+# 合成 Excel 的 bar 數（列表與追加測項使用）
+FIXTURE_BARS = 500
+# 參數掃描使用的 bar 數
+SWEEP_BARS = 5000
+
+
+# 規模可為固定序列，或在執行時才決定的函式（例如資料目錄中的檔案）
+Sizes = Union[Sequence, Callable[[], Sequence]]
+
+
+@dataclass
+class Scenario:
+    name: str
+    build: Callable[..., Case]
+    quick: Sizes
+    full: Sizes
+    label: str = "n"
+
+
+# 已註冊的情境（依執行順序）
+SCENARIOS: List[Scenario] = []
+
+
+def scenario(name: str, quick: Sizes, full: Sizes, label: str = "n"):
+    """註冊情境：build(size) 回傳一個 Case"""
+    def decorator(build):
+        SCENARIOS.append(Scenario(name, build, quick, full, label))
+        return build
+    return decorator
+
+
+def bundled_files() -> List[str]:
+    """資料目錄中隨 repo 附帶的 Excel（不含合成檔）"""
+    return sorted(f for f in os.listdir(DATA_DIR) if f.endswith((".xlsx", ".xls")) and not f.startswith("bench_"))
+
+
+def first_bundled_file() -> List[str]:
+    return bundled_files()[:1]
+
+
+def iter_cases(full: bool = False, only: str = None) -> Iterator[Case]:
+    pattern = re.compile(only) if only else None
+    for s in SCENARIOS:
+        sizes = s.full if full else s.quick
+        for size in (sizes() if callable(sizes) else sizes):
+            name = f"{s.name}[{s.label}={size}]"
+            if pattern and not pattern.search(name):
+                continue
+            case = s.build(size)
+            case.name = name
+            yield case
+
+
+# ==================== 回測引擎 ====================
+
+def _engine(n_bars: int) -> BacktestEngine:
+    days, closes = gbm_prices(n_bars, seed=n_bars)
+    return BacktestEngine(days, closes)
+
+
+# 只做多、1 倍槓桿：合成序列到 1M bars 都不會觸發爆倉，每次都模擬完整區間
+_RUN_PARAMS = BacktestParams(strategy_mode="dual_ma", ma_fast=20, ma_slow=60, leverage=1.0,
+                             fee_rate=0.0005, slippage=0.0)
+
+
+@scenario("engine_run", quick=(1_000, 10_000), full=(1_000, 10_000, 100_000, 1_000_000))
+def engine_run(n_bars: int) -> Case:
+    """單次完整回測（含交易明細、年度統計與 dict 轉換）"""
+    engine = _engine(n_bars)
+    return Case("", lambda: engine.run(_RUN_PARAMS).to_result(), items=n_bars,
+                repeat=3 if n_bars >= 1_000_000 else None)
+
+
+@scenario("engine_metrics_only", quick=(1_000, 10_000), full=(1_000, 10_000, 100_000, 1_000_000))
+def engine_metrics_only(n_bars: int) -> Case:
+    engine = _engine(n_bars)
+    return Case("", lambda: engine.run(_RUN_PARAMS, metrics_only=True), items=n_bars,
+                repeat=3 if n_bars >= 1_000_000 else None)
+
+
+# ==================== 參數掃描 ====================
+
+def grid_points(n: int) -> List[SweepPoint]:
+    """依序展開單均線 / 雙均線、方向與槓桿的組合，取前 n 個"""
+    def combos():
+        for fast in itertools.count(5, 5):
+            for slow in (None, 120, 200, 250):
+                if slow is not None and slow <= fast:
+                    continue
+                for direction, leverage in itertools.product(("long_only", "long_short"), (1.0, 2.0)):
+                    yield SweepPoint("single_ma" if slow is None else "dual_ma", direction, fast, slow, leverage)
+    return list(itertools.islice(combos(), n))
+
+
+@scenario("sweep", quick=(50, 200), full=(50, 200, 1_000, 5_000), label="points")
+def sweep(n_points: int) -> Case:
+    """網格掃描（與 /api/optimize 相同路徑：網格夠大時使用進程池）"""
+    days, closes = gbm_prices(SWEEP_BARS, seed=1)
+    points = grid_points(n_points)
+    params = BacktestParams()
+    return Case("", lambda: run_sweep(days, closes, points, params), items=n_points)
+
+
+@scenario("sweep_inline", quick=(672,), full=(672, 2_000), label="points")
+def sweep_inline(n_points: int) -> Case:
+    """單一進程內的批次模擬（不經進程池），預設優化網格的規模約 672 點"""
+    days, closes = gbm_prices(SWEEP_BARS, seed=1)
+    points = grid_points(n_points)
+    params = BacktestParams()
+    engine = SweepEngine(days, closes)
+    return Case("", lambda: engine.run(points, params), items=n_points)
+
+
+@scenario("optimize_request", quick=first_bundled_file, full=first_bundled_file, label="file")
+def optimize_request(file_id: str) -> Case:
+    """預設優化請求（網格展開、掃描、排序與結果快取寫入）；每次計時前清空結果快取"""
+    request = OptimizeRequest(file_id=file_id)
+    series = price_repository.get(file_id)
+    return Case("", lambda: execute_optimization(request, series), setup=result_cache.clear)
+
+
+# ==================== Excel 與欄式快取 ====================
+
+@scenario("excel_ingest", quick=first_bundled_file, full=bundled_files, label="file")
+def excel_ingest(file_id: str) -> Case:
+    """冷啟動：解析 Excel 並寫入欄式快照"""
+    def setup():
+        drop_price_series(file_id)
+        price_repository.invalidate(file_id)
+
+    return Case("", lambda: load_price_series(file_id), setup=setup)
+
+
+@scenario("series_open", quick=first_bundled_file, full=first_bundled_file, label="file")
+def series_open(file_id: str) -> Case:
+    """已有快照時開啟序列（memory-map，不經過價格快取）"""
+    load_price_series(file_id)
+    return Case("", lambda: load_price_series(file_id))
+
+
+# ==================== 檔案 API ====================
+
+def _ensure_fixtures(count: int) -> List[str]:
+    """資料目錄中恰好保留 count 個合成 Excel（bench_0000.xlsx ...）"""
+    names = [f"bench_{i:04d}.xlsx" for i in range(count)]
+    days, closes = gbm_prices(FIXTURE_BARS, seed=7, start="2020-01-01")
+    for name in names:
+        path = os.path.join(DATA_DIR, name)
+        if not os.path.exists(path):
+            write_excel(path, days, closes)
+    for name in os.listdir(DATA_DIR):
+        if name.startswith("bench_") and name not in names:
+            os.remove(os.path.join(DATA_DIR, name))
+            drop_price_series(name)
+    return names
+
+
+@scenario("list_files", quick=(10, 50), full=(10, 100, 300), label="files")
+def list_files(count: int) -> Case:
+    """GET /api/files（目錄已建立後的穩定狀態：每個檔案只需 stat）"""
+    _ensure_fixtures(count)
+    return Case("", lambda: asyncio.run(files_api.list_files()), items=count)
+
+
+@scenario("append", quick=(1, 100), full=(1, 100, 1_000), label="rows")
+def append(rows: int) -> Case:
+    """POST /api/files/{id}/append（寫入 WAL；累積到門檻時壓實快照）"""
+    file_id = _ensure_fixtures(1)[0]
+    state: Dict = {}
+
+    def setup():
+        last = int(price_repository.get(file_id).days[-1])
+        dates = date_strings(np.arange(last + 1, last + 1 + rows))
+        state["request"] = files_api.AppendDataRequest(rows=[{"date": d, "close": 100.0 + i}
+                                                             for i, d in enumerate(dates)])
+
+    return Case("", lambda: asyncio.run(files_api.append_data(file_id, state["request"])),
+                setup=setup, items=rows)
@@ -0,0 +1,26 @@
+# 合成價格 - 幾何布朗運動（GBM）序列與 Excel 測試檔
+import numpy as np
+import pandas as pd
+
+# 每年的 bar 數（連續日曆日，與加密貨幣資料相同）
+BARS_PER_YEAR = 365
+
+
+def gbm_prices(n_bars: int, seed: int = 0, mu: float = 0.1, sigma: float = 0.3,
+               start_price: float = 100.0, start: str = "1970-01-01"):
+    """日頻 GBM 收盤價，回傳 (int64 日數, float64 收盤價)；相同 seed 產生相同序列"""
+    rng = np.random.default_rng(seed)
+    dt = 1 / BARS_PER_YEAR
+    log_returns = (mu - 0.5 * sigma ** 2) * dt + sigma * np.sqrt(dt) * rng.standard_normal(max(n_bars - 1, 0))
+    closes = start_price * np.exp(np.r_[0.0, np.cumsum(log_returns)])
+    first = int(np.datetime64(start, "D").astype(np.int64))
+    return first + np.arange(n_bars, dtype=np.int64), closes
+
+
+def write_excel(path: str, days: np.ndarray, closes: np.ndarray) -> None:
+    """寫出與上傳檔相同格式（date / close 欄位）的 Excel"""
+    frame = pd.DataFrame({
+        "date": np.asarray(days).astype("datetime64[D]").astype("datetime64[ns]"),
+        "close": np.asarray(closes),
+    })
+    frame.to_excel(path, index=False)
@@ -0,0 +1,38 @@
+# 測試共用設定：資料目錄指到暫存目錄（須在匯入 app 模組之前設定），不讀寫 backend/data/
+import os
+import shutil
+import tempfile
+
+import numpy as np
+import pandas as pd
+import pytest
+
+_DATA_DIR = tempfile.mkdtemp(prefix="backtest-test-")
+os.environ["BACKTEST_DATA_DIR"] = _DATA_DIR
+os.environ.setdefault("RESULT_CACHE_DISK", "0")
+
+from benchmarks.synthetic import gbm_prices  # noqa: E402
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(_DATA_DIR, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def data_dir() -> str:
+    return _DATA_DIR
+
+
+@pytest.fixture(scope="session")
+def prices():
+    """跨越多個月份與年度的合成日頻價格（int64 日數, float64 收盤價）"""
+    return gbm_prices(900, seed=3, mu=0.2, sigma=0.8, start="2019-01-01")
+
+
+@pytest.fixture(scope="session")
+def price_frame(prices) -> pd.DataFrame:
+    days, closes = prices
+    return pd.DataFrame({
+        "date": np.asarray(days).astype("datetime64[D]").astype("datetime64[ns]"),
+        "close": closes,
+    })
@@ -0,0 +1,96 @@
+# 日曆索引：週（星期一起算）、季的區段邊界與 datetime 參考相同；再平衡頻率只接受支援的值
+import datetime
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app.core.backtest_engine import BacktestParams
+from app.core.calendar_index import FREQUENCIES, CalendarIndex, period_ids
+from app.core.portfolio import PortfolioAsset, PortfolioParams
+
+EPOCH = datetime.date(1970, 1, 1)
+
+
+def _days(start: str, end: str) -> np.ndarray:
+    return np.arange(np.datetime64(start, "D"), np.datetime64(end, "D") + 1).astype(np.int64)
+
+
+def _reference_key(day: int, freq: str):
+    date = EPOCH + datetime.timedelta(days=int(day))
+    if freq == "weekly":
+        return date - datetime.timedelta(days=date.weekday())
+    if freq == "monthly":
+        return date.year, date.month
+    if freq == "quarterly":
+        return date.year, (date.month - 1) // 3
+    return date.year
+
+
+def _reference_starts(days, freq):
+    keys = [_reference_key(d, freq) for d in days]
+    return [i for i in range(len(keys)) if i == 0 or keys[i] != keys[i - 1]]
+
+
+@pytest.mark.parametrize("freq", FREQUENCIES)
+@pytest.mark.parametrize("start, end", [("1969-12-20", "1970-02-10"), ("2019-12-20", "2021-01-10"),
+                                        ("2023-12-25", "2024-04-02")])
+def test_period_boundaries_match_reference(freq, start, end):
+    days = _days(start, end)
+    ids = period_ids(days, freq)
+    assert np.all(np.diff(ids) >= 0)
+    assert CalendarIndex(days).starts(freq).tolist() == _reference_starts(days, freq)
+
+
+def _day(date: str) -> int:
+    return int(np.datetime64(date, "D").astype(np.int64))
+
+
+def test_weekly_boundaries():
+    # 1970-01-01 為星期四，與前面的星期一同一週；週日與下一個星期一不同週
+    first = np.array([_day("1969-12-29"), _day("1970-01-01"), _day("1970-01-04")])
+    assert period_ids(first, "weekly").tolist() == [0, 0, 0]
+    assert period_ids(np.array([_day("1970-01-05")]), "weekly").tolist() == [1]
+    # 跨年的週：2019-12-30（一）與 2020-01-05（日）同一週
+    pair = period_ids(np.array([_day("2019-12-29"), _day("2019-12-30"), _day("2020-01-05"), _day("2020-01-06")]),
+                      "weekly")
+    assert pair[0] + 1 == pair[1] == pair[2] == pair[3] - 1
+
+
+def test_quarterly_boundaries():
+    dates = ["2020-01-01", "2020-03-31", "2020-04-01", "2020-06-30", "2020-07-01", "2020-09-30", "2020-10-01",
+             "2020-12-31", "2021-01-01"]
+    ids = period_ids(np.array([_day(d) for d in dates]), "quarterly").tolist()
+    assert ids == [ids[0], ids[0], ids[0] + 1, ids[0] + 1, ids[0] + 2, ids[0] + 2, ids[0] + 3, ids[0] + 3, ids[0] + 4]
+    assert ids[-1] % 4 == 0 and (ids[-1] // 4) + 1970 == 2021
+
+
+def test_flags_on_trading_days():
+    """只有平日的資料：週一（或長假後第一個交易日）為新的一週；區間第一筆固定為 False"""
+    days = _days("2024-03-25", "2024-04-16")
+    days = days[(days + 3) % 7 < 5]
+    days = days[days != _day("2024-04-01")]  # 季初第一天休市
+    calendar = CalendarIndex(days)
+    weekly = calendar.flags("weekly")
+    assert [str(np.datetime64(int(d), "D")) for d in days[weekly]] == ["2024-04-02", "2024-04-08", "2024-04-15"]
+    quarterly = calendar.flags("quarterly")
+    assert [str(np.datetime64(int(d), "D")) for d in days[quarterly]] == ["2024-04-02"]
+    lo = int(np.searchsorted(days, _day("2024-04-02")))
+    assert not calendar.flags("quarterly", lo).any()
+    assert calendar.flags("weekly", lo).tolist() == [False] + weekly[lo + 1:].tolist()
+
+
+@pytest.mark.parametrize("frequency", ["daily", "Monthly", ""])
+def test_unsupported_frequency_rejected(frequency):
+    with pytest.raises(ValidationError):
+        BacktestParams(rebalance_frequency=frequency)
+    with pytest.raises(ValidationError):
+        PortfolioParams(assets=[PortfolioAsset(file_id="a.xlsx")], rebalance_frequency=frequency)
+    with pytest.raises(ValueError):
+        period_ids(np.arange(3), frequency)
+
+
+def test_supported_frequencies_accepted():
+    assert FREQUENCIES == ("weekly", "monthly", "quarterly", "yearly")
+    for frequency in FREQUENCIES:
+        assert BacktestParams(rebalance_frequency=frequency).rebalance_frequency == frequency
@@ -0,0 +1,138 @@
+# 圖表降採樣：LTTB 與 min-max 的選點與逐區塊參考實作相同；點數不足、上限過小與 NaN 的處理；預設只取最後 500 筆
+import os
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core.downsample import (
+    DEFAULT_LAST_ROWS, MIN_POINTS, MINMAX_MIN_POINTS, chart_indices, downsample_indices, lttb_indices,
+    minmax_indices,
+)
+from app.main import app
+
+
+def _series(n: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    x = np.arange(n, dtype=np.float64) + 17000
+    return x, 100 * np.exp(np.cumsum(rng.normal(0, 0.02, n)))
+
+
+def _reference_lttb(x, y, n_out):
+    """逐區塊以 Python 計算的 LTTB（區塊邊界與平均點的定義與實作相同）"""
+    n = len(y)
+    every = (n - 2) / (n_out - 2)
+    edges = [int(b * every) + 1 for b in range(n_out - 1)]
+    edges[-1] = n - 1
+    out, a = [0], 0
+    for b in range(n_out - 2):
+        lo, hi = edges[b], edges[b + 1]
+        if b + 2 < len(edges):
+            nxt = range(hi, edges[b + 2])
+            cx = sum(x[j] for j in nxt) / len(nxt)
+            cy = sum(y[j] for j in nxt) / len(nxt)
+        else:
+            cx, cy = x[n - 1], y[n - 1]
+        areas = [abs((x[a] - cx) * (y[j] - y[a]) - (x[a] - x[j]) * (cy - y[a])) for j in range(lo, hi)]
+        a = lo + max(range(len(areas)), key=lambda k: (areas[k], -k))
+        out.append(a)
+    return out + [n - 1]
+
+
+def _reference_minmax(y, n_out):
+    n = len(y)
+    n_buckets = max(1, (n_out - 2) // 2)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    picks = {0, n - 1}
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        bucket = y[lo:hi].tolist()
+        picks.add(lo + bucket.index(min(bucket)))
+        picks.add(lo + len(bucket) - 1 - bucket[::-1].index(max(bucket)))
+    return sorted(picks)
+
+
+@pytest.mark.parametrize("n, n_out", [(1000, 3), (1000, 10), (1000, 500), (4125, 800), (501, 500)])
+def test_lttb_matches_reference(n, n_out):
+    x, y = _series(n, seed=n_out)
+    picks = lttb_indices(x, y, n_out)
+    assert picks.tolist() == _reference_lttb(x.tolist(), y.tolist(), n_out)
+
+
+@pytest.mark.parametrize("n, n_out", [(1000, 4), (1000, 11), (1000, 500), (4125, 800)])
+def test_minmax_matches_reference(n, n_out):
+    _, y = _series(n, seed=n_out)
+    y = np.round(y)  # 區塊內有同值時取第一個最小值與最後一個最大值
+    picks = minmax_indices(y, n_out)
+    assert picks.tolist() == _reference_minmax(y, n_out)
+    assert len(picks) <= n_out
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax", "none"])
+@pytest.mark.parametrize("n", [0, 1, 2, 499, 500])
+def test_fewer_points_than_max_are_kept(method, n):
+    x, y = _series(n)
+    assert downsample_indices(x, y, 500, method).tolist() == list(range(n))
+    assert downsample_indices(x, y, None, method).tolist() == list(range(n))
+
+
+@pytest.mark.parametrize("method, minimum", [("lttb", MIN_POINTS), ("minmax", MINMAX_MIN_POINTS)])
+def test_too_few_max_points_rejected(method, minimum):
+    x, y = _series(100)
+    for max_points in range(minimum):
+        with pytest.raises(ValueError):
+            downsample_indices(x, y, max_points, method)
+        # 資料點數不超過上限時不需降採樣
+        assert downsample_indices(x[:max_points], y[:max_points], max_points, method).tolist() == list(range(max_points))
+    picks = downsample_indices(x, y, minimum, method)
+    assert len(picks) == minimum and picks[0] == 0 and picks[-1] == 99
+
+
+def test_unknown_method_rejected():
+    x, y = _series(10)
+    with pytest.raises(ValueError):
+        downsample_indices(x, y, 5, "nope")
+
+
+@pytest.mark.parametrize("method", ["lttb", "minmax"])
+def test_nan_points_are_not_selected(method):
+    x, y = _series(2000, seed=4)
+    rng = np.random.default_rng(9)
+    y[rng.random(len(y)) < 0.2] = np.nan
+    y[0] = y[-1] = 1.0
+    picks = downsample_indices(x, y, 100, method)
+    assert np.all(np.diff(picks) > 0) and picks[0] == 0 and picks[-1] == len(y) - 1
+    assert len(picks) <= 100 and not np.isnan(y[picks]).any()
+    if method == "minmax":
+        # 全域的最高、最低點一定在某個區塊內被選到
+        assert y[picks].max() == np.nanmax(y) and y[picks].min() == np.nanmin(y)
+
+
+def test_chart_indices_default_last_rows():
+    x, y = _series(2000)
+    days = x.astype(np.int64)
+    assert chart_indices(days, y, None).tolist() == list(range(2000 - DEFAULT_LAST_ROWS, 2000))
+    assert chart_indices(days, y, None, last=0).tolist() == list(range(2000))
+    assert chart_indices(days, y, None, last=30).tolist() == list(range(1970, 2000))
+    # 指定日期區間時取整個區間
+    start = str(np.datetime64(int(days[100]), "D"))
+    assert chart_indices(days, y, None, start_date=start).tolist() == list(range(100, 2000))
+
+
+def test_preview_and_chart_default_to_last_rows(data_dir, price_frame):
+    file_id = "downsample.xlsx"
+    price_frame.to_excel(os.path.join(data_dir, file_id), index=False)
+    client = TestClient(app)
+    try:
+        expected = price_frame["date"].dt.strftime("%Y-%m-%d").tolist()
+        preview = client.get(f"/api/files/{file_id}/preview").json()["chart_data"]
+        assert [row["date"] for row in preview] == expected[-DEFAULT_LAST_ROWS:]
+        full = client.get(f"/api/files/{file_id}/preview?limit=0&max_points=200").json()["chart_data"]
+        assert len(full) == 200 and full[0]["date"] == expected[0] and full[-1]["date"] == expected[-1]
+
+        chart = client.post("/api/optimize/chart", json={"file_id": file_id, "ma_fast": 5}).json()["data"]
+        assert [row["date"] for row in chart] == expected[-DEFAULT_LAST_ROWS:]
+        assert all(row["ma_fast"] is not None for row in chart)
+        response = client.post("/api/optimize/chart", json={"file_id": file_id, "max_points": 2, "limit": 0})
+        assert response.status_code == 400
+    finally:
+        client.delete(f"/api/files/{file_id}")
@@ -0,0 +1,81 @@
+# 回應格式協商：列出的格式都不支援時回傳 406，不改送 JSON；應用程式關閉時釋放進程池
+import json
+import os
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.api import backtest, optimize
+from app.api.backtest import BacktestRequest, get_backtest_run
+from app.api.optimize import OptimizeRequest, execute_optimization
+from app.core import encoding, parallel
+from app.core.encoding import COLUMNAR_MEDIA_TYPE, JSON_MEDIA_TYPE, negotiate
+from app.core.price_repository import price_repository
+from app.main import app
+
+
+@pytest.mark.parametrize("accept, expected", [
+    (None, JSON_MEDIA_TYPE),
+    ("", JSON_MEDIA_TYPE),
+    ("application/json, text/plain, */*", JSON_MEDIA_TYPE),
+    ("text/html,application/xhtml+xml;q=0.9,*/*;q=0.8", JSON_MEDIA_TYPE),
+    (f"{COLUMNAR_MEDIA_TYPE}, application/json;q=0.5", COLUMNAR_MEDIA_TYPE),
+    ("application/msgpack, application/json;q=0.5", JSON_MEDIA_TYPE),
+])
+def test_negotiate_without_msgpack(monkeypatch, accept, expected):
+    monkeypatch.setattr(encoding, "MSGPACK_AVAILABLE", False)
+    assert negotiate(accept) == expected
+
+
+@pytest.mark.parametrize("accept", ["application/msgpack", "text/csv", f"{COLUMNAR_MEDIA_TYPE};q=0, text/csv"])
+def test_negotiate_rejects_unsupported(monkeypatch, accept):
+    monkeypatch.setattr(encoding, "MSGPACK_AVAILABLE", False)
+    with pytest.raises(HTTPException) as info:
+        negotiate(accept)
+    assert info.value.status_code == 406
+
+
+def test_preview_returns_406_and_lifespan_shuts_down_pool(monkeypatch, data_dir, price_frame):
+    monkeypatch.setattr(encoding, "MSGPACK_AVAILABLE", False)
+    calls = []
+    monkeypatch.setattr(parallel, "shutdown_pool", lambda: calls.append(True))
+    file_id = "encoding.xlsx"
+    price_frame.iloc[:100].to_excel(os.path.join(data_dir, file_id), index=False)
+
+    with TestClient(app) as client:
+        try:
+            assert client.get(f"/api/files/{file_id}/preview", headers={"Accept": "application/msgpack"}).status_code == 406
+            response = client.get(f"/api/files/{file_id}/preview", headers={"Accept": COLUMNAR_MEDIA_TYPE})
+            assert response.status_code == 200
+            assert len(response.json()["chart_data"]["date"]) == 100
+        finally:
+            client.delete(f"/api/files/{file_id}")
+        assert not calls
+    assert calls == [True]
+
+
+def test_run_routes_skip_response_model(data_dir, price_frame):
+    """回測與優化的 /run 直接回傳已編碼的回應，內容與 Pydantic 模型序列化相同"""
+    for router in (backtest.router, optimize.router):
+        route = next(r for r in router.routes if r.path == "/run")
+        assert route.response_model is None
+
+    file_id = "encoding_run.xlsx"
+    price_frame.to_excel(os.path.join(data_dir, file_id), index=False)
+    client = TestClient(app)
+    try:
+        params = {"strategy_mode": "single_ma", "ma_fast": 10, "trade_direction": "long_short"}
+        response = client.post("/api/backtest/run", json={"file_id": file_id, "params": params})
+        assert response.headers["content-type"] == JSON_MEDIA_TYPE
+        run = get_backtest_run(BacktestRequest(file_id=file_id, params=params))
+        assert response.json() == json.loads(run.to_result().model_dump_json())
+
+        request = {"file_id": file_id, "top_n": 5, "ma_fast_range": [5, 10, 20]}
+        response = client.post("/api/optimize/run", json=request)
+        assert response.headers["content-type"] == JSON_MEDIA_TYPE
+        series = price_repository.get(file_id)
+        expected = [json.loads(r.model_dump_json()) for r in execute_optimization(OptimizeRequest(**request), series)]
+        assert response.json() == expected and len(expected) == 5
+    finally:
+        client.delete(f"/api/files/{file_id}")
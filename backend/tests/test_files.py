@@ -0,0 +1,65 @@
+# 檔案列表：無法辨識欄位或沒有日期的檔案以 status "error" 列出並附上原因；冷目錄在鎖外轉檔且建好後即為最新
+import os
+
+import pandas as pd
+from fastapi.testclient import TestClient
+
+from app.core import file_catalog as catalog_module
+from app.core.file_catalog import FileCatalog
+from app.core.price_store import PriceColumnError, drop_price_series, store_stamp
+from app.main import app
+
+
+def _listed(client: TestClient, file_id: str) -> dict:
+    return next(f for f in client.get("/api/files").json() if f["id"] == file_id)
+
+
+def test_list_files_reports_unreadable_files(data_dir, price_frame):
+    client = TestClient(app)
+    files = {
+        "list-ok.xlsx": price_frame.iloc[:50],
+        "list-no-columns.xlsx": pd.DataFrame({"foo": [1, 2], "bar": [3, 4]}),
+        "list-no-dates.xlsx": pd.DataFrame({"date": ["x", "y"], "close": [1.0, 2.0]}),
+    }
+    for file_id, frame in files.items():
+        frame.to_excel(os.path.join(data_dir, file_id), index=False)
+    try:
+        ok = _listed(client, "list-ok.xlsx")
+        assert ok["row_count"] == 50 and ok["status"] in ("fresh", "recent", "old")
+
+        no_columns = _listed(client, "list-no-columns.xlsx")
+        assert no_columns["status"] == "error"
+        assert no_columns["error"] == str(PriceColumnError())
+        assert no_columns["row_count"] == 0 and no_columns["latest_date"] is None
+
+        no_dates = _listed(client, "list-no-dates.xlsx")
+        assert no_dates["status"] == "error" and no_dates["error"]
+    finally:
+        for file_id in files:
+            client.delete(f"/api/files/{file_id}")
+
+
+def test_cold_catalog_ingests_outside_lock_and_stays_fresh(monkeypatch, data_dir, price_frame):
+    file_id = "catalog-cold.xlsx"
+    price_frame.iloc[:50].to_excel(os.path.join(data_dir, file_id), index=False)
+    catalog = FileCatalog(os.path.join(data_dir, "catalog-test.json"))
+    get = catalog_module.price_repository.get
+    held = []
+
+    def tracked_get(fid):
+        held.append(catalog._lock.locked())
+        return get(fid)
+
+    monkeypatch.setattr(catalog_module.price_repository, "get", tracked_get)
+    try:
+        drop_price_series(file_id)
+        [entry] = catalog.list([file_id])
+        assert held == [False]
+        # 戳記在轉檔之後取得，已包含新建立的 meta.json
+        assert entry["stamp"] == list(store_stamp(file_id)) and entry["rows"] == 50
+        assert catalog.list([file_id]) == [entry] and held == [False]
+        assert FileCatalog(catalog.path).list([file_id]) == [entry] and held == [False]
+    finally:
+        drop_price_series(file_id)
+        os.remove(os.path.join(data_dir, file_id))
+        os.remove(catalog.path)
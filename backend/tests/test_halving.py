@@ -0,0 +1,121 @@
+# 逐次減半：各輪候選數與 bar 數符合排程、成本約等於 budget；各輪留下的候選與對全部網格點窮舉評估後取前幾名相同
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+from app.api.optimize import OptimizeRequest, halving_plan, progress_total
+from app.core.backtest_engine import BacktestParams, date_range
+from app.core.halving import (
+    HALVING_ETA, HALVING_MAX_RUNGS, HALVING_MIN_BARS, rung_schedule, sample_points, successive_halving,
+)
+from app.core.price_store import PriceSeries
+from app.core.ranking import is_viable
+from app.core.sweep import SweepEngine, SweepPoint
+
+
+def grid_points():
+    points = [SweepPoint("buy_and_hold", "long_only", 0, None, 1.0)]
+    for direction, fast, leverage in itertools.product(("long_only", "long_short"), (3, 8, 15, 30), (1.0, 2.5)):
+        points.append(SweepPoint("single_ma", direction, fast, None, leverage))
+        points.append(SweepPoint("dual_ma", direction, fast, 50, leverage))
+    return points
+
+
+@pytest.mark.parametrize("n_bars", [100, 300, 800, 2500, 9000, 50000])
+@pytest.mark.parametrize("budget, keep", [(1, 1), (50, 5), (200, 10), (1000, 5)])
+def test_rung_schedule(n_bars, budget, keep):
+    schedule = rung_schedule(n_bars, budget, keep)
+    assert 1 <= len(schedule) <= HALVING_MAX_RUNGS
+    counts = [c for c, _ in schedule]
+    bars = [b for _, b in schedule]
+    # 最後一輪為完整區間；較早的輪次每輪縮短 HALVING_ETA 倍但不少於 HALVING_MIN_BARS
+    assert bars[-1] == n_bars and bars == sorted(bars)
+    assert all(b >= min(HALVING_MIN_BARS, n_bars) for b in bars)
+    for r in range(1, len(schedule)):
+        assert counts[r] == max(keep, math.ceil(counts[0] / HALVING_ETA ** r))
+    assert min(counts) >= keep
+    cost = sum(c * b / n_bars for c, b in schedule)
+    if counts[-1] > keep:
+        assert abs(cost - budget) <= 0.05 * budget + len(schedule)
+
+
+def _exhaustive(engine: SweepEngine, points, params, sort_by, schedule):
+    """每一輪都評估全部網格點，再依前一輪的倖存者依序取前幾名（同分時保留網格順序）"""
+    signals = engine.signals(engine.closes, points)
+    n = len(engine.days)
+    per_rung = []
+    for _, bars in schedule:
+        offset = max(0, n - bars)
+        results = engine.evaluate(engine.closes[offset:], engine.days[offset:], points, signals, params,
+                                  offset=offset)[0]
+        per_rung.append(results)
+    survivors = [i for i, ok in enumerate(signals.valid) if ok]
+    history = [list(survivors)]
+    for rung in range(1, len(schedule)):
+        prev = per_rung[rung - 1]
+        # 爆倉或無法執行者排最後；同分時網格順序在前者優先
+        ranked = sorted(survivors, key=lambda i: (-(prev[i][sort_by] if is_viable(prev[i]) else -math.inf), i))
+        survivors = sorted(ranked[:schedule[rung][0]])
+        history.append(list(survivors))
+    return history, per_rung[-1]
+
+
+@pytest.mark.parametrize("sort_by", ["sharpe_ratio", "total_return", "calmar_ratio"])
+@pytest.mark.parametrize("start_date", [None, "2019-06-01"])
+def test_survivors_match_exhaustive_sweep(prices, sort_by, start_date):
+    days, closes = prices
+    params = BacktestParams(start_date=start_date)
+    points = grid_points()
+    lo, hi = date_range(days, start_date, None)
+    n_bars = hi - lo
+    schedule = [(len(points), n_bars // 4), (12, n_bars // 2), (4, n_bars)]
+
+    rungs = []
+    evaluated = successive_halving(days, closes, points, params, sort_by, schedule,
+                                   lambda rung, done, count: rungs.append((rung, count)) if done == 0 else None)
+    engine = SweepEngine(days[lo:hi], closes[lo:hi])
+    history, final = _exhaustive(engine, points, params, sort_by, schedule)
+
+    assert [count for _, count in rungs] == [len(h) for h in history] == [len(points), 12, 4]
+    assert [p for p, _ in evaluated] == [points[i] for i in history[-1]]
+    assert [m for _, m in evaluated] == [final[i] for i in history[-1]]
+    # 最後一輪為完整區間，與網格掃描相同
+    assert [m for _, m in evaluated] == SweepEngine(days, closes).run([p for p, _ in evaluated], params)
+
+
+def test_single_rung_equals_grid_sweep(prices):
+    days, closes = prices
+    params = BacktestParams()
+    points = grid_points()
+    evaluated = successive_halving(days, closes, points, params, "sharpe_ratio", [(len(points), len(days))])
+    assert [p for p, _ in evaluated] == points
+    assert [m for _, m in evaluated] == SweepEngine(days, closes).run(points, params)
+
+
+def test_sample_points_unique_and_within_bounds():
+    rng = np.random.default_rng(3)
+    points = sample_points(200, ["single_ma", "dual_ma"], ["long_only", "long_short"], [1.0, 2.0],
+                           {"ma_fast": (3, 50), "ma_slow": (20, 200)}, {}, rng)
+    assert len(points) == len(set(points)) == 200
+    for p in points:
+        assert 3 <= p.ma_fast <= 50 and p.leverage in (1.0, 2.0)
+        if p.strategy_mode == "dual_ma":
+            assert 20 <= p.ma_slow <= 200 and p.ma_fast < p.ma_slow
+    # 參數空間小於取樣數時提早停止，不重複
+    small = sample_points(50, ["single_ma"], ["long_only"], [1.0], {"ma_fast": (5, 9)}, {}, rng)
+    assert sorted(p.ma_fast for p in small) == [5, 6, 7, 8, 9]
+
+
+def test_halving_plan_costs_follow_schedule(prices):
+    days, closes = prices
+    series = PriceSeries("halving.xlsx", "date", "close", days, closes, np.arange(len(days)))
+    request = OptimizeRequest(file_id="halving.xlsx", search="halving", budget=60, top_n=5, start_date="2019-03-01")
+    schedule, costs = halving_plan(request, series)
+    lo, hi = date_range(days, "2019-03-01", None)
+    assert schedule == rung_schedule(hi - lo, 60, 5)
+    assert costs == [c * b / (hi - lo) for c, b in schedule]
+    assert progress_total(costs) == round(sum(costs))
+    with pytest.raises(ValueError):
+        halving_plan(request.model_copy(update={"budget": 0}), series)
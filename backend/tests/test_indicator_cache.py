@@ -0,0 +1,134 @@
+# 均線快取：完整歷史與延伸後的均線須與 pandas 重新計算逐位元相同；追加資料後只延伸新增的部分
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.core import indicator_cache as indicator_module
+from app.core.backtest_engine import BacktestEngine, BacktestParams, date_strings
+from app.core.indicator_cache import IndicatorCache, compute_rolling_mean, indicator_cache, rolling_mean
+from app.core.price_repository import price_repository
+from app.main import app
+
+WINDOWS = [1, 2, 5, 20, 60]
+
+KERNELS = [
+    pytest.param(True, id="numba", marks=pytest.mark.skipif(not indicator_module.NUMBA_AVAILABLE,
+                                                          reason="numba 未安裝")),
+    pytest.param(False, id="python"),
+]
+
+
+def _values(kind: str, n: int = 500) -> np.ndarray:
+    rng = np.random.default_rng(5)
+    values = 100 * np.exp(np.cumsum(rng.normal(0, 0.05, n)))
+    if kind == "repeats":
+        values = np.round(values, 1)
+        values[rng.random(n) < 0.3] = values[0]
+    elif kind == "nan":
+        values = rng.normal(0, 1, n)
+        values[rng.random(n) < 0.1] = np.nan
+    elif kind == "flat":
+        values = np.repeat(rng.normal(0, 1, n // 10), 10)
+    elif kind == "negative":
+        values = -values
+    return values
+
+
+@pytest.fixture(params=KERNELS)
+def kernel(request, monkeypatch):
+    monkeypatch.setattr(indicator_module, "NUMBA_AVAILABLE", request.param)
+
+
+@pytest.fixture
+def price_file(data_dir, price_frame):
+    """前 800 筆寫成 Excel，其餘留給追加"""
+    file_id = "indicator-cache.xlsx"
+    price_frame.iloc[:800].to_excel(os.path.join(data_dir, file_id), index=False)
+    yield file_id
+    TestClient(app).delete(f"/api/files/{file_id}")
+
+
+@pytest.mark.parametrize("kind", ["gbm", "repeats", "nan", "flat", "negative"])
+def test_kernel_matches_pandas(kernel, kind):
+    values = _values(kind)
+    for window in WINDOWS:
+        expected = rolling_mean(values, window)
+        assert np.array_equal(compute_rolling_mean(values, window)[0], expected, equal_nan=True)
+        # 在任意位置接續計算（追加）與一次算完相同
+        for split in (0, 1, window, 137, len(values) - 1, len(values)):
+            ma, state, _, _ = compute_rolling_mean(values[:split], window)
+            extended = compute_rolling_mean(values, window, ma, state, split)[0]
+            assert np.array_equal(extended, expected, equal_nan=True), (window, split)
+
+
+def test_append_extends_and_matches_full_recompute(kernel, price_file, price_frame):
+    client = TestClient(app)
+    cache = IndicatorCache()
+    series = price_repository.get(price_file)
+    for window in WINDOWS:
+        cache.rolling_mean(series, window)
+        assert cache.rolling_mean(series, window) is cache.rolling_mean(series, window)
+
+    tail = price_frame.iloc[800:]
+    days = np.asarray(tail["date"]).astype("datetime64[D]").astype(np.int64)
+    for start in range(0, len(tail), 40):
+        rows = [{"date": d, "close": float(c)} for d, c in
+                zip(date_strings(days[start:start + 40]), tail["close"].iloc[start:start + 40])]
+        assert client.post(f"/api/files/{price_file}/append", json={"rows": rows}).status_code == 200
+        series = price_repository.get(price_file)
+        closes = np.asarray(series.closes)
+        for window in WINDOWS:
+            assert np.array_equal(cache.rolling_mean(series, window), rolling_mean(closes, window), equal_nan=True)
+
+    assert len(series) == len(price_frame)
+    stats = cache.stats()
+    assert stats["misses"] == len(WINDOWS)
+    assert stats["extensions"] == len(WINDOWS) * len(range(0, len(tail), 40))
+
+
+def test_tail_rewrite_resumes_from_checkpoint(kernel, price_file):
+    client = TestClient(app)
+    cache = IndicatorCache()
+    series = price_repository.get(price_file)
+    for window in WINDOWS:
+        cache.rolling_mean(series, window)
+
+    # 覆寫最後一筆（例如更新當日收盤價）：從 checkpoint 重播，仍與重新計算相同
+    last = client.get(f"/api/files/{price_file}/data?limit=1").json()["rows"][0]
+    response = client.put(f"/api/files/{price_file}/update",
+                          json={"rows": [{**last, "close": last["close"] * 1.01}]})
+    assert response.status_code == 200
+    series = price_repository.get(price_file)
+    for window in WINDOWS:
+        assert np.array_equal(cache.rolling_mean(series, window), rolling_mean(np.asarray(series.closes), window),
+                              equal_nan=True)
+    assert cache.stats()["extensions"] == len(WINDOWS)
+
+
+@pytest.mark.parametrize("start", [0, 1, 37, 400])
+def test_range_slices_full_history(price_file, start):
+    series = price_repository.get(price_file)
+    cache = IndicatorCache()
+    closes = np.asarray(series.closes)
+    for window in WINDOWS:
+        full = cache.rolling_mean(series, window)
+        ranged = cache.rolling_mean(series, window, start)
+        expected = pd.Series(closes[start:]).rolling(window).mean().to_numpy()
+        # 暖機期相同；之後的值取自完整歷史，與只對區間做 rolling 只差在最後幾位
+        assert np.array_equal(np.isnan(ranged), np.isnan(expected))
+        assert np.allclose(ranged, expected, rtol=1e-12, atol=0, equal_nan=True)
+        assert np.array_equal(ranged[window - 1:], full[start + window - 1:])
+    # 每個視窗只有一筆完整歷史的快取
+    assert cache.stats()["entries"] == len(WINDOWS)
+
+
+@pytest.mark.parametrize("start_date", [None, "2019-03-15", "2020-06-01"])
+def test_engine_with_cache_matches_engine_without(price_file, start_date):
+    series = price_repository.get(price_file)
+    params = BacktestParams(strategy_mode="dual_ma", ma_fast=7, ma_slow=45, leverage=3.0, start_date=start_date)
+    plain = BacktestEngine(series.days, series.closes).run(params).to_result().model_dump()
+    cached = BacktestEngine.from_series(series, ma_source=lambda window, lo: indicator_cache.rolling_mean(series, window, lo))
+    assert cached.run(params).to_result().model_dump() == plain
@@ -0,0 +1,19 @@
+# 效能量測：每個回應帶 Server-Timing；?profile=1 只在 ENABLE_PROFILING=1 時生效
+from fastapi.testclient import TestClient
+
+from app.core import instrumentation
+from app.main import app
+
+
+def test_profile_is_opt_in(monkeypatch):
+    client = TestClient(app)
+    assert instrumentation.PROFILING_ENABLED is False
+
+    response = client.get("/health?profile=1")
+    assert response.json() == {"status": "healthy"}
+    assert "total;dur=" in response.headers["server-timing"]
+
+    monkeypatch.setattr(instrumentation, "PROFILING_ENABLED", True)
+    summary = client.get("/health?profile=1").json()
+    assert summary["path"] == "/health" and summary["status"] == 200
+    assert "functions" in summary["profile"]
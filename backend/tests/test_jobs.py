@@ -0,0 +1,89 @@
+# 背景工作：未完成的工作已滿時拒絕新工作（429）；逐次減半在每個區塊之間檢查取消，分塊不影響結果
+import os
+import threading
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import optimize
+from app.core import halving, jobs
+from app.core.jobs import Job, JobCancelled, JobManager, JobStoreFull
+from app.core.price_repository import price_repository
+from app.core.result_cache import SweepCache
+from app.main import app
+
+
+@pytest.fixture
+def price_file(data_dir, price_frame):
+    file_id = "jobs.xlsx"
+    price_frame.to_excel(os.path.join(data_dir, file_id), index=False)
+    yield file_id
+    TestClient(app).delete(f"/api/files/{file_id}")
+
+
+def test_full_store_rejects_new_jobs(monkeypatch, price_file):
+    monkeypatch.setattr(jobs, "MAX_JOBS", 3)
+    manager = JobManager(workers=1)
+    release = threading.Event()
+    try:
+        running = [manager.submit("test", lambda job: release.wait(10)) for _ in range(3)]
+        with pytest.raises(JobStoreFull):
+            manager.submit("test", lambda job: None)
+
+        monkeypatch.setattr(optimize, "job_manager", manager)
+        response = TestClient(app).post("/api/optimize/jobs", json={"file_id": price_file})
+        assert response.status_code == 429
+    finally:
+        release.set()
+    for job in running:
+        while not job.finished:
+            release.wait(0.01)
+    # 完成的工作可被淘汰，之後即可再提交
+    assert manager.submit("test", lambda job: None).id
+
+
+def _halving_request(file_id: str) -> optimize.OptimizeRequest:
+    return optimize.OptimizeRequest(file_id=file_id, search="halving", budget=60, top_n=3, seed=7,
+                                    ma_fast_range=[3, 80], ma_slow_range=[20, 200])
+
+
+def test_halving_chunks_match_single_pass(monkeypatch, price_file):
+    monkeypatch.setattr(optimize, "sweep_cache", SweepCache())
+    series = price_repository.get(price_file)
+    request = _halving_request(price_file)
+    whole = [r.model_dump() for r in optimize.execute_optimization(request, series)]
+
+    monkeypatch.setattr(halving, "RUNG_CHUNK_SIZE", 7)
+    calls = []
+    chunked = optimize.execute_optimization(request, series, lambda done, total, board: calls.append(done))
+    assert [r.model_dump() for r in chunked] == whole
+    # 第一輪的每個區塊都回報一次，進度遞增到總數
+    first_rung = optimize.halving_plan(request, series)[0][0][0]
+    assert len(calls) > -(-first_rung // 7)
+    assert calls == sorted(calls) and calls[-1] == optimize.progress_total(optimize.halving_plan(request, series)[1])
+
+
+def test_halving_cancels_within_rung(monkeypatch, price_file):
+    monkeypatch.setattr(optimize, "sweep_cache", SweepCache())
+    monkeypatch.setattr(halving, "RUNG_CHUNK_SIZE", 5)
+    series = price_repository.get(price_file)
+    request = _halving_request(price_file)
+    job = Job(id="cancel", kind="optimize")
+    evaluated = []
+    evaluate = halving.SweepEngine.evaluate
+
+    def counting_evaluate(self, closes, days, points, *args, **kwargs):
+        evaluated.append(len(points))
+        return evaluate(self, closes, days, points, *args, **kwargs)
+
+    monkeypatch.setattr(halving.SweepEngine, "evaluate", counting_evaluate)
+
+    def on_progress(done, total, board):
+        if len(evaluated) == 2:
+            job.cancel_event.set()
+        job.update(done=done, total=total)
+
+    with pytest.raises(JobCancelled):
+        optimize.execute_optimization(request, series, on_progress)
+    # 第一輪只評估了兩個區塊就停止
+    assert evaluated == [5, 5]
@@ -0,0 +1,42 @@
+# 績效指標：沿 axis 1 批次計算的年化報酬與索提諾比率，與逐列以 pandas / 純量計算的結果相同（容許浮點誤差）
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import metrics
+
+
+def _reference_sortino(row: np.ndarray) -> float:
+    """與原始引擎相同：去除 NaN 後以 pandas 計算，無下檔或下檔標準差為 0 時為 0"""
+    excess = pd.Series(row).dropna() - metrics.RISK_FREE / metrics.TRADING_DAYS
+    downside = excess[excess < 0]
+    if downside.empty or downside.std() == 0:
+        return 0.0
+    return excess.mean() * metrics.TRADING_DAYS / (downside.std() * np.sqrt(metrics.TRADING_DAYS))
+
+
+def test_sortino_matches_per_row_reference():
+    rng = np.random.default_rng(1)
+    returns = rng.normal(0.001, 0.02, (60, 300))
+    returns[rng.random(returns.shape) < 0.1] = np.nan
+    returns[0] = np.nan                        # 全部 NaN
+    returns[1] = 0.01                          # 沒有下檔
+    returns[2] = 0.01
+    returns[2, 5] = -0.5                       # 只有 1 個下檔樣本：NaN
+    returns[3, :] = np.nan
+    returns[3, [3, 7]] = -0.1                  # 下檔標準差為 0
+    returns[4, :150] = np.nan                  # 前半段 NaN（例如暖機期）
+    expected = np.array([_reference_sortino(row) for row in returns])
+    assert np.allclose(metrics.sortino_ratio(returns), expected, rtol=1e-12, atol=0, equal_nan=True)
+    assert np.isnan(expected[2]) and expected[[0, 1, 3]].tolist() == [0, 0, 0]
+    # 1-D 輸入視為單列
+    assert np.allclose(metrics.sortino_ratio(returns[5]), expected[5:6], rtol=1e-12)
+
+
+@pytest.mark.parametrize("span_days", [17, 365, 900, 3650])
+def test_cagr_matches_scalar_power(span_days):
+    total_returns = np.r_[np.random.default_rng(span_days).normal(30, 80, 1000), 0.0, -100.0]
+    total_returns = total_returns[total_returns >= -100]
+    expected = [((1 + r / 100) ** (365 / span_days) - 1) * 100 for r in total_returns.tolist()]
+    assert np.allclose(metrics.cagr(total_returns, span_days), expected, rtol=1e-13, atol=1e-12)
+    assert metrics.cagr(total_returns, 0).tolist() == [0.0] * len(total_returns)
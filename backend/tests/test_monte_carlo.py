@@ -0,0 +1,124 @@
+# 蒙地卡羅：相同 seed 在本進程與進程池的結果相同；交易洗牌不改變總報酬；區塊重抽樣與逐區塊參考實作相同
+import math
+
+import numpy as np
+import pytest
+
+from app.core import parallel
+from app.core.backtest_engine import BacktestEngine, BacktestParams
+from app.core.monte_carlo import (
+    MC_CHUNK_PATHS, MonteCarloParams, _simulate_chunk, bootstrap_paths, run_monte_carlo, shuffle_paths,
+)
+from app.core.simulation import KIND_REBALANCE
+
+
+@pytest.fixture(scope="module")
+def backtest(prices):
+    days, closes = prices
+    params = BacktestParams(strategy_mode="single_ma", ma_fast=10, trade_direction="long_short", leverage=1.0)
+    return BacktestEngine(days, closes).run(params), params
+
+
+@pytest.fixture
+def pool():
+    yield
+    parallel.shutdown_pool()
+
+
+def _trade_returns(run) -> np.ndarray:
+    trades = run.trades[(run.trades["kind"] != KIND_REBALANCE) & (run.trades["base"] > 0)]
+    return trades["pnl"] / trades["base"]
+
+
+@pytest.mark.parametrize("method", ["block_bootstrap", "trade_shuffle"])
+def test_same_seed_inline_and_pool(backtest, pool, method):
+    run, params = backtest
+    mc = MonteCarloParams(method=method, n_paths=2 * MC_CHUNK_PATHS + 500, block_size=15, seed=42)
+    inline = run_monte_carlo(run, mc, params.initial_cash, workers=1)
+    assert run_monte_carlo(run, mc, params.initial_cash, workers=2) == inline
+    assert run_monte_carlo(run, mc, params.initial_cash, workers=1) == inline
+    assert inline["seed"] == 42 and inline["n_paths"] == mc.n_paths
+    # 不同 seed 得到不同的分布
+    other = run_monte_carlo(run, mc.model_copy(update={"seed": 43}), params.initial_cash, workers=1)
+    assert other["metrics"]["mdd"] != inline["metrics"]["mdd"]
+
+
+def test_chunks_use_spawned_streams(backtest):
+    """區塊 i 以 SeedSequence(seed).spawn 的第 i 個串流產生，與區塊在哪裡執行無關"""
+    run, params = backtest
+    returns = _trade_returns(run)
+    grid = np.arange(len(returns) + 1)
+    span = int(run.days[-1] - run.days[0])
+    streams = np.random.SeedSequence(7).spawn(3)
+    chunks = [_simulate_chunk("trade_shuffle", returns, size, 1, stream, params.initial_cash, span, grid)
+              for size, stream in zip((MC_CHUNK_PATHS, MC_CHUNK_PATHS, 1), streams)]
+    expected = np.concatenate([c["equity"] for c in chunks])
+    mc = MonteCarloParams(method="trade_shuffle", n_paths=2 * MC_CHUNK_PATHS + 1, seed=7)
+    result = run_monte_carlo(run, mc, params.initial_cash, workers=1)
+    median = np.percentile(expected, 50, axis=0)
+    assert [band["p50"] for band in result["equity_bands"]] == np.round(median, 2).tolist()
+
+
+def test_shuffle_preserves_total_return(backtest):
+    run, params = backtest
+    returns = _trade_returns(run)
+    assert len(returns) > 10
+    paths = shuffle_paths(returns, 200, np.random.default_rng(1))
+    # 每條路徑都是交易報酬的一個排列，期末報酬相同（只差浮點相乘順序）
+    assert np.array_equal(np.sort(paths, axis=1), np.broadcast_to(np.sort(returns), paths.shape))
+    assert len({tuple(p) for p in paths}) > 1
+    expected = (np.prod(1 + returns) - 1) * 100
+    assert np.allclose((np.prod(1 + paths, axis=1) - 1) * 100, expected, rtol=1e-12)
+
+    result = run_monte_carlo(run, MonteCarloParams(method="trade_shuffle", n_paths=500, seed=1),
+                             params.initial_cash, workers=1)
+    total = result["metrics"]["total_return"]
+    for key in ("mean", "p5", "p50", "p95"):
+        assert total[key] == pytest.approx(expected, abs=0.011)
+    assert result["prob_loss"] in (0, 100)
+    assert "sharpe_ratio" not in result["metrics"]
+    assert [band["trade"] for band in result["equity_bands"]] == list(range(len(returns) + 1))
+
+
+def _reference_bootstrap(returns, n_paths, block_size, rng):
+    """逐區塊以 Python 接出路徑：每個區塊從隨機起點循環取 block_size 筆，接滿後截到原長度"""
+    n = len(returns)
+    block_size = max(1, min(block_size, n))
+    starts = rng.integers(0, n, size=(n_paths, math.ceil(n / block_size)))
+    paths = []
+    for row in starts:
+        path = []
+        for s in row:
+            path += [returns[(s + j) % n] for j in range(block_size)]
+        paths.append(path[:n])
+    return np.array(paths)
+
+
+@pytest.mark.parametrize("n, block_size", [(100, 20), (101, 20), (50, 1), (30, 500), (7, 3)])
+def test_block_bootstrap_matches_reference(n, block_size):
+    returns = np.random.default_rng(n).normal(0, 0.01, n)
+    paths = bootstrap_paths(returns, 64, block_size, np.random.default_rng(5))
+    assert paths.shape == (64, n)
+    assert np.array_equal(paths, _reference_bootstrap(returns, 64, block_size, np.random.default_rng(5)))
+
+
+def test_block_bootstrap_run(backtest):
+    run, params = backtest
+    result = run_monte_carlo(run, MonteCarloParams(n_paths=300, block_size=20, seed=9), params.initial_cash,
+                             workers=1)
+    bands = result["equity_bands"]
+    assert bands[0]["date"] == str(np.datetime64(int(run.days[0]), "D"))
+    assert bands[-1]["date"] == str(np.datetime64(int(run.days[-1]), "D"))
+    assert all(b["p5"] <= b["p25"] <= b["p50"] <= b["p75"] <= b["p95"] for b in bands)
+    assert bands[0]["p5"] == bands[0]["p95"] == params.initial_cash
+    for name in ("total_return", "cagr", "mdd", "calmar_ratio", "sharpe_ratio"):
+        summary = result["metrics"][name]
+        assert summary["p5"] <= summary["p50"] <= summary["p95"]
+    assert 0 <= result["prob_loss"] <= 100
+
+
+@pytest.mark.parametrize("update", [{"n_paths": 0}, {"block_size": 0}, {"method": "nope"}])
+def test_invalid_params_rejected(backtest, update):
+    run, params = backtest
+    with pytest.raises(ValueError):
+        run_monte_carlo(run, MonteCarloParams(seed=1).model_copy(update=update), params.initial_cash, workers=1)
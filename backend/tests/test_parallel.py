@@ -0,0 +1,72 @@
+# 進程池掃描：結果與本進程執行相同；worker 每個區塊結束即關閉 shared memory
+from multiprocessing import shared_memory
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+
+from app.core import parallel
+from app.core.backtest_engine import BacktestParams
+from app.core.sweep import SweepEngine, SweepPoint
+from tests.test_sweep import grid_points
+
+
+@pytest.fixture
+def pool():
+    yield
+    parallel.shutdown_pool()
+
+
+def test_pool_matches_inline(monkeypatch, prices, pool):
+    days, closes = prices
+    monkeypatch.setattr(parallel, "PARALLEL_MIN_POINTS", 1)
+    params = BacktestParams(enable_yield=True)
+    points = grid_points()
+    expected = SweepEngine(days, closes).run(points, params)
+    assert parallel.run_sweep(days, closes, points, params, workers=2) == expected
+
+    # 指定 on_chunk 時結果只逐區塊交出，不另外收集
+    chunks, streamed = [], [None] * len(points)
+
+    def on_chunk(indices, metrics):
+        chunks.append(len(indices))
+        for i, m in zip(indices, metrics):
+            streamed[i] = m
+    assert parallel.run_sweep(days, closes, points, params, workers=2, on_chunk=on_chunk) is None
+    assert streamed == expected
+    assert sum(chunks) == len(points) and len(chunks) > 1
+
+
+def _shared_prices(days, closes) -> shared_memory.SharedMemory:
+    n = len(days)
+    shm = shared_memory.SharedMemory(create=True, size=n * 16)
+    np.ndarray((n,), dtype=np.int64, buffer=shm.buf, offset=0)[:] = days
+    np.ndarray((n,), dtype=np.float64, buffer=shm.buf, offset=n * 8)[:] = closes
+    return shm
+
+
+@pytest.mark.parametrize("points", [
+    pytest.param([SweepPoint("single_ma", "long_only", 10, None, 1.0)], id="ok"),
+    pytest.param([SweepPoint("single_ma", "long_only", 10, None, 1.0)] * 2, id="error"),
+])
+def test_run_chunk_detaches_segment(monkeypatch, prices, points, request):
+    days, closes = prices
+    shm = _shared_prices(days, closes)
+    attached = []
+    monkeypatch.setattr(parallel, "_attach", lambda name: attached.append(shared_memory.SharedMemory(name=name))
+                        or attached[-1])
+    payload = BacktestParams().model_dump()
+    try:
+        if request.node.callspec.id == "error":
+            # 區段上的陣列建立後才拋出：原本的例外照常傳出，traceback 中不再引用已關閉區段上的陣列
+            payload["leverage"] = "x"
+            with pytest.raises(ValidationError) as excinfo:
+                parallel._run_chunk(shm.name, len(days), points, payload)
+            frames = [entry.frame for entry in excinfo.traceback if entry.name == "_sweep_shared"]
+            assert frames and not any(isinstance(v, np.ndarray) for f in frames for v in f.f_locals.values())
+        else:
+            assert parallel._run_chunk(shm.name, len(days), points, payload)[0] is not None
+        assert attached[0].buf is None
+    finally:
+        shm.close()
+        shm.unlink()
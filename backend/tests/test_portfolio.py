@@ -0,0 +1,157 @@
+# 多資產組合：部分重疊的日曆以前值對齊、上市日不同的資產在上市前不配置，再平衡結果與逐日參考模擬相同
+import datetime
+
+import numpy as np
+import pytest
+
+from app.core.portfolio import PortfolioAsset, PortfolioEngine, PortfolioParams, align_series
+from app.core.price_store import PriceSeries
+from app.core.signals import position_state
+from app.core.strategy_registry import Indicators, get_strategy
+
+START = np.datetime64("2020-01-01", "D").astype(np.int64)
+
+
+def _series(file_id: str, days: np.ndarray, seed: int) -> PriceSeries:
+    rng = np.random.default_rng(seed)
+    closes = 100 * np.exp(np.cumsum(rng.normal(0.0005, 0.02, len(days))))
+    return PriceSeries(file_id, "date", "close", np.asarray(days, dtype=np.int64), closes, np.arange(len(days)))
+
+
+def _weekdays(start: int, n_days: int) -> np.ndarray:
+    days = np.arange(start, start + n_days)
+    return days[(days + 3) % 7 < 5]
+
+
+@pytest.fixture
+def assets():
+    """股票（只有平日）、加密貨幣（每天，晚 120 天上市）、第三個資產再晚 300 天上市且中間缺一段資料"""
+    stock = _series("stock.xlsx", _weekdays(START, 700), seed=1)
+    crypto = _series("crypto.xlsx", np.arange(START + 120, START + 700), seed=2)
+    late_days = np.arange(START + 300, START + 700, 2)
+    late = _series("late.xlsx", late_days[(late_days < START + 450) | (late_days > START + 480)], seed=3)
+    return [stock, crypto, late]
+
+
+def _reference_align(series_list):
+    days = sorted(set().union(*[s.days.tolist() for s in series_list]))
+    closes = []
+    for s in series_list:
+        lookup = dict(zip(s.days.tolist(), s.closes.tolist()))
+        row, last = [], np.nan
+        for day in days:
+            last = lookup.get(day, last)
+            row.append(last)
+        closes.append(row)
+    return np.array(days), np.array(closes)
+
+
+def _month_starts(days) -> np.ndarray:
+    months = [datetime.date(1970, 1, 1) + datetime.timedelta(days=int(d)) for d in days]
+    return np.array([i > 0 and (m.year, m.month) != (months[i - 1].year, months[i - 1].month)
+                     for i, m in enumerate(months)])
+
+
+def _reference_run(prices, targets, rebalance, initial_cash, leverage, cost_rate):
+    """逐日模擬：目標曝險改變或再平衡日以當日權益重新配置"""
+    k, n = prices.shape
+    cash, units = initial_cash, [0.0] * k
+    equity, count, fees = [], 0, 0.0
+    for t in range(n):
+        px = [0.0 if np.isnan(p) else p for p in prices[:, t]]
+        if t == 0 or rebalance[t] or any(targets[:, t] != targets[:, t - 1]):
+            value = cash + sum(u * p for u, p in zip(units, px))
+            if value > 0:
+                new_units = [value * leverage * targets[a, t] / px[a] if px[a] > 0 else 0.0 for a in range(k)]
+                traded = [(nu - u) * p for nu, u, p in zip(new_units, units, px)]
+                if any(tr != 0 for tr in traded):
+                    cost = sum(abs(tr) for tr in traded) * cost_rate
+                    cash -= sum(traded) + cost
+                    units = new_units
+                    count += 1
+                    fees += cost
+        equity.append(cash + sum(u * p for u, p in zip(units, px)))
+    return np.array(equity), count, fees
+
+
+def test_align_partly_overlapping_calendars(assets):
+    days, closes, positions = align_series(assets)
+    ref_days, ref_closes = _reference_align(assets)
+    assert np.array_equal(days, ref_days)
+    assert np.array_equal(closes, ref_closes, equal_nan=True)
+    # 上市前位置為 -1；週末沿用股票週五的收盤價
+    for row, series in enumerate(assets):
+        listed = days >= series.days[0]
+        assert np.all(positions[row, ~listed] == -1) and np.all(positions[row, listed] >= 0)
+        assert np.array_equal(series.days[positions[row, listed]], [series.days[series.days <= d][-1] for d in days[listed]])
+    saturday = np.flatnonzero((days + 3) % 7 == 5)[0]
+    assert closes[0, saturday] == closes[0, saturday - 1]
+
+
+@pytest.mark.parametrize("frequency", ["monthly", "quarterly"])
+@pytest.mark.parametrize("enable_rebalance", [True, False])
+def test_buy_and_hold_matches_daily_reference(assets, frequency, enable_rebalance):
+    params = PortfolioParams(
+        assets=[PortfolioAsset(file_id=s.file_id, weight=w) for s, w in zip(assets, (2.0, 1.0, 1.0))],
+        leverage=1.5, enable_rebalance=enable_rebalance, rebalance_frequency=frequency,
+    )
+    run = PortfolioEngine(assets).run(params)
+
+    days, prices = _reference_align(assets)
+    weights = np.array([0.5, 0.25, 0.25])
+    targets = weights[:, None] * ~np.isnan(prices)
+    if not enable_rebalance:
+        rebalance = np.zeros(len(days), dtype=bool)
+    elif frequency == "monthly":
+        rebalance = _month_starts(days)
+    else:
+        months = _month_starts(days)
+        quarter = [(datetime.date(1970, 1, 1) + datetime.timedelta(days=int(d))).month in (1, 4, 7, 10) for d in days]
+        rebalance = months & np.array(quarter)
+    equity, count, fees = _reference_run(prices, targets, rebalance, params.initial_cash, params.leverage,
+                                         params.fee_rate + params.slippage)
+
+    assert np.array_equal(run.days, days)
+    assert np.allclose(run.equity, np.round(equity, 2), rtol=0, atol=0.011)
+    assert run.rebalance_count == count
+    assert run.total_fees == pytest.approx(fees, rel=1e-9)
+    # 上市日不同：資產首次配置在各自的上市日，之前的目標曝險為 0
+    for row, series in enumerate(assets):
+        first = int(np.searchsorted(days, series.days[0]))
+        assert np.all(run.targets[row, :first] == 0) and run.targets[row, first] == weights[row]
+        assert run.assets[row]["first_date"] == str(np.datetime64(int(series.days[0]), "D"))
+    changed = [w["date"] for w in run.to_result().weights]
+    assert changed == [str(np.datetime64(int(d), "D")) for d in (days[0], assets[1].days[0], assets[2].days[0])]
+    # 不再平衡時只在目標改變的三天交易
+    if not enable_rebalance:
+        assert run.rebalance_count == 3
+
+
+def test_start_date_before_listing(assets):
+    start = str(np.datetime64(int(START + 200), "D"))
+    params = PortfolioParams(assets=[PortfolioAsset(file_id=s.file_id) for s in assets], start_date=start,
+                             enable_rebalance=False)
+    run = PortfolioEngine(assets).run(params)
+    assert run.days[0] == START + 200
+    # late 在區間開始後才上市：資產列表的首日為上市日，報酬只計上市之後
+    late = run.assets[2]
+    assert late["first_date"] == str(np.datetime64(int(assets[2].days[0]), "D"))
+    expected = (assets[2].closes[-1] / assets[2].closes[0] - 1) * 100
+    assert late["price_return"] == round(expected, 2)
+
+
+def test_signals_use_each_assets_own_calendar(assets):
+    """均線信號以資產自己的 bar 計算，非交易日沿用前一個 bar 的持倉"""
+    asset = PortfolioAsset(file_id="stock.xlsx", strategy_mode="single_ma", ma_fast=10)
+    params = PortfolioParams(assets=[asset, PortfolioAsset(file_id="crypto.xlsx", weight=0.0001)],
+                             enable_rebalance=False)
+    run = PortfolioEngine(assets[:2]).run(params)
+
+    stock = assets[0]
+    strategy = get_strategy("single_ma")
+    values = strategy.resolve(10, 60, {})
+    buy, sell = strategy.signals(stock.closes, [values], Indicators(stock.closes))
+    state = position_state(buy, sell)[0]
+    days, _, positions = align_series(assets[:2])
+    weight = 1 / 1.0001
+    assert np.array_equal(run.targets[0], weight * state[positions[0]])
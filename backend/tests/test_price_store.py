@@ -0,0 +1,136 @@
+# 價格儲存層：WAL 重新載入後重播、達門檻時壓實、並行寫入不遺失、匯出與原內容相同
+import multiprocessing as mp
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.core import price_store
+from app.core.price_store import (
+    PriceChanges, compact_price_series, drop_price_series, export_price_frame, load_price_series,
+    update_price_series,
+)
+
+
+@pytest.fixture
+def store_file(data_dir, price_frame):
+    """前 200 筆寫成 Excel（另加一個非價格欄位，確認匯出時保留）"""
+    file_id = "price-store.xlsx"
+    frame = price_frame.iloc[:200].assign(volume=np.arange(200))
+    frame.to_excel(os.path.join(data_dir, file_id), index=False)
+    yield file_id
+    drop_price_series(file_id)
+    os.remove(os.path.join(data_dir, file_id))
+
+
+def _snapshot(series):
+    return np.asarray(series.days).copy(), np.asarray(series.closes).copy(), np.asarray(series.rows).copy()
+
+
+def _assert_same(a, b):
+    for x, y in zip(_snapshot(a), _snapshot(b)):
+        assert np.array_equal(x, y)
+
+
+def _edit(series, changes: PriceChanges):
+    """新增兩列、覆寫第 10 列、刪除第 20 列"""
+    last = int(series.days[-1])
+    changes.append(last + 1, 1.5)
+    changes.append(last + 3, 2.5)
+    changes.upsert(int(series.rows[10]), int(series.days[10]), 99.0)
+    changes.delete(int(series.rows[20]))
+
+
+def test_wal_replays_after_reload(store_file):
+    before = load_price_series(store_file)
+    edited = update_price_series(store_file, _edit)
+
+    reloaded = load_price_series(store_file)
+    _assert_same(reloaded, edited)
+    assert os.path.exists(price_store._wal_path(store_file))
+    assert reloaded.meta["total_rows"] == 201 and len(reloaded) == 201
+    assert reloaded.meta["content_sha1"] == edited.meta["content_sha1"] != before.meta["content_sha1"]
+    assert reloaded.meta["next_row_id"] == 202
+
+    closes = dict(zip(np.asarray(reloaded.rows).tolist(), np.asarray(reloaded.closes).tolist()))
+    assert closes[int(before.rows[10])] == 99.0
+    assert int(before.rows[20]) not in closes
+    assert closes[200] == 1.5 and closes[201] == 2.5
+
+
+def test_compacts_at_threshold(monkeypatch, store_file):
+    monkeypatch.setattr(price_store, "WAL_COMPACT_ROWS", 8)
+    token = load_price_series(store_file).meta["token"]
+
+    series = update_price_series(store_file, _edit)
+    assert series.meta["wal_rows"] == 4 and series.meta["token"] == token
+    series = update_price_series(store_file, _edit)
+    # 第二次編輯後 WAL 累積 8 筆，壓實為新快照並清除 WAL
+    assert series.meta["token"] != token and not series.meta["wal_rows"]
+    assert not os.path.exists(price_store._wal_path(store_file))
+
+    reloaded = load_price_series(store_file)
+    _assert_same(reloaded, series)
+    assert reloaded.meta["total_rows"] == 202
+    assert reloaded.meta["content_sha1"] == series.meta["content_sha1"]
+    assert compact_price_series(store_file).meta["token"] == reloaded.meta["token"]
+
+
+def _append_rows(file_id: str, worker: int, count: int) -> None:
+    for k in range(count):
+        update_price_series(file_id, lambda series, changes: changes.append(100_000 + worker * 1000 + k,
+                                                                             float(worker * 1000 + k)))
+
+
+def _assert_all_appended(file_id: str, workers: int, count: int):
+    series = load_price_series(file_id)
+    added = np.asarray(series.days) >= 100_000
+    assert int(np.count_nonzero(added)) == workers * count
+    assert sorted(np.asarray(series.closes)[added].tolist()) == [float(w * 1000 + k) for w in range(workers)
+                                                                  for k in range(count)]
+    assert len(set(np.asarray(series.rows).tolist())) == len(series) == series.meta["total_rows"]
+
+
+def test_concurrent_threads_do_not_lose_updates(monkeypatch, store_file):
+    monkeypatch.setattr(price_store, "WAL_COMPACT_ROWS", 25)
+    threads = [threading.Thread(target=_append_rows, args=(store_file, w, 20)) for w in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    _assert_all_appended(store_file, 4, 20)
+
+
+@pytest.mark.skipif(not price_store.FCNTL_AVAILABLE, reason="沒有 fcntl 時只保證單一進程內互斥")
+def test_concurrent_processes_do_not_lose_updates(store_file):
+    load_price_series(store_file)
+    ctx = mp.get_context("spawn")
+    procs = [ctx.Process(target=_append_rows, args=(store_file, w, 15)) for w in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(120)
+        assert p.exitcode == 0
+    _assert_all_appended(store_file, 3, 15)
+
+
+def test_export_round_trips(data_dir, store_file):
+    update_price_series(store_file, _edit)
+    series = load_price_series(store_file)
+    frame = export_price_frame(store_file)
+    assert list(frame.columns) == ["date", "close", "volume"]
+    assert frame["volume"].iloc[:10].tolist() == list(range(10))
+    assert frame["volume"].isna().sum() == 2
+
+    copy_id = "price-store-export.xlsx"
+    frame.to_excel(os.path.join(data_dir, copy_id), index=False)
+    try:
+        copy = load_price_series(copy_id)
+        assert np.array_equal(np.asarray(copy.days), np.asarray(series.days))
+        assert np.array_equal(np.asarray(copy.closes), np.asarray(series.closes))
+        assert pd.Series(np.asarray(copy.rows)).is_monotonic_increasing
+    finally:
+        drop_price_series(copy_id)
+        os.remove(os.path.join(data_dir, copy_id))
@@ -0,0 +1,120 @@
+# 串流排名：結果與「全部收集後過濾、穩定排序再取前 N 筆 / 暴力求非支配集合」相同，且與到達順序無關
+import math
+import os
+import random
+
+import pytest
+
+from app.api import optimize
+from app.core.price_repository import price_repository
+from app.core.ranking import BLOWUP_MDD, BLOWUP_RETURN, Leaderboard, ParetoFrontier, TopN
+from app.core.result_cache import SweepCache
+from app.core.sweep import SweepEngine
+
+
+def _results(seed: int, n: int = 400):
+    """整數化的報酬與 MDD，讓同分與完全相同的組合大量出現；含爆倉與 NaN"""
+    rng = random.Random(seed)
+    out = []
+    for seq in range(n):
+        mdd = float(rng.randint(0, 100))
+        metrics = {
+            "total_return": float(rng.randint(-100, 60)),
+            "mdd": mdd,
+            "sharpe_ratio": float("nan") if rng.random() < 0.05 else float(rng.randint(-5, 5)),
+            "calmar_ratio": float(rng.randint(0, 3)),
+        }
+        out.append((seq, metrics))
+    return out
+
+
+def _shuffled(results, seed):
+    results = list(results)
+    random.Random(seed).shuffle(results)
+    return results
+
+
+def _sort_key(value: float) -> float:
+    return -math.inf if math.isnan(value) else value
+
+
+def _brute_frontier(results):
+    front = {}
+    for seq, m in results:
+        ret, mdd = m["total_return"], m["mdd"]
+        dominated = any(o["total_return"] >= ret and o["mdd"] <= mdd and (o["total_return"] > ret or o["mdd"] < mdd)
+                        for _, o in results)
+        if not dominated and (ret, mdd) not in front:
+            front[(ret, mdd)] = seq
+    return [front[key] for key in sorted(front, reverse=True)]
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_pareto_frontier_matches_brute_force(seed):
+    results = _results(seed)
+    expected = _brute_frontier(results)
+    for order_seed in range(3):
+        frontier = ParetoFrontier()
+        for seq, m in _shuffled(results, order_seed):
+            frontier.push(seq, m, seq)
+        assert frontier.items() == expected
+        assert len(frontier) == len(expected)
+
+
+@pytest.mark.parametrize("metric", ["sharpe_ratio", "calmar_ratio", "total_return"])
+@pytest.mark.parametrize("n", [0, 1, 7, 1000])
+def test_top_n_matches_stable_sort(metric, n):
+    results = _results(11)
+    expected = [seq for seq, m in sorted(results, key=lambda r: _sort_key(r[1][metric]), reverse=True)[:n]]
+    for order_seed in range(3):
+        top = TopN(metric, n)
+        for seq, m in _shuffled(results, order_seed):
+            top.push(seq, m, seq)
+        assert top.items() == expected
+
+
+def test_leaderboard_filters_blowups_before_ranking():
+    results = _results(7) + [(400, None)]
+    board = Leaderboard(["calmar_ratio", "sharpe_ratio"], top_n=10, pareto=True)
+    for seq, m in _shuffled(results, 0):
+        board.add(seq, m, seq)
+
+    viable = [(seq, m) for seq, m in results
+              if m is not None and m["mdd"] < BLOWUP_MDD and m["total_return"] > BLOWUP_RETURN]
+    assert board.evaluated == len(results) and board.viable == len(viable) < len(results) - 1
+    for metric in ("calmar_ratio", "sharpe_ratio"):
+        expected = sorted(viable, key=lambda r: _sort_key(r[1][metric]), reverse=True)[:10]
+        assert board.ranking(metric) == [seq for seq, _ in expected]
+    assert board.pareto() == _brute_frontier(viable)
+
+
+def test_leaderboard_rejects_unknown_metric():
+    with pytest.raises(ValueError):
+        Leaderboard(["nope"], top_n=5, fields=["sharpe_ratio"])
+
+
+@pytest.mark.parametrize("sort_by", ["sharpe_ratio", "pareto"])
+def test_optimization_streams_into_leaderboard(monkeypatch, data_dir, price_frame, sort_by):
+    """有無進度回報、快取冷熱時結果相同，且等於收集全部結果後排序"""
+    file_id = "ranking.xlsx"
+    price_frame.to_excel(os.path.join(data_dir, file_id), index=False)
+    monkeypatch.setattr(optimize, "sweep_cache", SweepCache())
+    series = price_repository.get(file_id)
+    request = optimize.OptimizeRequest(file_id=file_id, sort_by=sort_by, top_n=5, ma_fast_range=[5, 10, 20])
+
+    points = optimize.build_grid(request)
+    metrics = SweepEngine(series.days, series.closes).run(points, optimize.make_base_params(request))
+    board = Leaderboard([], top_n=0, pareto=True) if sort_by == "pareto" else Leaderboard([sort_by], top_n=5)
+    for seq, (point, m) in enumerate(zip(points, metrics)):
+        board.add(seq, m, (point, m))
+    expected = [r.model_dump() for r in optimize.ranked_results(board, sort_by)]
+
+    progress = []
+    runs = [
+        optimize.execute_optimization(request, series),
+        optimize.execute_optimization(request, series, lambda done, total, b: progress.append((done, total))),
+    ]
+    for results in runs:
+        assert [r.model_dump() for r in results] == expected
+    assert progress[0] == progress[-1] == (len(points), len(points))
+    assert optimize.sweep_cache.stats()["hits"] == len(points)
@@ -0,0 +1,33 @@
+# 結果快取：網格點快取以點數為上限；磁碟層只在檔案數超過上限時才掃描刪除
+import os
+
+from app.core.result_cache import RESULT_CACHE_DISK_PRUNE_RATIO, ResultCache, SweepCache
+
+
+def test_sweep_cache_returns_cached_points_and_evicts_oldest():
+    cache = SweepCache(max_points=3)
+    cache.put_many("a", [("p1", {"x": 1}), ("p2", None)])
+    assert cache.get_many("a", ["p1", "p2", "p3"]) == {0: {"x": 1}, 1: None}
+    assert cache.get_many("b", ["p1"]) == {}
+
+    cache.put_many("a", [("p3", {"x": 3}), ("p4", {"x": 4})])
+    assert cache.get_many("a", ["p1", "p2", "p3", "p4"]) == {1: None, 2: {"x": 3}, 3: {"x": 4}}
+    stats = cache.stats()
+    assert (stats["points"], stats["evictions"], stats["hits"], stats["misses"]) == (3, 1, 5, 3)
+
+
+def test_disk_tier_prunes_only_past_limit(tmp_path):
+    cache = ResultCache(max_entries=1, disk_dir=str(tmp_path), disk_max_files=10)
+    files = lambda: sorted(name for name in os.listdir(tmp_path) if name.endswith(".pkl"))
+
+    for i in range(10):
+        cache.put(f"k{i}", i)
+    assert len(files()) == 10
+    # 覆寫既有的鍵不增加檔案數
+    cache.put("k9", 9)
+    assert len(files()) == 10
+
+    cache.put("k10", 10)
+    assert len(files()) == int(10 * RESULT_CACHE_DISK_PRUNE_RATIO)
+    assert "k10.pkl" in files()
+    assert cache.get("k10") == 10
@@ -0,0 +1,93 @@
+# 交易模擬核心與 BacktestEngine.run 必須與原始逐 bar 引擎（tests/reference_engine.py）逐位元一致，
+# Numba 與純 Python 兩條路徑都要檢查
+import itertools
+import json
+
+import numpy as np
+import pytest
+
+from app.core import simulation
+from app.core.backtest_engine import BacktestEngine, BacktestParams
+from tests import reference_engine as reference
+
+PATHS = [
+    pytest.param(True, id="numba", marks=pytest.mark.skipif(not simulation.NUMBA_AVAILABLE, reason="未安裝 numba")),
+    pytest.param(False, id="python"),
+]
+
+GRID = list(itertools.product(
+    ["buy_and_hold", "single_ma", "dual_ma"],   # strategy_mode
+    ["long_only", "long_short"],                # trade_direction
+    [True, False],                              # enable_rebalance
+    [True, False],                              # enable_yield
+))
+GRID_IDS = ["-".join(str(v) for v in case) for case in GRID]
+
+# 槓桿 4 倍時合成序列會觸發爆倉，檢查提前結束的路徑
+LEVERAGES = [1.0, 4.0]
+DATE_RANGES = [(None, None), ("2019-06-01", "2020-12-31")]
+
+KINDS = {"做多": simulation.KIND_LONG, "做空": simulation.KIND_SHORT, "再平衡": simulation.KIND_REBALANCE}
+
+
+def _params(strategy_mode, trade_direction, enable_rebalance, enable_yield, leverage, date_range=(None, None)):
+    return dict(strategy_mode=strategy_mode, trade_direction=trade_direction, enable_rebalance=enable_rebalance,
+                enable_yield=enable_yield, leverage=leverage, ma_fast=10, ma_slow=50,
+                fee_rate=0.001, slippage=0.0005, start_date=date_range[0], end_date=date_range[1])
+
+
+def _plain(model) -> dict:
+    """轉為 JSON 相容的 dict（numpy 純量與 Python 數值比較時一視同仁）"""
+    return json.loads(json.dumps(model.model_dump(), default=float))
+
+
+@pytest.fixture(scope="module")
+def reference_engine(price_frame):
+    return reference.BacktestEngine(price_frame, "date", "close")
+
+
+@pytest.mark.parametrize("use_numba", PATHS)
+@pytest.mark.parametrize("case", GRID, ids=GRID_IDS)
+@pytest.mark.parametrize("leverage", LEVERAGES)
+def test_simulate_matches_reference_loop(price_frame, reference_engine, use_numba, case, leverage):
+    """以原始引擎的信號驅動 simulate()，權益與交易紀錄須與原始迴圈相同"""
+    params = _params(*case, leverage)
+    ref_params = reference.BacktestParams(**params)
+    df = price_frame.copy()
+    df["MA_Fast"] = df["close"].rolling(window=ref_params.ma_fast).mean()
+    df["MA_Slow"] = df["close"].rolling(window=ref_params.ma_slow).mean()
+    df = reference_engine._generate_signals(df, ref_params)
+    equity_curve, trades = reference_engine._simulate_trades(df, ref_params)
+
+    start = int(df["start_idx"].iloc[0])
+    months = df["date"].dt.month.to_numpy()[start:]
+    rebalance_flags = np.r_[False, months[1:] != months[:-1]]
+    equity, records = simulation.simulate(
+        df["close"].to_numpy()[start:], rebalance_flags,
+        df["Signal_Buy"].to_numpy(dtype=bool)[start:], df["Signal_Sell"].to_numpy(dtype=bool)[start:],
+        initial_cash=ref_params.initial_cash, leverage=ref_params.leverage, fee_rate=ref_params.fee_rate,
+        slippage=ref_params.slippage, long_short=ref_params.trade_direction == "long_short",
+        enable_rebalance=ref_params.enable_rebalance, enable_yield=ref_params.enable_yield,
+        annual_yield=ref_params.annual_yield, use_numba=use_numba,
+    )
+
+    assert np.round(equity, 2).tolist() == [point["value"] for point in equity_curve]
+    expected = [(KINDS[t["direction"]], t["entry_price"], t["exit_price"], t["units"], t["pnl"]) for t in trades]
+    got = [(int(r["kind"]), round(r["entry_price"], 2), round(r["exit_price"], 2), round(r["units"], 4),
+            round(r["pnl"], 2)) for r in records]
+    assert got == expected
+
+
+@pytest.mark.parametrize("use_numba", PATHS)
+@pytest.mark.parametrize("case", GRID, ids=GRID_IDS)
+@pytest.mark.parametrize("leverage", LEVERAGES)
+@pytest.mark.parametrize("date_range", DATE_RANGES, ids=["full", "range"])
+def test_engine_run_matches_reference(monkeypatch, prices, reference_engine, use_numba, case, leverage, date_range):
+    """完整結果（指標、權益曲線、交易明細、年度統計）與原始引擎相同"""
+    if not use_numba:
+        monkeypatch.setattr(simulation, "NUMBA_AVAILABLE", False)
+    params = _params(*case, leverage, date_range)
+    days, closes = prices
+    got = BacktestEngine(days, closes).run(BacktestParams(**params)).to_result()
+    expected = reference_engine.run(reference.BacktestParams(**params))
+    assert _plain(got) == _plain(expected)
@@ -0,0 +1,165 @@
+# 策略信號：EMA 交叉、布林通道、RSI、唐奇安通道與逐筆以 Python 計算的參考指標相同，暖機期（指標為 NaN）不產生信號
+import math
+
+import numpy as np
+import pytest
+
+from app.core.strategy_registry import Indicators, get_strategy
+
+N = 120
+
+
+def _closes() -> list:
+    """含趨勢與兩種週期波動的小序列，足以產生多次交叉"""
+    return [100 + 0.15 * t + 8 * math.sin(t / 5) + 3 * math.sin(t / 1.7) for t in range(N)]
+
+
+def _crosses(fast, slow):
+    """上穿 / 下穿：當根與前一根都要有值（NaN 視為 False）"""
+    buy, sell = [False] * len(fast), [False] * len(fast)
+    for t in range(1, len(fast)):
+        values = (fast[t], slow[t], fast[t - 1], slow[t - 1])
+        if any(math.isnan(v) for v in values):
+            continue
+        buy[t] = fast[t] > slow[t] and fast[t - 1] <= slow[t - 1]
+        sell[t] = fast[t] < slow[t] and fast[t - 1] >= slow[t - 1]
+    return buy, sell
+
+
+def _sma(x, w):
+    return [math.nan if t < w - 1 else sum(x[t - w + 1:t + 1]) / w for t in range(len(x))]
+
+
+def _std(x, w):
+    out = []
+    for t in range(len(x)):
+        if t < w - 1:
+            out.append(math.nan)
+            continue
+        window = x[t - w + 1:t + 1]
+        mean = sum(window) / w
+        out.append(math.sqrt(sum((v - mean) ** 2 for v in window) / (w - 1)))
+    return out
+
+
+def _ema(x, span):
+    alpha = 2 / (span + 1)
+    out, e = [], x[0]
+    for t, v in enumerate(x):
+        e = v if t == 0 else alpha * v + (1 - alpha) * e
+        out.append(e if t >= span - 1 else math.nan)
+    return out
+
+
+def _rsi(x, w):
+    """Wilder 平滑：第一個差分起算，累積 w 個差分後才有值；只漲不跌時為 100"""
+    out, gain, loss = [math.nan], 0.0, 0.0
+    for t in range(1, len(x)):
+        delta = x[t] - x[t - 1]
+        up, down = max(delta, 0.0), max(-delta, 0.0)
+        if t == 1:
+            gain, loss = up, down
+        else:
+            gain = gain + (up - gain) / w
+            loss = loss + (down - loss) / w
+        if t < w:
+            out.append(math.nan)
+        elif loss == 0:
+            out.append(100.0 if gain > 0 else math.nan)
+        else:
+            out.append(100 - 100 / (1 + gain / loss))
+    return out
+
+
+def _channel(x, w):
+    """前 w 根（不含當根）的最高與最低"""
+    upper = [math.nan if t < w else max(x[t - w:t]) for t in range(len(x))]
+    lower = [math.nan if t < w else min(x[t - w:t]) for t in range(len(x))]
+    return upper, lower
+
+
+def _signals(name, closes, params):
+    strategy = get_strategy(name)
+    values = strategy.resolve(params.get("ma_fast"), params.get("ma_slow"), params)
+    buy, sell = strategy.signals(np.array(closes), [values], Indicators(np.array(closes)))
+    return buy[0].tolist(), sell[0].tolist()
+
+
+def _check(name, closes, params, expected, first_signal):
+    buy, sell = _signals(name, closes, params)
+    assert (buy, sell) == expected
+    # 暖機期內沒有信號，之後買賣信號都出現過
+    assert not any(buy[:first_signal]) and not any(sell[:first_signal])
+    assert any(buy) and any(sell)
+
+
+@pytest.mark.parametrize("fast, slow", [(3, 8), (5, 20)])
+def test_ema_cross_matches_reference(fast, slow):
+    closes = _closes()
+    indicators = Indicators(np.array(closes))
+    for span in (fast, slow):
+        assert np.allclose(indicators.ema(span), _ema(closes, span), rtol=1e-12, equal_nan=True)
+        assert np.isnan(indicators.ema(span)[:span - 1]).all() and not np.isnan(indicators.ema(span)[span - 1:]).any()
+    expected = _crosses(_ema(closes, fast), _ema(closes, slow))
+    _check("ema_cross", closes, {"ma_fast": fast, "ma_slow": slow}, expected, slow)
+
+
+@pytest.mark.parametrize("window, num_std", [(10, 2.0), (20, 1.0), (5, 0.5)])
+def test_bollinger_matches_reference(window, num_std):
+    closes = _closes()
+    mid, std = _sma(closes, window), _std(closes, window)
+    indicators = Indicators(np.array(closes))
+    assert np.allclose(indicators.std(window), std, rtol=1e-9, equal_nan=True)
+    lower = [m - s * num_std for m, s in zip(mid, std)]
+    upper = [m + s * num_std for m, s in zip(mid, std)]
+    # 由下往上穿越下軌買進，由上往下跌破上軌賣出
+    expected = (_crosses(closes, lower)[0], _crosses(closes, upper)[1])
+    _check("bollinger", closes, {"ma_fast": window, "num_std": num_std}, expected, window)
+
+
+@pytest.mark.parametrize("window, lower, upper", [(5, 30, 70), (14, 45, 55), (7, 40.5, 60)])
+def test_rsi_matches_reference(window, lower, upper):
+    closes = _closes()
+    rsi = _rsi(closes, window)
+    values = Indicators(np.array(closes)).rsi(window)
+    assert np.allclose(values, rsi, rtol=1e-9, equal_nan=True)
+    assert np.isnan(values[:window]).all() and not np.isnan(values[window:]).any()
+    expected = (_crosses(rsi, [lower] * N)[0], _crosses(rsi, [upper] * N)[1])
+    _check("rsi", closes, {"ma_fast": window, "lower": lower, "upper": upper}, expected, window + 1)
+
+
+def test_rsi_without_losses_is_100():
+    closes = np.arange(1.0, 31.0)
+    values = Indicators(closes).rsi(5)
+    assert np.isnan(values[:5]).all() and np.all(values[5:] == 100)
+
+
+@pytest.mark.parametrize("entry, exit", [(20, 10), (5, 12), (3, 3)])
+def test_donchian_matches_reference(entry, exit):
+    closes = _closes()
+    upper, _ = _channel(closes, entry)
+    _, lower = _channel(closes, exit)
+    assert np.array_equal(Indicators(np.array(closes)).channel(entry)[0], upper, equal_nan=True)
+    # 突破前 entry 根高點買進，跌破前 exit 根低點賣出；通道在第 window 根才有值，信號再晚一根
+    expected = (_crosses(closes, upper)[0], _crosses(closes, lower)[1])
+    buy, sell = _signals("donchian", closes, {"ma_fast": entry, "ma_slow": exit})
+    assert (buy, sell) == expected
+    assert not any(buy[:entry + 1]) and not any(sell[:exit + 1])
+    assert any(buy) and any(sell)
+
+
+def test_batch_rows_match_single_runs():
+    """同一批不同參數的列與逐一計算相同（共用 Indicators 快取不影響結果）"""
+    closes = np.array(_closes())
+    for name, batch in [
+        ("ema_cross", [{"ma_fast": 3, "ma_slow": 8}, {"ma_fast": 5, "ma_slow": 20}]),
+        ("bollinger", [{"ma_fast": 10, "num_std": 2.0}, {"ma_fast": 10, "num_std": 1.0}]),
+        ("rsi", [{"ma_fast": 5, "lower": 30, "upper": 70}, {"ma_fast": 14, "lower": 45, "upper": 55}]),
+        ("donchian", [{"ma_fast": 20, "ma_slow": 10}, {"ma_fast": 5, "ma_slow": 12}]),
+    ]:
+        strategy = get_strategy(name)
+        values = [strategy.resolve(p.get("ma_fast"), p.get("ma_slow"), p) for p in batch]
+        buy, sell = strategy.signals(closes, values, Indicators(closes))
+        for row, v in enumerate(values):
+            single_buy, single_sell = strategy.signals(closes, [v])
+            assert np.array_equal(buy[row], single_buy[0]) and np.array_equal(sell[row], single_sell[0])
@@ -0,0 +1,61 @@
+# 批次參數掃描（SweepEngine）的績效必須與逐一執行 BacktestEngine.run 相同
+import itertools
+
+import pytest
+
+from app.core import sweep as sweep_module
+from app.core.backtest_engine import BacktestEngine, BacktestParams
+from app.core.sweep import SweepEngine, SweepPoint
+
+BASES = [
+    pytest.param(dict(enable_rebalance=True, enable_yield=False), id="rebalance"),
+    pytest.param(dict(enable_rebalance=False, enable_yield=True, start_date="2019-04-01", end_date="2021-03-31"),
+                 id="yield-range"),
+    pytest.param(dict(enable_rebalance=True, enable_yield=True, fee_rate=0.0, slippage=0.0), id="no-costs"),
+]
+
+KERNELS = [
+    pytest.param(True, id="numba", marks=pytest.mark.skipif(not sweep_module.NUMBA_AVAILABLE, reason="numba 未安裝")),
+    pytest.param(False, id="numpy"),
+]
+
+
+def grid_points():
+    points = []
+    for leverage in (1.0, 3.0, 6.0):
+        points.append(SweepPoint("buy_and_hold", "long_only", 0, None, leverage))
+        for direction, fast in itertools.product(("long_only", "long_short"), (3, 10, 30)):
+            points.append(SweepPoint("single_ma", direction, fast, None, leverage))
+            for slow in (20, 60):
+                if slow > fast:
+                    points.append(SweepPoint("dual_ma", direction, fast, slow, leverage))
+    return points
+
+
+def point_params(base: BacktestParams, point: SweepPoint) -> BacktestParams:
+    return base.model_copy(update=dict(
+        strategy_mode=point.strategy_mode, trade_direction=point.direction, leverage=point.leverage,
+        ma_fast=point.ma_fast or base.ma_fast, ma_slow=point.ma_slow or base.ma_slow,
+    ))
+
+
+@pytest.mark.parametrize("kernel", KERNELS)
+@pytest.mark.parametrize("base", BASES)
+def test_sweep_matches_engine(monkeypatch, prices, base, kernel):
+    monkeypatch.setattr(sweep_module, "NUMBA_AVAILABLE", kernel)
+    days, closes = prices
+    params = BacktestParams(**base)
+    points = grid_points()
+    results = SweepEngine(days, closes).run(points, params)
+
+    engine = BacktestEngine(days, closes)
+    assert len(results) == len(points)
+    for point, metrics in zip(points, results):
+        expected = engine.run(point_params(params, point), metrics_only=True)
+        assert metrics == {name: getattr(expected, name) for name in metrics}, point
+
+
+def test_sweep_too_short_range_returns_none(prices):
+    days, closes = prices
+    params = BacktestParams(start_date="2019-01-01", end_date="2019-01-10")
+    assert SweepEngine(days, closes).run(grid_points()[:3], params) == [None] * 3
@@ -0,0 +1,103 @@
+# 前進優化：測試區間首尾相接、不與訓練區間重疊；每段樣本內 / 外結果與以完整歷史信號單獨模擬該段相同
+import itertools
+
+import numpy as np
+import pytest
+
+from app.core.backtest_engine import BacktestEngine, BacktestParams, date_strings
+from app.core.simulation import simulate
+from app.core.strategy_registry import Indicators, get_strategy
+from app.core.sweep import SweepPoint
+from app.core.walk_forward import MIN_TEST_BARS, best_point, run_walk_forward, walk_forward_windows
+
+TRAIN_BARS = 250
+TEST_BARS = 120
+
+
+def grid_points():
+    points = [SweepPoint("buy_and_hold", "long_only", 0, None, 1.0)]
+    for direction, fast, leverage in itertools.product(("long_only", "long_short"), (5, 20), (1.0, 2.0)):
+        points.append(SweepPoint("single_ma", direction, fast, None, leverage))
+        points.append(SweepPoint("dual_ma", direction, fast, 60, leverage))
+    return points
+
+
+def standalone(days, closes, params: BacktestParams, point: SweepPoint, lo: int, hi: int, cash: float):
+    """以完整歷史產生該點的信號，從區間起點（均線尚未就緒時為暖機結束處）單獨以 simulate 模擬，
+    回傳 (績效, 權益)；績效由 BacktestEngine 的指標計算產生"""
+    strategy = get_strategy(point.strategy_mode)
+    values = strategy.resolve(point.ma_fast, point.ma_slow, dict(point.extra))
+    buy, sell = strategy.signals(closes, [values], Indicators(closes))
+    buy, sell = buy[0].copy(), sell[0]
+    if strategy.hold_from_start:
+        buy[lo] = True
+    begin = max(lo, strategy.warmup(values))
+    engine = BacktestEngine(days, closes)
+    long_short = point.direction == "long_short" and not strategy.hold_from_start
+    equity, records = simulate(closes[begin:hi], engine.calendar.flags(params.rebalance_frequency, begin, hi),
+                               buy[begin:hi], sell[begin:hi], cash, point.leverage, params.fee_rate,
+                               params.slippage, long_short, params.enable_rebalance, params.enable_yield,
+                               params.annual_yield)
+    values = np.round(equity, 2)
+    metrics, _, _ = engine._calculate_metrics(days[begin:begin + len(values)], values, records, cash,
+                                              include_yearly=False)
+    return metrics.model_dump(), np.r_[np.full(begin - lo, cash), values]
+
+
+@pytest.mark.parametrize("anchored", [False, True])
+@pytest.mark.parametrize("lo, hi, train, test", [(0, 900, 250, 120), (37, 800, 30, 5), (0, 300, 100, 197),
+                                                 (10, 1000, 200, 100)])
+def test_windows_do_not_overlap(lo, hi, train, test, anchored):
+    windows = walk_forward_windows(lo, hi, train, test, anchored)
+    assert windows[0][1] == lo + train
+    for k, (train_start, test_start, test_end) in enumerate(windows):
+        # 訓練區間緊接在測試區間之前，不含任何測試 bar
+        assert train_start == (lo if anchored else test_start - train)
+        assert lo <= train_start < test_start < test_end <= hi
+        assert MIN_TEST_BARS <= test_end - test_start <= test
+        if k + 1 < len(windows):
+            assert test_end - test_start == test and windows[k + 1][1] == test_end
+    # 剩下不足 MIN_TEST_BARS 的尾端不再切出區間
+    assert hi - windows[-1][2] < MIN_TEST_BARS
+
+
+def test_windows_reject_short_ranges():
+    with pytest.raises(ValueError):
+        walk_forward_windows(0, 100, 29, 10)
+    with pytest.raises(ValueError):
+        walk_forward_windows(0, 100, 50, 4)
+    with pytest.raises(ValueError):
+        walk_forward_windows(0, 100, 96, 10)
+
+
+@pytest.mark.parametrize("anchored", [False, True])
+@pytest.mark.parametrize("sort_by", ["sharpe_ratio", "total_return"])
+def test_out_of_sample_matches_standalone_runs(prices, anchored, sort_by):
+    days, closes = prices
+    params = BacktestParams(enable_rebalance=True)
+    points = grid_points()
+    run = run_walk_forward(days, closes, points, params, TRAIN_BARS, TEST_BARS, anchored, sort_by)
+
+    windows = walk_forward_windows(0, len(days), TRAIN_BARS, TEST_BARS, anchored)
+    assert len(run.folds) == run.metrics["fold_count"] == len(windows)
+    assert np.array_equal(run.days, days[windows[0][1]:windows[-1][2]])
+
+    capital = params.initial_cash
+    for fold, (train_start, test_start, test_end) in zip(run.folds, windows):
+        assert [fold["train_start"], fold["train_end"]] == date_strings(days[[train_start, test_start - 1]])
+        assert [fold["test_start"], fold["test_end"]] == date_strings(days[[test_start, test_end - 1]])
+
+        # 樣本內：與各點單獨在訓練區間模擬相同，並選出最佳點
+        train = [standalone(days, closes, params, p, train_start, test_start, params.initial_cash)[0] for p in points]
+        best = best_point(train, sort_by)
+        assert fold["train"] == {name: train[best][name] for name in fold["train"]}
+        assert fold["point"]["strategy_type"] == points[best].strategy_mode
+        assert (fold["point"]["ma_fast"], fold["point"]["leverage"]) == (points[best].ma_fast, points[best].leverage)
+
+        # 樣本外：以前一段期末權益為本金，單獨模擬最佳點；爆倉後權益為 0
+        metrics, equity = standalone(days, closes, params, points[best], test_start, test_end, capital)
+        assert fold["test"] == {name: metrics[name] for name in fold["test"]}
+        span = run.equity[test_start - windows[0][1]:test_end - windows[0][1]]
+        assert np.array_equal(span[:len(equity)], equity)
+        assert np.all(span[len(equity):] == 0)
+        capital = float(span[-1])
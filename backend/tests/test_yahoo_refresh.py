@@ -0,0 +1,193 @@
+# 批次更新：並行數有上限、逐檔回報錯誤、下載失敗以指數退避重試、取消後不再下載其餘檔案
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import yahoo_finance
+from app.api.yahoo_finance import SYMBOL_MAPPING, refresh_files
+from app.core import price_provider as provider_module
+from app.core.jobs import Job, JobCancelled
+from app.core.price_provider import HttpJsonProvider, PriceProvider, fetch_history
+from app.core.price_repository import price_repository
+from app.main import app
+
+FILES = ["btc_historical_data.xlsx", "eth_historical_data.xlsx", "doge.xlsx", "加權指數資料.xlsx"]
+# 每檔下載的新資料筆數
+NEW_ROWS = 5
+
+
+class StubProvider(PriceProvider):
+    """回傳最後日期之後的 NEW_ROWS 筆資料；記錄同時下載數，fail 中的 symbol 拋出例外"""
+    name = "stub"
+
+    def __init__(self, delay: float = 0.05, fail=(), gate: threading.Event = None):
+        self.delay = delay
+        self.fail = set(fail)
+        self.gate = gate
+        self.calls = []
+        self.active = 0
+        self.max_active = 0
+        self._lock = threading.Lock()
+
+    def history(self, symbol, start=None, end=None):
+        with self._lock:
+            self.calls.append(symbol)
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            if self.gate is not None:
+                self.gate.wait(10)
+            time.sleep(self.delay)
+            if symbol in self.fail:
+                raise ConnectionError(f"{symbol} 連線失敗")
+            dates = pd.date_range(pd.Timestamp(start) + pd.Timedelta(days=1), periods=NEW_ROWS + 1, freq="D")
+            return pd.DataFrame({"date": dates[1:], "close": np.arange(1.0, NEW_ROWS + 1)})
+        finally:
+            with self._lock:
+                self.active -= 1
+
+
+@pytest.fixture
+def refresh_dir(data_dir, price_frame):
+    for file_id in FILES:
+        price_frame.iloc[:100].to_excel(os.path.join(data_dir, file_id), index=False)
+    yield FILES
+    client = TestClient(app)
+    for file_id in FILES:
+        client.delete(f"/api/files/{file_id}")
+
+
+def test_refresh_bounds_concurrency_and_reports_each_file(monkeypatch, refresh_dir):
+    monkeypatch.setattr(provider_module, "time", SimpleNamespace(sleep=lambda seconds: None))
+    provider = StubProvider(fail={SYMBOL_MAPPING["eth_historical_data"]})
+    job = Job(id="refresh", kind="yahoo_refresh", total=len(FILES) + 1)
+    results = refresh_files(FILES + ["missing.xlsx"], job, provider, concurrency=2)
+
+    assert provider.max_active == 2
+    assert job.done == len(FILES) + 1 and len(job.progress["results"]) == len(FILES) + 1
+    by_file = {r["file_id"]: r for r in results}
+    assert by_file["eth_historical_data.xlsx"]["status"] == "error"
+    assert "連線失敗" in by_file["eth_historical_data.xlsx"]["message"]
+    assert by_file["missing.xlsx"]["status"] == "error" and by_file["missing.xlsx"]["symbol"] is None
+    for file_id in ("btc_historical_data.xlsx", "doge.xlsx", "加權指數資料.xlsx"):
+        assert by_file[file_id]["status"] == "success" and by_file[file_id]["rows_added"] == NEW_ROWS
+        assert len(price_repository.get(file_id)) == 100 + NEW_ROWS
+    # 失敗的檔案經過重試，但沒有寫入任何資料
+    assert provider.calls.count(SYMBOL_MAPPING["eth_historical_data"]) == provider_module.FETCH_RETRIES + 1
+    assert len(price_repository.get("eth_historical_data.xlsx")) == 100
+
+
+def test_refresh_stops_after_cancel(refresh_dir):
+    gate = threading.Event()
+    provider = StubProvider(delay=0, gate=gate)
+    job = Job(id="refresh", kind="yahoo_refresh", total=len(FILES))
+    errors = []
+
+    def run():
+        try:
+            refresh_files(FILES, job, provider, concurrency=1)
+        except JobCancelled as e:
+            errors.append(e)
+
+    worker = threading.Thread(target=run)
+    worker.start()
+    while not provider.calls:
+        time.sleep(0.01)
+    job.cancel_event.set()
+    gate.set()
+    worker.join(10)
+
+    # 已開始的檔案完成，其餘檔案不再下載
+    assert errors and provider.calls == [SYMBOL_MAPPING["btc_historical_data"]]
+    assert len(price_repository.get("btc_historical_data.xlsx")) == 100 + NEW_ROWS
+    assert len(price_repository.get("doge.xlsx")) == 100
+
+
+class FlakyProvider(PriceProvider):
+    def __init__(self, failures: int):
+        self.failures = failures
+        self.attempts = 0
+
+    def history(self, symbol, start=None, end=None):
+        self.attempts += 1
+        if self.attempts <= self.failures:
+            raise TimeoutError(f"attempt {self.attempts}")
+        return pd.DataFrame({"date": [pd.Timestamp("2024-01-02")], "close": [1.0]})
+
+
+@pytest.mark.parametrize("failures, retries, delays", [
+    (0, 3, []),
+    (2, 3, [0.5, 1.0]),
+    (3, 3, [0.5, 1.0, 2.0]),
+])
+def test_fetch_history_retries_with_backoff(monkeypatch, failures, retries, delays):
+    slept = []
+    monkeypatch.setattr(provider_module, "time", SimpleNamespace(sleep=slept.append))
+    provider = FlakyProvider(failures)
+    df = fetch_history(provider, "BTC-USD", retries=retries, backoff=0.5)
+    assert provider.attempts == failures + 1 and len(df) == 1
+    assert slept == delays
+
+
+def test_fetch_history_raises_last_error(monkeypatch):
+    slept = []
+    monkeypatch.setattr(provider_module, "time", SimpleNamespace(sleep=slept.append))
+    provider = FlakyProvider(10)
+    with pytest.raises(TimeoutError, match="attempt 3"):
+        fetch_history(provider, "BTC-USD", retries=2, backoff=0.25)
+    assert provider.attempts == 3 and slept == [0.25, 0.5]
+
+
+def test_http_provider_queries_range():
+    requests = []
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            requests.append((url.path, parse_qs(url.query)))
+            body = json.dumps([{"date": "2024-01-03", "close": 2}, {"date": "2024-01-02", "close": 1}])
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.end_headers()
+            self.wfile.write(body.encode("utf-8"))
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        provider = HttpJsonProvider(f"http://127.0.0.1:{server.server_address[1]}/")
+        df = provider.history("^TWII", datetime(2024, 1, 1), datetime(2024, 1, 5))
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert requests == [("/history/%5ETWII", {"start": ["2024-01-01"], "end": ["2024-01-05"]})]
+    assert df["date"].tolist() == [pd.Timestamp("2024-01-02"), pd.Timestamp("2024-01-03")]
+    assert df["close"].tolist() == [1.0, 2.0]
+
+
+def test_refresh_job_route_uses_stub_provider(monkeypatch, refresh_dir):
+    provider = StubProvider(delay=0)
+    monkeypatch.setattr(yahoo_finance, "price_provider", provider)
+    client = TestClient(app)
+    job_id = client.post("/api/yahoo/jobs", json={"file_ids": FILES[:2]}).json()["job_id"]
+    for _ in range(500):
+        snapshot = client.get(f"/api/yahoo/jobs/{job_id}").json()
+        if snapshot["status"] not in ("pending", "running"):
+            break
+        time.sleep(0.02)
+    assert snapshot["status"] == "completed" and snapshot["done"] == 2
+    assert sorted(r["file_id"] for r in snapshot["result"]) == FILES[:2]
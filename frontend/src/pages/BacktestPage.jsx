@@ -116,7 +116,7 @@ function BacktestPage() {
 
         setLoading(true);
         try {
-            const res = await backtestApi.run(selectedFile, params);
+            const res = await backtestApi.run(selectedFile, params, { max_points: 1000 });
             // 儲存結果到 localStorage 供結果頁面使用
             localStorage.setItem('backtestResult', JSON.stringify(res.data));
             localStorage.setItem('backtestParams', JSON.stringify(params));
@@ -132,8 +132,15 @@ function BacktestPage() {
         { value: 'buy_and_hold', label: '永遠做多 (Buy & Hold)' },
         { value: 'single_ma', label: '單均線策略' },
         { value: 'dual_ma', label: '雙均線策略' },
+        { value: 'ema_cross', label: 'EMA 交叉策略' },
+        { value: 'bollinger', label: '布林通道策略' },
+        { value: 'rsi', label: 'RSI 策略' },
+        { value: 'donchian', label: '唐奇安通道突破' },
     ];
 
+    // 使用慢線 / 第二個週期參數的策略
+    const twoWindowModes = ['dual_ma', 'ema_cross', 'donchian'];
+
     const directions = [
         { value: 'long_only', label: '僅做多' },
         { value: 'long_short', label: '做多與做空' },
@@ -304,7 +311,7 @@ function BacktestPage() {
                                             onChange={(e) => setParams({ ...params, ma_fast: Number(e.target.value) })}
                                         />
                                     </div>
-                                    {params.strategy_mode === 'dual_ma' && (
+                                    {twoWindowModes.includes(params.strategy_mode) && (
                                         <div className="form-group">
                                             <label className="form-label">慢線天數 (MA Slow)</label>
                                             <input
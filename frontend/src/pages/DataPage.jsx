@@ -48,9 +48,19 @@ function DataPage() {
         setNewRows([]);
         setDeletedIndices([]);
         setChartRange('all'); // 重置時間範圍
+        await loadPreview(file.id, 'all');
+    };
+
+    // 依時間範圍向伺服器取得降採樣後的價格（任何範圍都約 800 點；limit 0 為完整歷史）
+    const loadPreview = async (fileId, range) => {
+        const options = { max_points: 800, limit: 0 };
+        if (range !== 'all') {
+            const cutoffDate = new Date();
+            cutoffDate.setFullYear(cutoffDate.getFullYear() - parseInt(range));
+            options.start_date = cutoffDate.toISOString().slice(0, 10);
+        }
         try {
-            // 載入更多資料以支援長期圖表顯示（10年約需要 2500 筆交易日資料）
-            const res = await filesApi.preview(file.id, 5000);
+            const res = await filesApi.preview(fileId, options);
             setPreviewData(res.data);
         } catch (err) {
             console.error('預覽失敗:', err);
@@ -389,7 +399,10 @@ function DataPage() {
                         ].map(range => (
                             <button
                                 key={range.key}
-                                onClick={() => setChartRange(range.key)}
+                                onClick={() => {
+                                    setChartRange(range.key);
+                                    loadPreview(selectedFile.id, range.key);
+                                }}
                                 style={{
                                     padding: '0.5rem 1rem',
                                     border: 'none',
@@ -408,13 +421,7 @@ function DataPage() {
 
                     <div style={{ height: 400 }}>
                         <ResponsiveContainer width="100%" height="100%">
-                            <LineChart data={(() => {
-                                if (!previewData?.chart_data || chartRange === 'all') return previewData?.chart_data || [];
-                                const years = parseInt(chartRange);
-                                const cutoffDate = new Date();
-                                cutoffDate.setFullYear(cutoffDate.getFullYear() - years);
-                                return previewData.chart_data.filter(d => new Date(d.date) >= cutoffDate);
-                            })()}>
+                            <LineChart data={previewData?.chart_data || []}>
                                 <XAxis
                                     dataKey="date"
                                     tick={{ fontSize: 12 }}
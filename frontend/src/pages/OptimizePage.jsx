@@ -38,6 +38,10 @@ function OptimizePage() {
         { value: 'buy_and_hold', label: '永遠做多' },
         { value: 'single_ma', label: '單均線策略' },
         { value: 'dual_ma', label: '雙均線策略' },
+        { value: 'ema_cross', label: 'EMA 交叉' },
+        { value: 'bollinger', label: '布林通道' },
+        { value: 'rsi', label: 'RSI' },
+        { value: 'donchian', label: '唐奇安突破' },
     ];
 
     const allDirections = [
@@ -249,10 +253,14 @@ function OptimizePage() {
         { value: 'total_return', label: '總報酬率' },
         { value: 'cagr', label: 'CAGR' },
         { value: 'calmar_ratio', label: 'Calmar Ratio' },
+        { value: 'pareto', label: '報酬 / MDD 前緣' },
     ];
 
     const getStrategyLabel = (mode) => {
-        const labels = { 'buy_and_hold': '永遠做多', 'single_ma': '單均線', 'dual_ma': '雙均線' };
+        const labels = {
+            'buy_and_hold': '永遠做多', 'single_ma': '單均線', 'dual_ma': '雙均線',
+            'ema_cross': 'EMA 交叉', 'bollinger': '布林通道', 'rsi': 'RSI', 'donchian': '唐奇安突破',
+        };
         return labels[mode] || mode;
     };
 
@@ -19,13 +19,16 @@ export const filesApi = {
             headers: { 'Content-Type': 'multipart/form-data' },
         });
     },
-    preview: (fileId, limit = 500) => api.get(`/api/files/${fileId}/preview?limit=${limit}`),
+    // 伺服器端降採樣：options 可指定 max_points、method（lttb / minmax）、start_date、end_date
+    preview: (fileId, options = {}) => api.get(`/api/files/${fileId}/preview`, { params: options }),
     delete: (fileId) => api.delete(`/api/files/${fileId}`),
     // 資料編輯 API
     getData: (fileId, limit = 100) => api.get(`/api/files/${fileId}/data?limit=${limit}`),
     append: (fileId, rows) => api.post(`/api/files/${fileId}/append`, { rows }),
     update: (fileId, rows) => api.put(`/api/files/${fileId}/update`, { rows }),
     deleteRows: (fileId, indices) => api.delete(`/api/files/${fileId}/rows`, { data: { indices } }),
+    // 匯出含所有編輯的 Excel（直接作為下載連結使用）
+    exportUrl: (fileId) => `${API_BASE}/api/files/${encodeURIComponent(fileId)}/export`,
 };
 
 // Yahoo Finance API
@@ -33,16 +36,30 @@ export const yahooApi = {
     getSymbols: () => api.get('/api/yahoo/symbols'),
     updateFile: (fileId) => api.post(`/api/yahoo/update/${fileId}`),
     download: (symbol, name) => api.post('/api/yahoo/download', null, { params: { symbol, name } }),
+    // 批次更新工作（未指定 fileIds 時更新所有支援的檔案）
+    submitRefresh: (fileIds = null) => api.post('/api/yahoo/jobs', { file_ids: fileIds }),
+    getRefresh: (jobId) => api.get(`/api/yahoo/jobs/${jobId}`),
+    cancelRefresh: (jobId) => api.delete(`/api/yahoo/jobs/${jobId}`),
+    refreshStreamUrl: (jobId) => `${API_BASE}/api/yahoo/jobs/${jobId}/stream`,
 };
 
 // 回測相關 API
 export const backtestApi = {
-    run: (fileId, params) => api.post('/api/backtest/run', { file_id: fileId, params }),
+    // options.max_points：權益曲線降採樣點數
+    run: (fileId, params, options = {}) => api.post('/api/backtest/run', { file_id: fileId, params, ...options }),
+    monteCarlo: (fileId, params, monteCarlo) =>
+        api.post('/api/backtest/monte-carlo', { file_id: fileId, params, monte_carlo: monteCarlo }),
+};
+
+// 多資產組合回測 API
+export const portfolioApi = {
+    run: (params) => api.post('/api/portfolio/run', params),
 };
 
 // 策略相關 API
 export const strategiesApi = {
     list: () => api.get('/api/strategies'),
+    types: () => api.get('/api/strategies/types'),
     save: (strategy) => api.post('/api/strategies', strategy),
     delete: (strategyId) => api.delete(`/api/strategies/${strategyId}`),
 };
@@ -50,7 +67,15 @@ export const strategiesApi = {
 // 優化相關 API
 export const optimizeApi = {
     run: (request) => api.post('/api/optimize/run', request),
+    // 一次掃描取得多個指標的前 N 名（pareto: true 時含報酬 / MDD 前緣）
+    rankings: (request) => api.post('/api/optimize/rankings', request),
     getChart: (request) => api.post('/api/optimize/chart', request),
+    walkForward: (request) => api.post('/api/optimize/walk-forward', request),
+    // 背景優化工作
+    submitJob: (request) => api.post('/api/optimize/jobs', request),
+    getJob: (jobId) => api.get(`/api/optimize/jobs/${jobId}`),
+    cancelJob: (jobId) => api.delete(`/api/optimize/jobs/${jobId}`),
+    jobStreamUrl: (jobId) => `${API_BASE}/api/optimize/jobs/${jobId}/stream`,
 };
 
 export default api;